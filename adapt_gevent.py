@@ -0,0 +1,32 @@
+"""
+Serve edx-adapt on gevent: one process handles thousands of polling tutor clients concurrently.
+
+Every request runs in a greenlet which yields while it waits for MongoDB, so waiting requests hold neither a thread
+nor a process. Independent queries of a request are run concurrently, see edx_adapt.parallel.
+
+    python adapt_gevent.py [port] [tutor|admin|analytics ...]
+
+Without application names the whole API is served.
+"""
+from gevent import monkey
+# Sockets and threads must be patched before pymongo and the application are imported
+monkey.patch_all()
+
+import sys
+
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+
+from edx_adapt.api.adapt_api import APPLICATIONS, create_app, warm_up
+from edx_adapt.settings import GEVENT_MAX_CONNECTIONS, WARM_UP_CACHES
+
+
+def serve(port=8080, applications=APPLICATIONS):
+    app = create_app(applications=applications)
+    if WARM_UP_CACHES:
+        warm_up(app)
+    server = WSGIServer(('0.0.0.0', port), app, spawn=Pool(GEVENT_MAX_CONNECTIONS), log=None)
+    server.serve_forever()
+
+if __name__ == '__main__':
+    serve(int(sys.argv[1]) if len(sys.argv) > 1 else 8080, sys.argv[2:] or APPLICATIONS)
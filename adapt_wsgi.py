@@ -1,4 +1,8 @@
-from edx_adapt.api.adapt_api import app
+from edx_adapt.api.adapt_api import create_wsgi_app
+
+# Whole API in one application, see adapt_wsgi_tutor.py, adapt_wsgi_admin.py and adapt_wsgi_analytics.py to serve its
+# parts by separate pools of workers
+app = create_wsgi_app()
 
 if __name__ == "__main__":
     app.run()
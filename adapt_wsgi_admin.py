@@ -0,0 +1,7 @@
+from edx_adapt.api.adapt_api import ADMIN, create_wsgi_app
+
+# Course administration endpoints: courses, skills, problems, experiments, enrollment and model parameters
+app = create_wsgi_app([ADMIN])
+
+if __name__ == "__main__":
+    app.run()
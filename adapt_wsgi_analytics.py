@@ -0,0 +1,7 @@
+from edx_adapt.api.adapt_api import ANALYTICS, create_wsgi_app
+
+# Analytics endpoints: course-wide logs and trajectories, batch user status
+app = create_wsgi_app([ANALYTICS])
+
+if __name__ == "__main__":
+    app.run()
@@ -0,0 +1,7 @@
+from edx_adapt.api.adapt_api import TUTOR, create_wsgi_app
+
+# Tutor endpoints: users' problems, interactions, page loads and status long-poll
+app = create_wsgi_app([TUTOR])
+
+if __name__ == "__main__":
+    app.run()
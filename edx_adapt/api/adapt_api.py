@@ -1,91 +1,392 @@
+"""
+Application factory of the edx-adapt API.
+
+Importing this module has no side effects: the database client, selector, background workers and caches are built by
+create_app, and the database is not connected until the first query. Under uWSGI the application is created once in
+the master process and shared copy-on-write by the forked workers, each of them connecting on its own.
+"""
+import logging
+import os
+import time
+
 import flask
 from flask import Flask
 from flask.ext.cors import CORS
 from flask_restful import Api
+from werkzeug.exceptions import HTTPException
 # import API resources
 import edx_adapt.api.resources.course_resources as CR
 import edx_adapt.api.resources.tutor_resources as TR
 import edx_adapt.api.resources.data_serve_resources as DR
 import edx_adapt.api.resources.model_resources as MR
+from edx_adapt.api import admission, serialization, status_cache
 # import data and model stuff
 import edx_adapt.data.course_repository as repo
 import edx_adapt.data.mongodb_storage as mongodbstore
-from edx_adapt import logger
+import edx_adapt.data.query_log as query_log
+from edx_adapt import access_logger, log, logger, metrics
 import edx_adapt.select.skill_separate_random_selector as select
+import edx_adapt.select.speculative as speculative
+import edx_adapt.select.worker as worker
+from edx_adapt.settings import (
+    ADMISSION_LIMITS, ADMISSION_QUEUE_TIMEOUT, LOG_MAX_BYTES, LOGS_DIR, MONGODB_DATABASE, MONGODB_URI,
+    QUERY_DUPLICATES_WARNING, REQUEST_LOG_SAMPLE_RATE, SELECTION_PENDING_TIMEOUT, SELECTION_WORKERS, SELECTOR,
+    STATUS_CACHE_TTL, TUTOR_ADMISSION_LIMITS, WARM_UP_CACHES
+)
 import edx_adapt.model.bkt as bkt
 
-app = Flask(__name__)
-app.debug = False
-CORS(app)
-api = Api(app)
-
 # TODO: load from settings
 base = '/api/v1'
+# Key of the application's Services in app.extensions
+EXTENSION = 'edx_adapt'
+# Parts of the API which can be served as separate applications, each by its own pool of workers: latency-critical
+# requests of students' tutors, course and enrollment administration, and heavy course-wide data reads
+TUTOR = 'tutor'
+ADMIN = 'admin'
+ANALYTICS = 'analytics'
+APPLICATIONS = (TUTOR, ADMIN, ANALYTICS)
 
-database = repo.CourseRepositoryMongo(mongodbstore.MongoDbStorage('mongodb://localhost:27017/'))
-student_model = bkt.BKT()
-selector = select.SkillSeparateRandomSelector(database, student_model, "user skill")
-
-api.add_resource(CR.Courses, base + '/course',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-api.add_resource(CR.Skills, base + '/course/<course_id>/skill',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-api.add_resource(CR.Users, base + '/course/<course_id>/user',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-api.add_resource(CR.Problems, base + '/course/<course_id>', base + '/course/<course_id>/skill/<skill_name>',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-api.add_resource(CR.Experiments, base + '/course/<course_id>/experiment',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-
-api.add_resource(CR.Probabilities, base + '/course/<course_id>/probabilities',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-
-api.add_resource(TR.UserInteraction, base + '/course/<course_id>/user/<user_id>/interaction',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-api.add_resource(TR.UserProblems, base + '/course/<course_id>/user/<user_id>',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-api.add_resource(TR.UserPageLoad, base + '/course/<course_id>/user/<user_id>/pageload',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-
-api.add_resource(DR.SingleProblemRequest, base + '/data/logs/course/<course_id>/user/<user_id>/problem/<problem_name>',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-api.add_resource(DR.UserLogRequest, base + '/data/logs/course/<course_id>/user/<user_id>',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-api.add_resource(DR.CourseLogRequest, base + '/data/logs/course/<course_id>',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-api.add_resource(DR.ExperimentLogRequest, base + '/data/logs/course/<course_id>/experiment/<experiment_name>',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-api.add_resource(DR.UserTrajectoryRequest, base + '/data/trajectory/course/<course_id>/user/<user_id>',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-api.add_resource(DR.CourseTrajectoryRequest, base + '/data/trajectory/course/<course_id>',
-                 resource_class_kwargs={'data': database, 'selector': selector})
-api.add_resource(
-    DR.ExperimentTrajectoryRequest,
-    base + '/data/trajectory/course/<course_id>/experiment/<experiment_name>',
-    resource_class_kwargs={'data': database, 'selector': selector}
-)
 
-api.add_resource(MR.Parameters, base+'/parameters',
-                 resource_class_kwargs={'data': database, 'selector': selector})
+class MeasuredApi(Api):
+    """
+    Api counting exceptions raised by resources, before they are turned into error responses
+    """
+
+    def handle_error(self, e):
+        # Client errors, e.g. abort(404) of an unknown user, are answers of the API rather than its failures
+        if not isinstance(e, HTTPException) or e.code >= 500:
+            metrics.count_error(e)
+        return super(MeasuredApi, self).handle_error(e)
+
+
+class Services(object):
+    """
+    Components shared by all requests of the application, kept in app.extensions['edx_adapt']
+    """
+
+    def __init__(self, database, selector, speculator, selection_pool, status_cache, admission_limiters):
+        self.database = database
+        self.selector = selector
+        self.speculator = speculator
+        self.selection_pool = selection_pool
+        self.status_cache = status_cache
+        self.admission_limiters = admission_limiters
+
+    def resource_kwargs(self):
+        """
+        :return: dict of the constructor arguments of the API resources, see BaseResource
+        """
+        return {
+            'data': self.database, 'selector': self.selector, 'speculator': self.speculator,
+            'selection_pool': self.selection_pool, 'status_cache': self.status_cache
+        }
+
+
+def create_app(db_uri=MONGODB_URI, db_name=MONGODB_DATABASE, configure_logging=True, applications=APPLICATIONS):
+    """
+    Build the API application
+
+    Indexes are not created here, run the migration command once per deployment instead: python -m edx_adapt.migrate
+
+    :param db_uri: (optional) MongoDB connection string
+    :param db_name: (optional) name of the database
+    :param configure_logging: (optional) set up the logging pipeline of edx_adapt.log, False leaves it to the caller
+    :param applications: (optional) parts of the API served by the application: TUTOR, ADMIN and/or ANALYTICS, all by
+                         default
+    :return: Flask application
+    """
+    unknown = set(applications) - set(APPLICATIONS)
+    if unknown:
+        raise ValueError("Unknown applications: {}".format(', '.join(sorted(unknown))))
+    if configure_logging:
+        log.configure(LOGS_DIR, max_bytes=LOG_MAX_BYTES)
+
+    app = Flask(__name__)
+    app.debug = False
+    CORS(app)
+    api = MeasuredApi(app)
+    # Fast JSON encoder, and msgpack for clients asking for it
+    serialization.register(api)
+
+    database = repo.CourseRepositoryMongo(
+        mongodbstore.MongoDbStorage(
+            db_uri, db_name=db_name,
+            event_listeners=[metrics.CommandMetricsListener(), query_log.QueryCounterListener()]
+        )
+    )
+    student_model = bkt.BKT()
+    if SELECTOR == 'expected_gain':
+        # NumPy is imported only when this selector is used
+        import edx_adapt.select.expected_gain_selector as gain_select
+        selector = gain_select.ExpectedGainSelector(database, student_model, "user skill")
+    else:
+        selector = select.SkillSeparateRandomSelector(database, student_model, "user skill")
+    services = Services(
+        database, selector,
+        speculator=speculative.SpeculativeSelection(database, selector),
+        selection_pool=worker.SelectionWorkerPool(
+            database, selector, workers=SELECTION_WORKERS, pending_timeout=SELECTION_PENDING_TIMEOUT
+        ),
+        status_cache=status_cache.StatusCache(STATUS_CACHE_TTL),
+        admission_limiters=admission.build_limiters(
+            dict(ADMISSION_LIMITS, **TUTOR_ADMISSION_LIMITS) if list(applications) == [TUTOR] else ADMISSION_LIMITS,
+            ADMISSION_QUEUE_TIMEOUT
+        )
+    )
+    app.extensions[EXTENSION] = services
+    resource_kwargs = services.resource_kwargs()
+    for application in applications:
+        RESOURCES[application](api, resource_kwargs)
+
+    app.register_error_handler(404, page_not_found)
+    app.before_request(log_request_info)
+    app.before_request(start_request_timer)
+    app.after_request(measure_request)
+    app.before_request(start_query_recording)
+    app.before_request(admit_request)
+    app.after_request(release_admission)
+    app.after_request(log_access)
+    app.teardown_request(release_failed_admission)
+    app.teardown_request(stop_query_recording)
+    app.add_url_rule('/metrics', 'export_metrics', export_metrics)
+    return app
+
+
+def create_wsgi_app(applications=APPLICATIONS):
+    """
+    Build the application served by uWSGI, see the adapt_wsgi*.py entry points
+
+    The application is built in the uWSGI master, every forked worker starts with start_worker.
+
+    :param applications: (optional) parts of the API served by the application, all by default
+    :return: Flask application
+    """
+    app = create_app(applications=applications)
+    try:
+        import uwsgi
+        from uwsgidecorators import postfork
+    except ImportError:
+        # Not served by uWSGI, there are no workers to fork
+        if WARM_UP_CACHES:
+            warm_up(app)
+        return app
+    check_admission_threads(app, int(uwsgi.opt.get('threads', 1)))
+    # Live gauges of a worker are removed when it exits, the ones of a killed worker when its replacement starts
+    uwsgi.atexit = lambda: metrics.mark_process_dead(os.getpid())
+    postfork(lambda: start_worker(app))
+    return app
+
+
+def start_worker(app):
+    """
+    Prepare a forked worker process: remove metrics of finished workers, with WARM_UP_CACHES fill the caches
+
+    :param app: application built by create_app
+    """
+    dead = metrics.remove_dead_processes()
+    if dead:
+        logger.info("Metrics of finished processes %s are removed", dead)
+    if WARM_UP_CACHES:
+        warm_up(app)
+
+
+def check_admission_threads(app, threads):
+    """
+    Warn if requests of the long running endpoint classes may take more than a half of the process's threads
+
+    :param app: application built by create_app
+    :param threads: number of threads serving requests in the process
+    :return: number of the threads the long running requests may take
+    """
+    endpoint_classes = {
+        getattr(getattr(view, 'view_class', None), 'admission_class', None) for view in app.view_functions.values()
+    }
+    taken = admission.long_running_requests(app.extensions[EXTENSION].admission_limiters, endpoint_classes)
+    if taken * 2 > threads:
+        logger.warning(
+            "Bulk requests and long-polls may take %d of %d threads, tutor requests can be starved, lower their "
+            "ADMISSION_LIMITS or serve more threads", taken, threads
+        )
+    return taken
+
+
+def warm_up(app):
+    """
+    Fill the caches of the application's process, call it in every process after it is forked
+
+    Failure is logged only, the caches are then filled by the first requests.
+
+    :param app: application built by create_app
+    """
+    try:
+        courses = app.extensions[EXTENSION].database.warm_up()
+    except Exception:
+        logger.exception("Cache warm-up failed:")
+    else:
+        logger.info("Caches of %d courses are warmed up", courses)
 
-api.add_resource(MR.ParametersBulk, base+'/parameters/bulk',
-                 resource_class_kwargs={'data': database, 'selector': selector})
+
+def _add_tutor_resources(api, resource_kwargs):
+    api.add_resource(TR.UserInteraction, base + '/course/<course_id>/user/<user_id>/interaction',
+                     resource_class_kwargs=resource_kwargs)
+    api.add_resource(TR.UserProblems, base + '/course/<course_id>/user/<user_id>',
+                     resource_class_kwargs=resource_kwargs)
+    api.add_resource(TR.UserStatusWait, base + '/course/<course_id>/user/<user_id>/wait',
+                     resource_class_kwargs=resource_kwargs)
+    api.add_resource(TR.UserPageLoad, base + '/course/<course_id>/user/<user_id>/pageload',
+                     resource_class_kwargs=resource_kwargs)
+
+
+def _add_admin_resources(api, resource_kwargs):
+    api.add_resource(CR.Courses, base + '/course', resource_class_kwargs=resource_kwargs)
+    api.add_resource(CR.CourseImport, base + '/course/<course_id>/import', resource_class_kwargs=resource_kwargs)
+    api.add_resource(CR.Skills, base + '/course/<course_id>/skill', resource_class_kwargs=resource_kwargs)
+    api.add_resource(CR.Users, base + '/course/<course_id>/user', resource_class_kwargs=resource_kwargs)
+    api.add_resource(CR.UsersBulk, base + '/course/<course_id>/users/bulk', resource_class_kwargs=resource_kwargs)
+    api.add_resource(CR.Problems, base + '/course/<course_id>', base + '/course/<course_id>/skill/<skill_name>',
+                     resource_class_kwargs=resource_kwargs)
+    api.add_resource(CR.Experiments, base + '/course/<course_id>/experiment', resource_class_kwargs=resource_kwargs)
+
+    api.add_resource(CR.Probabilities, base + '/course/<course_id>/probabilities',
+                     resource_class_kwargs=resource_kwargs)
+
+    api.add_resource(MR.Parameters, base+'/parameters', resource_class_kwargs=resource_kwargs)
+
+    api.add_resource(MR.ParametersBulk, base+'/parameters/bulk', resource_class_kwargs=resource_kwargs)
+
+
+def _add_analytics_resources(api, resource_kwargs):
+    api.add_resource(TR.UsersStatus, base + '/course/<course_id>/users/status', resource_class_kwargs=resource_kwargs)
+
+    api.add_resource(DR.SingleProblemRequest,
+                     base + '/data/logs/course/<course_id>/user/<user_id>/problem/<problem_name>',
+                     resource_class_kwargs=resource_kwargs)
+    api.add_resource(DR.UserLogRequest, base + '/data/logs/course/<course_id>/user/<user_id>',
+                     resource_class_kwargs=resource_kwargs)
+    api.add_resource(DR.CourseLogRequest, base + '/data/logs/course/<course_id>',
+                     resource_class_kwargs=resource_kwargs)
+    api.add_resource(DR.ExperimentLogRequest, base + '/data/logs/course/<course_id>/experiment/<experiment_name>',
+                     resource_class_kwargs=resource_kwargs)
+    api.add_resource(DR.UserTrajectoryRequest, base + '/data/trajectory/course/<course_id>/user/<user_id>',
+                     resource_class_kwargs=resource_kwargs)
+    api.add_resource(DR.CourseTrajectoryRequest, base + '/data/trajectory/course/<course_id>',
+                     resource_class_kwargs=resource_kwargs)
+    api.add_resource(
+        DR.ExperimentTrajectoryRequest,
+        base + '/data/trajectory/course/<course_id>/experiment/<experiment_name>',
+        resource_class_kwargs=resource_kwargs
+    )
+
+
+RESOURCES = {TUTOR: _add_tutor_resources, ADMIN: _add_admin_resources, ANALYTICS: _add_analytics_resources}
 
 
-@app.errorhandler(404)  # Return JSON with 404 instead of html
 def page_not_found(e):
+    # Return JSON with 404 instead of html
     return flask.jsonify(error=404, text=str(e)), 404
 
 
-@app.before_request
 def log_request_info():
-    logger.debug('{request}\n{headers}{body}\n'.format(
-        request=str(flask.request), headers=flask.request.headers, body=flask.request.get_data()
-    ))
+    # Successful requests are logged for a sample only, the decision is made once for both request's records
+    flask.g.log_sampled = log.sampled(REQUEST_LOG_SAMPLE_RATE)
+    if flask.g.log_sampled and logger.isEnabledFor(logging.DEBUG):
+        logger.debug('%s\n%s%s\n', flask.request, flask.request.headers, flask.request.get_data())
+
+
+def start_request_timer():
+    flask.g.request_start = time.time()
+
+
+def _view_class():
+    view = flask.current_app.view_functions.get(flask.request.endpoint)
+    return getattr(view, 'view_class', view)
+
+
+def measure_request(response):
+    # Requests are labeled by the resource class, so the label set does not grow with the course and user ids
+    view = _view_class()
+    resource = view.__name__ if view else 'unknown'
+    metrics.REQUESTS.labels(resource, flask.request.method, response.status_code).inc()
+    if 'request_start' in flask.g:
+        metrics.REQUEST_LATENCY.labels(resource, flask.request.method).observe(time.time() - flask.g.request_start)
+    return response
+
+
+def start_query_recording():
+    flask.g.query_stats = query_log.start()
+
+
+def admit_request():
+    limiters = flask.current_app.extensions[EXTENSION].admission_limiters
+    limiter = limiters.get(getattr(_view_class(), 'admission_class', None))
+    if limiter is None:
+        return
+    if not limiter.acquire():
+        return serialization.output_json(
+            {'message': "Server is busy with {} requests, please retry later".format(limiter.endpoint_class)}, 503,
+            {'Retry-After': str(limiter.retry_after)}
+        )
+    flask.g.admission = limiter
+
+
+def release_admission(response):
+    limiter = flask.g.pop('admission', None)
+    if limiter is not None:
+        admission.release_when_sent(response, limiter)
+    return response
+
+
+def log_access(response):
+    stats = flask.g.get('query_stats')
+    if stats is None:
+        return response
+    query_log.stop(stats)
+    duration = time.time() - flask.g.request_start if 'request_start' in flask.g else 0
+    if flask.current_app.debug:
+        response.headers['X-DB-Query-Count'] = str(stats.count)
+        response.headers['X-DB-Query-Time'] = '{:.1f}'.format(stats.duration * 1000)
+        response.headers['X-DB-Duplicate-Queries'] = str(stats.duplicates)
+    if flask.g.get('log_sampled', True) or response.status_code >= 400:
+        access_logger.info(
+            '%s %s %s %.1fms queries=%d db=%.1fms duplicates=%d', flask.request.method, flask.request.path,
+            response.status_code, duration * 1000, stats.count, stats.duration * 1000, stats.duplicates,
+            extra={
+                'method': flask.request.method, 'path': flask.request.path, 'status': response.status_code,
+                'duration_ms': round(duration * 1000, 1), 'queries': stats.count,
+                'db_ms': round(stats.duration * 1000, 1), 'duplicate_queries': stats.duplicates,
+            }
+        )
+    repeated = stats.most_repeated()
+    if repeated and repeated[1] >= QUERY_DUPLICATES_WARNING:
+        logger.warning('Possible N+1 queries in %s %s, query run %d times: %s', flask.request.method,
+                       flask.request.path, repeated[1], repeated[0])
+    return response
+
+
+def release_failed_admission(exc):
+    # Slot of a request failed before its response is built
+    limiter = flask.g.pop('admission', None)
+    if limiter is not None:
+        limiter.release()
+
+
+def stop_query_recording(exc):
+    # Recording is stopped even if the response is not built, so it never leaks into the next request of the thread
+    stats = flask.g.get('query_stats')
+    if stats is not None:
+        query_log.stop(stats)
+
+
+def export_metrics():
+    body, content_type = metrics.export()
+    return flask.Response(body, content_type=content_type)
 
 
 def run():
+    app = create_app()
+    if WARM_UP_CACHES:
+        warm_up(app)
     app.run(host='0.0.0.0', port=8080, threaded=True)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080)
+    run()
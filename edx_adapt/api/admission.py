@@ -0,0 +1,139 @@
+"""
+Admission control of the API requests per endpoint class.
+
+Every class has its own limit of requests handled at once in the process and of requests waiting for a free slot.
+A request over both limits is rejected at once, so bulk work such as enrollment or course-wide data pulls is shed
+before it slows down the tutor requests of students.
+"""
+import threading
+import time
+
+from edx_adapt import metrics
+
+TUTOR_READ = 'tutor_read'
+TUTOR_WRITE = 'tutor_write'
+TUTOR_WAIT = 'tutor_wait'
+ENROLLMENT = 'enrollment'
+ADMIN = 'admin'
+DATA_SERVE = 'data_serve'
+# Classes whose requests hold a thread for long: bulk work and long-polls
+LONG_RUNNING_CLASSES = (TUTOR_WAIT, ENROLLMENT, DATA_SERVE)
+
+
+class AdmissionLimiter(object):
+    """
+    Limit of the concurrently handled requests of one endpoint class, with a bounded queue of waiting requests
+    """
+
+    def __init__(self, endpoint_class, concurrency, queue=0, timeout=0, retry_after=1):
+        """
+        :param endpoint_class: name of the endpoint class, used as the metrics label
+        :param concurrency: maximum number of requests handled at once
+        :param queue: (optional) maximum number of requests waiting for a free slot
+        :param timeout: (optional) time in seconds a request waits for a free slot before it is rejected
+        :param retry_after: (optional) time in seconds rejected clients are asked to wait before retrying
+        """
+        self.endpoint_class = endpoint_class
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.queued = 0
+        self._condition = threading.Condition()
+        self._in_flight_gauge = metrics.ADMISSION_IN_FLIGHT.labels(endpoint_class)
+        self._queued_gauge = metrics.ADMISSION_QUEUED.labels(endpoint_class)
+
+    def acquire(self):
+        """
+        Take a slot for the request, waiting for it if the queue is not full
+
+        :return: True if the request is admitted, it must call release when it is done
+        """
+        with self._condition:
+            if self.in_flight >= self.concurrency:
+                if self.queued >= self.queue:
+                    return self._reject()
+                self.queued += 1
+                self._queued_gauge.inc()
+                deadline = time.time() + self.timeout
+                try:
+                    while self.in_flight >= self.concurrency:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            return self._reject()
+                        self._condition.wait(remaining)
+                finally:
+                    self.queued -= 1
+                    self._queued_gauge.dec()
+            self.in_flight += 1
+            self._in_flight_gauge.inc()
+            return True
+
+    def _reject(self):
+        metrics.ADMISSION_REJECTED.labels(self.endpoint_class).inc()
+        return False
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._in_flight_gauge.dec()
+            self._condition.notify()
+
+
+def build_limiters(limits, timeout):
+    """
+    :param limits: dict of endpoint class: dict with 'concurrency', 'queue' and 'retry_after'
+    :param timeout: time in seconds a request waits for a free slot
+    :return: dict of AdmissionLimiter keyed by endpoint class
+    """
+    return {
+        endpoint_class: AdmissionLimiter(endpoint_class, timeout=timeout, **limit)
+        for endpoint_class, limit in limits.iteritems()
+    }
+
+
+def long_running_requests(limiters, endpoint_classes):
+    """
+    Get the number of requests of the long running classes which may hold a thread at once, running or queued
+
+    :param limiters: dict of AdmissionLimiter keyed by endpoint class
+    :param endpoint_classes: endpoint classes of the served resources
+    :return: sum of the concurrency and queue limits of the served long running classes
+    """
+    return sum(
+        limiter.concurrency + limiter.queue for endpoint_class, limiter in limiters.iteritems()
+        if endpoint_class in LONG_RUNNING_CLASSES and endpoint_class in endpoint_classes
+    )
+
+
+def release_when_sent(response, limiter):
+    """
+    Release the request's slot once its response is produced
+
+    A streamed response is produced after the request is torn down, so its slot is held until the last chunk is
+    sent or the response is closed, whichever comes first. Other responses release it at once.
+
+    :param response: flask.Response of the admitted request
+    :param limiter: AdmissionLimiter the request is admitted by
+    """
+    if not response.is_streamed:
+        limiter.release()
+        return
+    released = []
+
+    def release():
+        if not released:
+            released.append(True)
+            limiter.release()
+
+    def chunks(iterable):
+        try:
+            for chunk in iterable:
+                yield chunk
+        finally:
+            release()
+
+    response.response = chunks(response.response)
+    # A response closed before its first chunk never runs the generator's finally clause
+    response.call_on_close(release)
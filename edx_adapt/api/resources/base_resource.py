@@ -3,8 +3,17 @@ General Resources for all API resources modules
 """
 from flask_restful import Resource
 
+from edx_adapt.data.identity_map import RequestScopedRepository
+
 
 class BaseResource(Resource):
+    # Endpoint class the resource's requests are admitted by, see edx_adapt.api.admission, None if they are not limited
+    admission_class = None
+
     def __init__(self, **kwargs):
-        self.repo = kwargs['data']  # repo: DataInterface
+        # Resources are created for every request, so its repeated reads are served from the request's identity map
+        self.repo = RequestScopedRepository(kwargs['data'])  # repo: DataInterface
         self.selector = kwargs['selector']  # selector: SelectInterface
+        self.speculator = kwargs['speculator']  # speculator: SpeculativeSelection
+        self.selection_pool = kwargs['selection_pool']  # selection_pool: SelectionWorkerPool
+        self.status_cache = kwargs['status_cache']  # status_cache: StatusCache
@@ -2,12 +2,20 @@
 For example, CRUDding courses, users, problems, skills...
 """
 
+from collections import OrderedDict
+import random
+
+import flask
 from flask_restful import abort, reqparse
+from werkzeug.datastructures import FileStorage
 
+from edx_adapt.api import admission
 from edx_adapt.api.resources.base_resource import BaseResource
+from edx_adapt.data import course_definition
 from edx_adapt.data.interface import DataException
-from edx_adapt import logger
+from edx_adapt import logger, parallel
 from edx_adapt.select.interface import SelectException
+from edx_adapt.settings import BULK_ENROLLMENT_MAX, CATALOG_CACHE_CONTROL
 
 course_parser = reqparse.RequestParser()
 course_parser.add_argument('course_id', type=str, required=True, location='json', help="Please supply a course ID")
@@ -31,16 +39,71 @@ class DefaultResource(BaseResource):
             abort(404, message=str(e))
         return output_list
 
+    def _conditional_get(self, course_id, build_response):
+        """
+        Answer GET of the course catalog data with ETag of the catalog version
+
+        If the client's If-None-Match matches the version, 304 is returned without building the response.
+
+        :param course_id: course id, None for the course list
+        :param build_response: function returning the response data and status code
+        """
+        # Version is read before the data, so the data is never older than the version it is tagged with
+        version = self.repo.get_catalog_version(course_id)
+        if version is None:
+            return build_response()
+        if flask.request.if_none_match.contains_weak(version):
+            response = flask.Response(status=304)
+            response.set_etag(version)
+            response.headers['Cache-Control'] = CATALOG_CACHE_CONTROL
+            return response
+        data, code = build_response()
+        return data, code, {'ETag': '"{}"'.format(version), 'Cache-Control': CATALOG_CACHE_CONTROL}
+
 
 class Courses(DefaultResource):
     def get(self):
-        courses = self._get_request('get_course_ids')
-        return {'course_ids': courses}, 200
+        return self._conditional_get(None, lambda: ({'course_ids': self._get_request('get_course_ids')}, 200))
 
     def post(self):
         args = course_parser.parse_args()
         return self._post_request('post_course', args['course_id'])
 
+
+csv_import_parser = reqparse.RequestParser()
+csv_import_parser.add_argument('skills', type=FileStorage, required=True, location='files',
+                               help="Please supply skills.csv file")
+csv_import_parser.add_argument('problems', type=FileStorage, required=True, location='files',
+                               help="Please supply problems.csv file")
+csv_import_parser.add_argument('tutor_url', type=str, required=True, location='form',
+                               help="Please supply a link to the problems' pages with {problem_name} placeholder")
+
+
+class CourseImport(DefaultResource):
+    """
+    Import the whole course definition at once: skills, problems, experiments and default model parameters.
+
+    Definition is posted as JSON, or as skills.csv and problems.csv files in a multipart form. Its sections replace the
+    course's ones, missing sections are kept, the course is created if it does not exist.
+    """
+    admission_class = admission.ENROLLMENT
+
+    def post(self, course_id):
+        if flask.request.files:
+            args = csv_import_parser.parse_args()
+            definition = course_definition.from_csv(args['skills'].stream, args['problems'].stream, args['tutor_url'])
+        else:
+            definition = flask.request.get_json(silent=True)
+            if definition is None:
+                abort(400, message="Please supply the course definition as JSON or as skills.csv and problems.csv")
+        try:
+            imported = self.repo.import_course(course_id, definition)
+        except DataException as e:
+            logger.warning("Course %s is not imported: %s", course_id, e)
+            abort(400, message=str(e))
+        return {'success': True, 'imported': imported}, 201
+
+
 skill_parser = reqparse.RequestParser()
 skill_parser.add_argument('skill_name', type=str, required=True, location='json',
                           help="Please supply the name of a skill")
@@ -48,8 +111,7 @@ skill_parser.add_argument('skill_name', type=str, required=True, location='json'
 
 class Skills(DefaultResource):
     def get(self, course_id):
-        skills = self._get_request('get_skills', course_id)
-        return {'skills': skills}, 200
+        return self._conditional_get(course_id, lambda: ({'skills': self._get_request('get_skills', course_id)}, 200))
 
     def post(self, course_id):
         args = skill_parser.parse_args()
@@ -60,9 +122,13 @@ user_parser.add_argument('user_id', type=str, required=True, location='json', he
 
 
 class Users(DefaultResource):
+    admission_class = admission.ADMIN
+
     def get(self, course_id):
-        finished_users = self._get_request('get_finished_users', course_id)
-        progress_users = self._get_request('get_in_progress_users', course_id)
+        finished_users, progress_users = parallel.run(
+            lambda: self._get_request('get_finished_users', course_id),
+            lambda: self._get_request('get_in_progress_users', course_id),
+        )
         return {'users': {'finished': finished_users, 'in_progress': progress_users}}, 200
 
     def post(self, course_id):
@@ -86,6 +152,89 @@ class Users(DefaultResource):
         return {'success': True}, 200
 
 
+bulk_user_parser = reqparse.RequestParser()
+bulk_user_parser.add_argument('user_ids', type=list, required=True, location='json',
+                              help="Please supply a list of user IDs")
+bulk_user_parser.add_argument('params', type=dict, required=True, location='json',
+                              help="Please supply the desired model parameters as a dictionary")
+
+
+class UsersBulk(DefaultResource):
+    """
+    Enroll several users at once: set their model parameters and give them their first problems.
+
+    Users who have started the course are skipped, users who are enrolled but have not started it get new parameters
+    and the first problem again.
+    """
+    admission_class = admission.ENROLLMENT
+
+    def post(self, course_id):
+        args = bulk_user_parser.parse_args()
+        user_ids = list(OrderedDict.fromkeys(args['user_ids']))
+        if len(user_ids) > BULK_ENROLLMENT_MAX:
+            abort(400, message="Not more than {} users can be enrolled at once".format(BULK_ENROLLMENT_MAX))
+        result = {'enrolled': [], 'updated': [], 'skipped': [], 'failed': {}}
+        if not user_ids:
+            return result, 200
+        try:
+            skills = self.repo.get_skills(course_id)
+            if skills is None:
+                abort(404, message="Course not found: {}".format(course_id))
+            states = self.repo.get_users_state(course_id, user_ids)
+            finished = set(self.repo.get_finished_users(course_id))
+            result['skipped'] = [
+                user_id for user_id in user_ids if user_id in finished or states.get(user_id, {}).get('current')
+            ]
+            users = [user_id for user_id in user_ids if user_id not in result['skipped']]
+            if not users:
+                return result, 200
+
+            # Parameters are chosen like in ParametersBulk: the user's parameters from another section of the course
+            # first, then the course's default parameters, then the given ones
+            section_params = self.repo.get_section_parameters(course_id, users, skills)
+            prob_list = self.repo.get_model_params(course_id)
+            parameters = {
+                user_id: section_params.get(user_id) or (random.choice(prob_list) if prob_list else args['params'])
+                for user_id in users
+            }
+            self.selector.set_users_parameters(parameters, course_id, skills)
+
+            next_problems = self._choose_first_problems(course_id, users, result['failed'])
+            enrolled = set(self.repo.enroll_users(course_id, next_problems))
+        except DataException as e:
+            abort(500, message="Students cannot be enrolled because of database issues: {}".format(e))
+        except SelectException as e:
+            abort(500, message="Students cannot be enrolled because of next problem selecting issues: {}".format(e))
+        for user_id in users:
+            if user_id in enrolled:
+                result['enrolled'].append(user_id)
+            elif user_id in next_problems:
+                result['updated'].append(user_id)
+        return result, 200
+
+    def _choose_first_problems(self, course_id, users, failed):
+        """
+        Choose first problem of every user
+
+        The pre-assessment problem users start with does not depend on the user, so it is chosen once. Without it the
+        first problem is chosen for every user separately.
+
+        :param failed: dict the error messages of users whose problem cannot be chosen are put in
+        :return: dict with the first problem keyed by user id
+        """
+        first_prob = self.selector.choose_first_problem(course_id, users[0])
+        if first_prob:
+            return {user_id: first_prob for user_id in users}
+        next_problems = {}
+        for user_id in users:
+            try:
+                next_problems[user_id] = self.selector.choose_next_problem(course_id, user_id)
+            except (DataException, SelectException) as e:
+                logger.exception("First problem for user %s cannot be chosen:", user_id)
+                failed[user_id] = str(e)
+        return next_problems
+
+
 problem_parser = reqparse.RequestParser()
 problem_parser.add_argument('problem_name', type=str, required=True,  location='json',
                             help="Please supply a problem name")
@@ -101,8 +250,9 @@ problem_parser.add_argument('posttest', type=bool, location='json',
 
 class Problems(DefaultResource):
     def get(self, course_id, skill_name=None):
-        problems = self._get_request('get_problems', course_id, skill_name)
-        return {'problems': problems}, 200
+        return self._conditional_get(
+            course_id, lambda: ({'problems': self._get_request('get_problems', course_id, skill_name)}, 200)
+        )
 
     def post(self, course_id):
         args = problem_parser.parse_args()
@@ -128,8 +278,9 @@ experiment_parser.add_argument('end_time', type=int, location='json', required=T
 
 class Experiments(DefaultResource):
     def get(self, course_id):
-        exps = self._get_request('get_experiments', course_id)
-        return {'experiments': exps}
+        return self._conditional_get(
+            course_id, lambda: ({'experiments': self._get_request('get_experiments', course_id)}, 200)
+        )
 
     def post(self, course_id):
         args = experiment_parser.parse_args()
@@ -143,8 +294,9 @@ prob_parser.add_argument('prob_list', type=list, location='json', help="Please s
 
 class Probabilities(DefaultResource):
     def get(self, course_id):
-        prob_list = self._get_request('get_model_params', course_id)
-        return {'model_params': prob_list}, 200
+        return self._conditional_get(
+            course_id, lambda: ({'model_params': self._get_request('get_model_params', course_id)}, 200)
+        )
 
     def post(self, course_id):
         args = prob_parser.parse_args()
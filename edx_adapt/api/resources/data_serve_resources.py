@@ -1,18 +1,198 @@
 """
 This file contains api resources for serving data from the course.
 """
+import base64
+import json
+import time
+import zlib
 
-from flask_restful import abort
+import flask
+from flask_restful import abort, reqparse
 
+from edx_adapt.api import admission, serialization
 from edx_adapt.api.resources.base_resource import BaseResource
+from edx_adapt.data import query_log
 from edx_adapt.data.interface import DataException
-from edx_adapt import logger
+from edx_adapt import access_logger, logger
+from edx_adapt.settings import DATA_PAGE_SIZE, DATA_PAGE_SIZE_MAX
+
+# Size of the uncompressed JSON buffered before a chunk is sent
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _stream_users(users, user_data, envelope=None):
+    """
+    Generate JSON object with the data of every user, built and encoded user by user
+
+    Headers are sent before the first user's data is read, so an error in the middle of the stream cannot change the
+    response status: it is logged and the stream is cut, which leaves the JSON unterminated.
+
+    :param users: list of users ids
+    :param user_data: function returning the data of one user by user id
+    :param envelope: (optional) key the users' object is nested in
+    """
+    yield '{{{}:{{'.format(json.dumps(envelope)) if envelope else '{'
+    for i, user in enumerate(users):
+        try:
+            data = user_data(user)
+        except DataException:
+            logger.exception("Data exception, the stream is cut on user %s:", user)
+            return
+        yield '{}{}:{}'.format(',' if i else '', serialization.dumps_json(user), serialization.dumps_json(data))
+    yield '}}' if envelope else '}'
+
+
+def _stream_users_msgpack(users, user_data, envelope=None):
+    """
+    Generate msgpack map with the data of every user, like _stream_users
+    """
+    packer = serialization.msgpack.Packer(use_bin_type=True)
+    if envelope:
+        yield packer.pack_map_header(1) + packer.pack(envelope)
+    yield packer.pack_map_header(len(users))
+    for user in users:
+        try:
+            data = user_data(user)
+        except DataException:
+            logger.exception("Data exception, the stream is cut on user %s:", user)
+            return
+        yield packer.pack(user) + packer.pack(data)
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _buffer(chunks):
+    # Users' data are joined into larger chunks, so small users do not make a write and a compress call each
+    buf, size = [], 0
+    for chunk in chunks:
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= STREAM_CHUNK_SIZE:
+            yield ''.join(buf)
+            buf, size = [], 0
+    if buf:
+        yield ''.join(buf)
+
+
+def _recorded(chunks, method, path, sampled):
+    """
+    Record the queries run while the chunks are generated and log them when the stream ends
+
+    The body of a streamed response is generated after the request's access record is written, the stream's queries
+    are logged in a record of their own.
+    """
+    stats = query_log.start()
+    start = time.time()
+    try:
+        for chunk in chunks:
+            yield chunk
+    finally:
+        query_log.stop(stats)
+        if sampled:
+            duration = time.time() - start
+            access_logger.info(
+                '%s %s streamed %.1fms queries=%d db=%.1fms duplicates=%d', method, path, duration * 1000,
+                stats.count, stats.duration * 1000, stats.duplicates,
+                extra={
+                    'method': method, 'path': path, 'streamed': True, 'duration_ms': round(duration * 1000, 1),
+                    'queries': stats.count, 'db_ms': round(stats.duration * 1000, 1),
+                    'duplicate_queries': stats.duplicates,
+                }
+            )
+
+
+def stream_response(users, user_data, envelope=None, headers=None):
+    """
+    Stream JSON object, or msgpack map if the client asks for it, keyed by user id, gzip-compressed if the client
+    accepts it
+
+    Only one user's data are held in memory at a time. Queries run while the body is streamed are logged to the
+    access logger when the stream ends.
+
+    :param users: list of users ids
+    :param user_data: function returning the data of one user by user id
+    :param envelope: (optional) key the users' object is nested in
+    :param headers: (optional) dict of additional response headers
+    :return: streamed flask.Response
+    """
+    mimetype = serialization.negotiate()
+    stream = _stream_users_msgpack if mimetype == serialization.MSGPACK_MIMETYPE else _stream_users
+    chunks = _buffer(stream(users, user_data, envelope))
+    headers = dict(headers or {}, Vary='Accept-Encoding, Accept' if serialization.msgpack else 'Accept-Encoding')
+    if flask.request.accept_encodings['gzip']:
+        chunks = _gzip(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    chunks = _recorded(chunks, flask.request.method, flask.request.path, flask.g.get('log_sampled', True))
+    return flask.Response(chunks, mimetype=mimetype, headers=headers)
+
+
+def encode_cursor(user_id):
+    return base64.urlsafe_b64encode(json.dumps({'after': user_id}))
+
+
+def decode_cursor(cursor):
+    """
+    :param cursor: cursor returned with the previous page
+    :return: user id the next page starts after
+    """
+    try:
+        return json.loads(base64.urlsafe_b64decode(str(cursor)))['after']
+    except (TypeError, ValueError, KeyError):
+        abort(400, message="Invalid cursor: {}".format(cursor))
+
+
+page_parser = reqparse.RequestParser()
+page_parser.add_argument('limit', type=int, location='args',
+                         help="Optionally supply maximum number of users in the page, up to {}".format(
+                             DATA_PAGE_SIZE_MAX))
+page_parser.add_argument('cursor', type=str, location='args',
+                         help="Optionally supply cursor returned in X-Next-Cursor header of the previous page")
+
+
+class CoursePageResource(BaseResource):
+    """
+    Base for resources serving data of all users of a course, optionally in pages
+    """
+    admission_class = admission.DATA_SERVE
+
+    def _get_users(self, course_id):
+        """
+        Get users whose data are served, a page of users if the limit or cursor is requested
+
+        Pages are ordered by user id and include in progress and finished users.
+
+        :return: list of users ids and dict of response headers with the cursor of the next page
+        """
+        args = page_parser.parse_args()
+        if args['limit'] is None and args['cursor'] is None:
+            users = self.repo.get_in_progress_users(course_id)
+            users.extend(self.repo.get_finished_users(course_id))
+            return users, {}
+        limit = args['limit'] or DATA_PAGE_SIZE
+        if not 0 < limit <= DATA_PAGE_SIZE_MAX:
+            abort(400, message="Limit must be from 1 to {}".format(DATA_PAGE_SIZE_MAX))
+        after = decode_cursor(args['cursor']) if args['cursor'] else None
+        # One more user is read to know whether there is a next page
+        users = self.repo.get_users_page(course_id, after, limit + 1)
+        headers = {}
+        if len(users) > limit:
+            users = users[:limit]
+            headers['X-Next-Cursor'] = encode_cursor(users[-1])
+        return users, headers
 
 
 class SingleProblemRequest(BaseResource):
     """
     Handle request for a user's log on one problem
     """
+    admission_class = admission.DATA_SERVE
 
     def get(self, course_id, user_id, problem_name):
         problog = []
@@ -29,6 +209,8 @@ class UserLogRequest(BaseResource):
     """
     Handle request for a user's log
     """
+    admission_class = admission.DATA_SERVE
+
     def get(self, course_id, user_id):
         log = []
         try:
@@ -39,41 +221,34 @@ class UserLogRequest(BaseResource):
         return {'log': log}
 
 
-class CourseLogRequest(BaseResource):
+class CourseLogRequest(CoursePageResource):
     """
     Handle request for logs from all users of a course
     """
     def get(self, course_id):
-        data = {}
         try:
-            users = self.repo.get_in_progress_users(course_id)
-            users.extend(self.repo.get_finished_users(course_id))
-
-            for user in users:
-                data[user] = self.repo.get_raw_user_data(course_id, user)
-
+            users, headers = self._get_users(course_id)
         except DataException as e:
             logger.error("Data exception: {}".format(e))
             abort(500, message=str(e))
-        return {'log': data}
+        return stream_response(
+            users, lambda user: self.repo.get_raw_user_data(course_id, user), envelope='log', headers=headers
+        )
 
 
 class ExperimentLogRequest(BaseResource):
     """
     Handle request for logs from all users from an experiment (only gives logs for finished users)
     """
+    admission_class = admission.DATA_SERVE
+
     def get(self, course_id, experiment_name):
-        data = {}
         try:
             users = self.repo.get_subjects(course_id, experiment_name)
-
-            for user in users:
-                data[user] = self.repo.get_raw_user_data(course_id, user)
-
         except DataException as e:
             logger.error("Data exception: {}".format(e))
             abort(500, message=str(e))
-        return {'log': data}
+        return stream_response(users, lambda user: self.repo.get_raw_user_data(course_id, user), envelope='log')
 
 
 def _fulfill_correct(repo, course_id, user_id):
@@ -135,6 +310,8 @@ class UserTrajectoryRequest(BaseResource):
     """
     Handle request for a user's trajectories
     """
+    admission_class = admission.DATA_SERVE
+
     def get(self, course_id, user_id):
         blob = {'data': {}, 'trajectories': {}, 'pretest_length': {}, 'posttest_length': {}}
         try:
@@ -146,40 +323,29 @@ class UserTrajectoryRequest(BaseResource):
         return blob
 
 
-class CourseTrajectoryRequest(BaseResource):
+class CourseTrajectoryRequest(CoursePageResource):
     """
     Handle request for logs from all users of a course
     """
     def get(self, course_id):
-        userblobs = {}
         try:
-            users = self.repo.get_in_progress_users(course_id)
-            users.extend(self.repo.get_finished_users(course_id))
-
-            for user in users:
-                blob = fill_user_data(self.repo, course_id, user)
-                userblobs[user] = blob
-
+            users, headers = self._get_users(course_id)
         except DataException as e:
             logger.error("Data exception: {}".format(e))
             abort(500, message=str(e))
-        return userblobs
+        return stream_response(users, lambda user: fill_user_data(self.repo, course_id, user), headers=headers)
 
 
 class ExperimentTrajectoryRequest(BaseResource):
     """
     Handle request for logs from all users from an experiment (only gives logs for finished users)
     """
+    admission_class = admission.DATA_SERVE
+
     def get(self, course_id, experiment_name):
-        userblobs = {}
         try:
             users = self.repo.get_subjects(course_id, experiment_name)
-
-            for user in users:
-                blob = fill_user_data(self.repo, course_id, user)
-                userblobs[user] = blob
-
         except DataException as e:
             logger.error("Data exception: {}".format(e))
             abort(500, message=str(e))
-        return userblobs
+        return stream_response(users, lambda user: fill_user_data(self.repo, course_id, user))
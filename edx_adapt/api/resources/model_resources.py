@@ -4,25 +4,27 @@ import random
 
 from flask_restful import abort, reqparse
 
+from edx_adapt.api import admission, validation
 from edx_adapt.api.resources.base_resource import BaseResource
 from edx_adapt.data.interface import DataException
 from edx_adapt import logger
 from edx_adapt.select.interface import SelectException
 
-param_parser = reqparse.RequestParser()
-param_parser.add_argument('course_id', type=str, location='json', help="Optionally supply a course id")
-param_parser.add_argument('user_id', type=str, location='json', help="Optionally supply a user ID")
-param_parser.add_argument('skill_name', type=str, location='json', help="Optionally supply the name of a skill")
+param_parser = validation.JsonBodyParser()
+param_parser.add_argument('course_id', type=str, help="Optionally supply a course id")
+param_parser.add_argument('user_id', type=str, help="Optionally supply a user ID")
+param_parser.add_argument('skill_name', type=str, help="Optionally supply the name of a skill")
 param_parser.add_argument(
     'params',
     type=dict,
-    location='json',
     required=True,
     help="Please supply the desired model parameters as a dictionary",
 )
 
 
 class Parameters(BaseResource):
+    admission_class = admission.ADMIN
+
     def get(self):
         param_list = []
         try:
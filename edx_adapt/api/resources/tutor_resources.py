@@ -3,41 +3,59 @@ This file contains api resources for interacting with the tutor as users take th
 """
 import time
 
-from flask_restful import abort, reqparse
+from flask_restful import abort, inputs, reqparse
 
+from edx_adapt.api import admission, validation
 from edx_adapt.api.resources.base_resource import BaseResource
 from edx_adapt.data.interface import DataException
-from edx_adapt import logger
+from edx_adapt import logger, parallel
 from edx_adapt.select.interface import SelectException
+from edx_adapt.settings import LONG_POLL_RECHECK_INTERVAL, LONG_POLL_TIMEOUT
 
 
 class DefaultResource(BaseResource):
-    def run_selector(self, course_id, user_id):
+    def run_selector(self, course_id, user_id, answer=None):
         """
         Run the problem selection sequence
+
+        :param answer: (optional) parsed arguments of the response which triggered the selection, used to commit the
+                       next problem precomputed for it
         """
         nex = self.repo.get_next_problem(course_id, user_id)
 
         # only run if no next problem has been selected yet, or there was an error previously
         if nex is None or 'error' in nex:
-            logger.info("SELECTOR CHOOSING NEXT PROBLEM")
-            prob = self.selector.choose_next_problem(course_id, user_id)
-            logger.info("FINISHED CHOOSING NEXT PROBLEM: {}".format(str(prob)))
-            self.repo.set_next_problem(course_id, user_id, prob)
+            prob = self.speculator.commit(course_id, user_id, answer) if answer else None
+            if prob is None:
+                # selection itself runs in the background, user's state is reported as pending until it is done
+                self.selection_pool.submit(course_id, user_id)
+                # the pool changes user's state through the shared repository, not this request's one
+                self.repo.invalidate()
+            else:
+                logger.info("PRECOMPUTED NEXT PROBLEM COMMITTED: %s", prob)
+                self.repo.set_next_problem(course_id, user_id, prob)
         else:
             logger.info("SELECTION NOT REQUIRED!")
 
     def _rotate_problem(self, next_problem, course_id, user_id, **args):
         if next_problem and 'error' not in next_problem and args['problem'] == next_problem.get('problem_name'):
             self.repo.advance_problem(course_id, user_id)
+            # the problem is served now, start precomputing what follows it
+            self.speculator.submit(course_id, user_id, next_problem)
 
+    def _cached_status(self, course_id, user_id, revision=None):
+        """
+        Get user's status, it is computed once per revision of the user's state
 
-class UserProblems(DefaultResource):
-    """
-    Handle request for user's current and next problem.
-    """
-    def _check_current_done(self, course_id, user_id, current):
-        log = self.repo.get_raw_user_data(course_id, user_id)
+        :param revision: (optional) revision of the user's state, read if not given
+        :return: dict with next and current problems, done flags and pending flag
+        """
+        if revision is None:
+            revision = self.repo.get_user_revision(course_id, user_id)
+        return self.status_cache.get((course_id, user_id), revision, lambda: self._get_status(course_id, user_id))
+
+    @staticmethod
+    def _check_current_done(log, current):
         done_with_current = any(
             [x for x in log if x['type'] == 'response' and
              x['problem']['problem_name'] == current['problem_name'] and x['correct'] == 1]
@@ -48,25 +66,25 @@ class UserProblems(DefaultResource):
             done_with_current = any([x for x in log if x['type'] == 'response'])
         return done_with_current
 
-    def _check_course_done(self, course_id, user_id):
-        fin = self.repo.get_finished_users(course_id)
+    @staticmethod
+    def _check_course_done(user_id, fin, answers, num_pretest):
         done_with_course = user_id in fin
         if not done_with_course:
-            answers = self.repo.get_all_interactions(course_id, user_id)
             done_with_course = (
                 # Course set to be done if student answer correctly on more than a half of pre-assessment problems
-                sum([x['correct'] for x in answers if (x['problem']['pretest'])]) > (
-                    self.repo.get_num_pretest(course_id) // 2
-                )
+                sum([x['correct'] for x in answers if (x['problem']['pretest'])]) > num_pretest // 2
             )
         return done_with_course
 
-    def get(self, course_id, user_id):
+    def _get_status(self, course_id, user_id):
         try:
-            nex = self.repo.get_next_problem(course_id, user_id)
-            cur = self.repo.get_current_problem(course_id, user_id)
+            state = self.repo.get_user_state(course_id, user_id)
         except DataException as e:
             abort(404, message=e.message)
+        nex, cur, pending = state['next'], state['current'], state['pending']
+        if pending:
+            # job of a selection is lost if its process is restarted, the user would be left pending forever
+            self.selection_pool.resubmit_lost(course_id, user_id, state['pending_since'])
 
         okay = bool(nex and 'error' not in nex)
 
@@ -75,33 +93,156 @@ class UserProblems(DefaultResource):
             done_with_current = True
         else:
             try:
-                done_with_current = self._check_current_done(course_id, user_id, cur)
-                done_with_course = self._check_course_done(course_id, user_id)
+                # Data of both checks is read at once, its queries are independent
+                log, fin, answers, num_pretest = parallel.run(
+                    lambda: self.repo.get_raw_user_data(course_id, user_id),
+                    lambda: self.repo.get_finished_users(course_id),
+                    lambda: self.repo.get_all_interactions(course_id, user_id),
+                    lambda: self.repo.get_num_pretest(course_id),
+                )
+                done_with_current = self._check_current_done(log, cur)
+                done_with_course = self._check_course_done(user_id, fin, answers, num_pretest)
             except DataException as e:
                 logger.exception("DATA EXCEPTION: ")
                 abort(500, message=str(e))
         return {
             "next": nex, "current": cur, "done_with_current": done_with_current, "okay": okay,
-            "done_with_course": done_with_course
+            "done_with_course": done_with_course, "pending": pending
         }
 
 
+class UserProblems(DefaultResource):
+    """
+    Handle request for user's current and next problem.
+    """
+    admission_class = admission.TUTOR_READ
+
+    def get(self, course_id, user_id):
+        try:
+            revision = self.repo.get_user_revision(course_id, user_id)
+        except DataException as e:
+            abort(404, message=e.message)
+        # Tutor polls the status several times per page, it is computed once per revision of the user's state
+        return self._cached_status(course_id, user_id, revision)
+
+
+wait_parser = reqparse.RequestParser()
+wait_parser.add_argument('rev', type=int, location='args',
+                         help="Optionally supply the revision of the status known to the client, returned by this "
+                              "endpoint; without it the current status is returned at once")
+wait_parser.add_argument('timeout', type=float, location='args',
+                         help="Optionally supply the time in seconds to wait for a change of the status")
+
+
+class UserStatusWait(UserProblems):
+    """
+    Long-poll for a change of user's status, e.g. for the next problem to be selected.
+
+    The request returns as soon as the user's state differs from the given revision, or with the unchanged status
+    after the timeout.
+    """
+    admission_class = admission.TUTOR_WAIT
+
+    def get(self, course_id, user_id):
+        args = wait_parser.parse_args()
+        timeout = LONG_POLL_TIMEOUT if args['timeout'] is None else min(max(args['timeout'], 0), LONG_POLL_TIMEOUT)
+        try:
+            if args['rev'] is None:
+                revision = self.repo.get_user_revision(course_id, user_id)
+            else:
+                revision = self.repo.wait_user_revision(
+                    course_id, user_id, args['rev'], timeout, LONG_POLL_RECHECK_INTERVAL
+                )
+        except DataException as e:
+            abort(404, message=e.message)
+        return dict(self._cached_status(course_id, user_id, revision), rev=revision)
+
+
+users_status_parser = reqparse.RequestParser()
+users_status_parser.add_argument('user_ids', type=list, required=True, location='json',
+                                 help="Please supply a list of user IDs")
+users_status_parser.add_argument('done_checks', type=bool, default=True, location='json',
+                                 help="Optionally set False to skip done_with_current and done_with_course checks")
+
+all_users_status_parser = reqparse.RequestParser()
+all_users_status_parser.add_argument('done_checks', type=inputs.boolean, default=True, location='args',
+                                     help="Optionally set false to skip done_with_current and done_with_course checks")
+
+
+class UsersStatus(DefaultResource):
+    """
+    Handle request for current and next problems of several users, or of all users of a course.
+
+    Status of every user is the same as the one returned by UserProblems, but it is read for all users with a constant
+    number of queries.
+    """
+    admission_class = admission.DATA_SERVE
+
+    def get(self, course_id):
+        args = all_users_status_parser.parse_args()
+        return self._get_status(course_id, None, args['done_checks'])
+
+    def post(self, course_id):
+        args = users_status_parser.parse_args()
+        return self._get_status(course_id, args['user_ids'], args['done_checks'])
+
+    def _get_status(self, course_id, user_ids, done_checks):
+        try:
+            states = self.repo.get_users_state(course_id, user_ids)
+            if done_checks and states:
+                finished, num_pretest, progress = parallel.run(
+                    lambda: set(self.repo.get_finished_users(course_id) or []),
+                    lambda: self.repo.get_num_pretest(course_id),
+                    lambda: self.repo.get_users_progress(course_id, states.keys()),
+                )
+                half_pretest = num_pretest // 2
+        except DataException as e:
+            logger.exception("DATA EXCEPTION: ")
+            abort(500, message=str(e))
+
+        users = {}
+        for user_id, state in states.iteritems():
+            nex, cur = state['next'], state['current']
+            status = {
+                "next": nex, "current": cur, "okay": bool(nex and 'error' not in nex), "pending": state['pending']
+            }
+            if done_checks:
+                summary = progress.get(user_id, {'responses': 0, 'correct_problems': [], 'pretest_correct': 0})
+                if not cur:
+                    status["done_with_current"], status["done_with_course"] = True, False
+                else:
+                    # account for test questions: user is "done" after they input any answer
+                    status["done_with_current"] = (
+                        cur['problem_name'] in summary['correct_problems'] or
+                        bool((cur["pretest"] or cur["posttest"]) and summary['responses'])
+                    )
+                    status["done_with_course"] = user_id in finished or summary['pretest_correct'] > half_pretest
+            users[user_id] = status
+        result = {"users": users}
+        if user_ids is not None:
+            result["not_found"] = [user_id for user_id in user_ids if user_id not in states]
+        return result
+
+
 # Argument parser for posting a user response
-result_parser = reqparse.RequestParser()
-result_parser.add_argument('problem', type=str, required=True, location='json',
+result_parser = validation.JsonBodyParser()
+result_parser.add_argument('problem', type=str, required=True,
                            help="Must supply the name of the problem which the user answered")
-result_parser.add_argument('correct', type=int, required=True, location='json',
+result_parser.add_argument('correct', type=int, required=True,
                            help="Must supply correctness, 0 for incorrect, 1 for correct")
-result_parser.add_argument('attempt', type=int, required=True, location='json',
+result_parser.add_argument('attempt', type=int, required=True,
                            help="Must supply the attempt number, starting from 1 for the first attempt")
-result_parser.add_argument('unix_seconds', type=int, location='json',
-                           help="Optionally supply timestamp in seconds since unix epoch")
+result_parser.add_argument('unix_seconds', type=int, help="Optionally supply timestamp in seconds since unix epoch")
+result_parser.add_argument('return_status', type=bool, default=False,
+                           help="Optionally set true to get the user's updated status in the response")
 
 
 class UserInteraction(DefaultResource):
     """
     Post a user's response to their current problem.
     """
+    admission_class = admission.TUTOR_WRITE
+
     def post(self, course_id, user_id):
         args = result_parser.parse_args()
         timestamp = args['unix_seconds'] or int(time.time())
@@ -114,7 +255,9 @@ class UserInteraction(DefaultResource):
             self.repo.post_interaction(course_id, args['problem'], user_id, args['correct'], args['attempt'], timestamp)
 
             # the user needs a new problem, start choosing one
-            self.run_selector(course_id, user_id)
+            self.run_selector(course_id, user_id, answer=args)
+            # Status of the new state saves the tutor a status request, it is cached for the ones still made
+            status = self._cached_status(course_id, user_id) if args['return_status'] else None
         except SelectException as e:
             abort(500, message="Interaction successfully stored, but an error occurred starting "
                                "a problem selection: " + e.message)
@@ -122,28 +265,38 @@ class UserInteraction(DefaultResource):
             logger.exception("DATA EXCEPTION:")
             abort(500, message=e.message)
 
-        return {"success": True}, 201
+        if status is None:
+            return {"success": True}, 201
+        return {"success": True, "status": status}, 201
 
-load_parser = reqparse.RequestParser()
-load_parser.add_argument('problem', required=True, help="Must supply the name of the problem loaded", location='json')
-load_parser.add_argument('unix_seconds', type=int, help="Optionally supply timestamp in seconds since unix epoch",
-                         location='json')
+load_parser = validation.JsonBodyParser()
+load_parser.add_argument('problem', required=True, help="Must supply the name of the problem loaded")
+load_parser.add_argument('unix_seconds', type=int, help="Optionally supply timestamp in seconds since unix epoch")
+load_parser.add_argument('return_status', type=bool, default=False,
+                         help="Optionally set true to get the user's updated status in the response")
 
 
 class UserPageLoad(DefaultResource):
     """
     Post the time when a user loads a problem. Used to log time spent solving a problem.
     """
+    admission_class = admission.TUTOR_WRITE
+
     def post(self, course_id, user_id):
         args = load_parser.parse_args()
         timestamp = args['unix_seconds'] or int(time.time())
 
         try:
-            self.repo.post_load(course_id, args['problem'], user_id, timestamp)
-            nex = self.repo.get_next_problem(course_id, user_id)
+            _, nex = parallel.run(
+                lambda: self.repo.post_load(course_id, args['problem'], user_id, timestamp),
+                lambda: self.repo.get_next_problem(course_id, user_id),
+            )
             self._rotate_problem(nex, course_id, user_id, **args)
+            status = self._cached_status(course_id, user_id) if args['return_status'] else None
         except DataException as e:
             logger.exception("DATA EXCEPTION:")
             abort(500, message=e.message)
 
-        return {"success": True}, 201
+        if status is None:
+            return {"success": True}, 201
+        return {"success": True, "status": status}, 201
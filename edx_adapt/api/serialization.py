@@ -0,0 +1,91 @@
+"""
+Response serialization of the API: compact JSON with the encoder chosen in settings, and msgpack if the client accepts
+it.
+
+msgpack is offered only if the msgpack package is installed, clients ask for it with "Accept: application/x-msgpack".
+Encoders can be compared on the course log and trajectory payloads with tools/serialization_benchmark.py.
+"""
+import importlib
+import json
+
+import flask
+
+from edx_adapt.settings import JSON_ENCODER
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+
+# Options keeping the output of every encoder the same: no whitespace, no escaped slashes, no rounded floats
+_JSON_OPTIONS = {
+    'json': {'separators': (',', ':')},
+    'simplejson': {'separators': (',', ':')},
+    'ujson': {'escape_forward_slashes': False, 'double_precision': 15},
+}
+_json_encoder = importlib.import_module(JSON_ENCODER)
+_json_options = _JSON_OPTIONS[JSON_ENCODER]
+
+
+def dumps_json(data):
+    """
+    Encode data as compact JSON, falling back to the standard encoder for values the chosen one cannot encode
+    """
+    try:
+        return _json_encoder.dumps(data, **_json_options)
+    except (TypeError, OverflowError):
+        if _json_encoder is json:
+            raise
+    return json.dumps(data, **_JSON_OPTIONS['json'])
+
+
+def dumps_msgpack(data):
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def mimetypes():
+    """
+    :return: list of the response mimetypes available in this process, the default one first
+    """
+    return [JSON_MIMETYPE, MSGPACK_MIMETYPE] if msgpack else [JSON_MIMETYPE]
+
+
+def negotiate():
+    """
+    Choose the response mimetype by the request's Accept header
+
+    :return: mimetype, JSON if the client accepts any type or none of the available ones
+    """
+    return flask.request.accept_mimetypes.best_match(mimetypes(), default=JSON_MIMETYPE) or JSON_MIMETYPE
+
+
+def _make_response(body, code, headers, mimetype):
+    response = flask.make_response(body, code)
+    response.headers.extend(headers or {})
+    response.headers['Content-Type'] = mimetype
+    if msgpack:
+        # Caches must not serve the representation chosen for another client
+        response.vary.add('Accept')
+    return response
+
+
+def output_json(data, code, headers=None):
+    return _make_response(dumps_json(data), code, headers, JSON_MIMETYPE)
+
+
+def output_msgpack(data, code, headers=None):
+    return _make_response(dumps_msgpack(data), code, headers, MSGPACK_MIMETYPE)
+
+
+def register(api):
+    """
+    Register the representations on the flask_restful Api, JSON stays the default one
+
+    :param api: flask_restful.Api
+    """
+    api.representations[JSON_MIMETYPE] = output_json
+    if msgpack:
+        api.representations[MSGPACK_MIMETYPE] = output_msgpack
@@ -0,0 +1,85 @@
+"""
+Cache of the users' statuses served to the polling tutor.
+
+A status is cached with the revision of the user's state it is computed for, and served while the revision is the
+same and the entry is fresh. Every write changing the user's problems or responses bumps the revision, so the cached
+status is invalidated at once in every process. Concurrent requests for the same status wait for one computation
+instead of running it each.
+"""
+import sys
+import threading
+import time
+
+
+class _Flight(object):
+    """
+    Computation in progress, shared by the requests waiting for it
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.exc_info = None
+
+
+class StatusCache(object):
+    """
+    Statuses keyed by user, with the revision they are computed for
+    """
+
+    def __init__(self, ttl, max_size=10000):
+        """
+        :param ttl: time in seconds a status is served from the cache
+        :param max_size: (optional) number of cached statuses, expired ones are dropped when it is exceeded
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}  # key: (expiry time, revision, status)
+        self._flights = {}  # (key, revision): _Flight
+        self._lock = threading.Lock()
+
+    def get(self, key, revision, loader):
+        """
+        Get the status of the given revision, compute it once if it is not cached
+
+        :param key: key of the user, e.g. tuple of course id and user id
+        :param revision: current revision of the user's state
+        :param loader: function computing the status, its exception is raised in all requests waiting for it
+        :return: status
+        """
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and cached[1] == revision and cached[0] > time.time():
+                return cached[2]
+            flight = self._flights.get((key, revision))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(key, revision)] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.exc_info:
+                raise flight.exc_info[0], flight.exc_info[1], flight.exc_info[2]
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception:
+            flight.exc_info = sys.exc_info()
+            raise
+        else:
+            with self._lock:
+                if len(self._entries) >= self.max_size:
+                    self._prune()
+                self._entries[key] = (time.time() + self.ttl, revision, flight.value)
+            return flight.value
+        finally:
+            with self._lock:
+                self._flights.pop((key, revision), None)
+            flight.done.set()
+
+    def _prune(self):
+        now = time.time()
+        for key in [key for key, cached in self._entries.iteritems() if cached[0] <= now]:
+            del self._entries[key]
+        if len(self._entries) >= self.max_size:
+            self._entries.clear()
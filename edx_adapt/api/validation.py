@@ -0,0 +1,89 @@
+"""
+Validation of JSON request bodies, replacing flask_restful's reqparse on the busiest endpoints.
+
+Arguments are declared like reqparse ones and are parsed to the same values with the same error messages. What reqparse
+works out for every argument on every request (the source of the value, operators, the chain of type conversion
+attempts) is resolved once when the argument is added, so parsing a body is a single pass over the declared arguments.
+tools/validation_benchmark.py compares both parsers.
+"""
+import flask
+from flask_restful import abort
+
+# Message of a missing required argument without help, the same as reqparse's one
+MISSING_MESSAGE = u"Missing required parameter in the JSON body"
+# Types converting any JSON value with a single argument call, the result is the same as reqparse's conversion
+_PLAIN_TYPES = (int, long, float, bool, str, unicode, list, dict)
+
+
+def _converter(name, type):
+    """
+    Get the function converting the argument's value, None values are not converted
+    """
+    if type in _PLAIN_TYPES:
+        return type
+
+    def convert(value):
+        # Same calls as reqparse makes, types of flask_restful.inputs use the argument's name in their errors
+        try:
+            return type(value, name, '=')
+        except TypeError:
+            try:
+                return type(value, name)
+            except TypeError:
+                return type(value)
+    return convert
+
+
+def _fail(name, help, error):
+    abort(400, message={name: help.format(error_msg=error) if help else error})
+
+
+class JsonBodyParser(object):
+    """
+    Parser of the arguments of a JSON request body
+    """
+
+    def __init__(self):
+        self._arguments = []  # (name, converter, required, default, help)
+
+    def add_argument(self, name, type=unicode, required=False, default=None, help=None):
+        """
+        Declare an argument, options have the same meaning as reqparse.Argument ones
+
+        :param name: key of the argument in the JSON body
+        :param type: (optional) function converting the value, called with the value, or with the value, the name and
+                     the operator like reqparse does
+        :param required: (optional) flag to reject the request if the argument is missing
+        :param default: (optional) value of a missing argument
+        :param help: (optional) error message, {error_msg} is replaced by the conversion error
+        :return: the parser itself
+        """
+        self._arguments.append((name, _converter(name, type), required, default, help))
+        return self
+
+    def parse_args(self, body=None):
+        """
+        Parse the arguments, the request is aborted with 400 on the first invalid or missing required argument
+
+        :param body: (optional) decoded JSON body, the body of the current request by default
+        :return: dict of all declared arguments, missing ones are set to their default
+        """
+        if body is None:
+            body = flask.request.get_json()
+        if not isinstance(body, dict):
+            body = {}
+        args = {}
+        for name, convert, required, default, help in self._arguments:
+            if name not in body:
+                if required:
+                    _fail(name, help, MISSING_MESSAGE)
+                args[name] = default
+                continue
+            value = body[name]
+            if value is not None:
+                try:
+                    value = convert(value)
+                except Exception as e:
+                    _fail(name, help, unicode(e))
+            args[name] = value
+        return args
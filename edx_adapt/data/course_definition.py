@@ -0,0 +1,203 @@
+"""
+Full course definition: skills, problems, experiments and default model parameters of a course, imported at once.
+
+Definition is a dict: {
+    "skills": ["center", "shape"],
+    "problems": [
+        {"problem_name": "Pre_assessment_0", "tutor_url": "http://...", "skills": ["center"], "pretest": true}
+    ],
+    "experiments": [{"experiment_name": "test", "start_time": 1462736963, "end_time": 1999999999}],
+    "model_params": [{"threshold": 0.9, "ps": 0.01, "pi": 0.1, "pg": 0.01, "pt": 0.6}]
+}
+"""
+import csv
+
+from interface import DataException
+
+# Skill every course has, problems without a skill are given it
+NONE_SKILL = 'None'
+EXPERIMENT_FIELDS = ('experiment_name', 'start_time', 'end_time')
+# Sections of the definition, each one is optional and replaces the course's values only if present
+SECTIONS = ('skills', 'problems', 'experiments', 'model_params')
+
+
+def validate(definition, known_skills=()):
+    """
+    Check the course definition and bring it to the form it is stored in
+
+    Only the sections present in the definition are returned, the course keeps its values of the missing ones. All
+    errors are reported at once, so the definition can be fixed in one go.
+
+    :param definition: course definition dict
+    :param known_skills: (optional) skills of the course, problems are checked against them if the definition has none
+    :return: dict with the present sections of 'skills', 'problems', 'experiments' and 'model_params' lists
+    """
+    sections = _get_sections(definition)
+    errors = []
+    catalog = {}
+    if 'skills' in sections:
+        catalog['skills'] = _validate_skills(sections['skills'], errors)
+    if 'problems' in sections:
+        catalog['problems'] = _validate_problems(sections['problems'], catalog.get('skills', known_skills), errors)
+    if 'experiments' in sections:
+        catalog['experiments'] = _validate_experiments(sections['experiments'], errors)
+    if 'model_params' in sections:
+        catalog['model_params'] = _validate_model_params(sections['model_params'], errors)
+    _raise_errors(errors)
+    return catalog
+
+
+def _get_sections(definition):
+    """
+    :return: dict of the lists of the sections present in the definition
+    """
+    if not isinstance(definition, dict):
+        raise DataException("Course definition must be a dict")
+    sections = {section: definition[section] for section in SECTIONS if definition.get(section) is not None}
+    _raise_errors(["'{}' must be a list".format(section) for section, values in sorted(sections.iteritems())
+                   if not isinstance(values, list)])
+    return sections
+
+
+def _raise_errors(errors):
+    if errors:
+        raise DataException("Invalid course definition: {}".format('; '.join(errors)))
+
+
+def _validate_skills(skills, errors):
+    """
+    :param skills: list of skill names
+    :param errors: list the found errors are appended to
+    :return: list of valid skills
+    """
+    valid = []
+    for skill in skills:
+        if not isinstance(skill, basestring) or not skill:
+            errors.append("Skill name must be a non empty string: {!r}".format(skill))
+        elif skill in valid:
+            errors.append("Duplicate skill: {}".format(skill))
+        else:
+            valid.append(skill)
+    return valid
+
+
+def _validate_problems(problems, skills, errors):
+    """
+    :param problems: list of problem dicts
+    :param skills: skills of the course the problems may have
+    :param errors: list the found errors are appended to
+    :return: list of valid problems
+    """
+    valid = []
+    problem_names = set()
+    for problem in problems:
+        if not isinstance(problem, dict) or not problem.get('problem_name') or not problem.get('tutor_url'):
+            errors.append("Problem must have 'problem_name' and 'tutor_url': {!r}".format(problem))
+            continue
+        if problem['problem_name'] in problem_names:
+            errors.append("Duplicate problem: {}".format(problem['problem_name']))
+        problem_names.add(problem['problem_name'])
+        problem = _validate_problem(problem, skills, errors)
+        if problem:
+            valid.append(problem)
+    return valid
+
+
+def _validate_problem(problem, skills, errors):
+    """
+    :return: problem in the form it is stored in, None if it has no skills
+    """
+    name = problem['problem_name']
+    problem_skills = problem.get('skills') or []
+    if not isinstance(problem_skills, list) or not problem_skills:
+        errors.append("Problem {} must have a list of skills".format(name))
+        return None
+    unknown_skills = [skill for skill in problem_skills if skill not in skills]
+    if unknown_skills:
+        errors.append("No such skill(s) of problem {}: {}".format(name, unknown_skills))
+    pretest, posttest = bool(problem.get('pretest')), bool(problem.get('posttest'))
+    if pretest and posttest:
+        errors.append("Problem {} cannot be both pretest and posttest".format(name))
+    return {
+        'problem_name': name,
+        'tutor_url': problem['tutor_url'],
+        'pretest': pretest,
+        'posttest': posttest,
+        'skills': problem_skills
+    }
+
+
+def _validate_experiments(experiments, errors):
+    """
+    :param experiments: list of experiment dicts
+    :param errors: list the found errors are appended to
+    :return: list of valid experiments
+    """
+    valid = []
+    experiment_names = set()
+    for experiment in experiments:
+        if not isinstance(experiment, dict) or any(experiment.get(field) is None for field in EXPERIMENT_FIELDS):
+            errors.append("Experiment must have {}: {!r}".format(', '.join(EXPERIMENT_FIELDS), experiment))
+            continue
+        name = experiment['experiment_name']
+        if name in experiment_names:
+            errors.append("Duplicate experiment: {}".format(name))
+        experiment_names.add(name)
+        try:
+            valid.append({
+                'experiment_name': name,
+                'start_time': int(experiment['start_time']),
+                'end_time': int(experiment['end_time'])
+            })
+        except (TypeError, ValueError):
+            errors.append("Start and end time of experiment {} must be unix seconds".format(name))
+    return valid
+
+
+def _validate_model_params(model_params, errors):
+    """
+    :param model_params: list of model parameter dicts
+    :param errors: list the found errors are appended to
+    :return: the model parameters
+    """
+    for params in model_params:
+        if not isinstance(params, dict):
+            errors.append("Model parameters must be a dict: {!r}".format(params))
+    return model_params
+
+
+def from_csv(skills_file, problems_file, tutor_url):
+    """
+    Build the course definition from skills.csv and problems.csv files, see edx-adapt/data/BKT for samples
+
+    Problem names containing "Pre_a" are pretest and ones containing "Post_a" are posttest problems, like in
+    tools/course_setup.py.
+
+    :param skills_file: file-like object with rows: section, problem index, skill name
+    :param problems_file: file-like object with rows: problem name, skill name
+    :param tutor_url: url of the problem's page with {problem_name} placeholder
+    :return: course definition dict
+    """
+    skills = []
+    for row in csv.reader(skills_file):
+        if len(row) < 3:
+            continue
+        skill = row[2].strip()
+        if skill not in skills:
+            skills.append(skill)
+    if NONE_SKILL not in skills:
+        skills.append(NONE_SKILL)
+
+    problems = []
+    for row in csv.reader(problems_file):
+        if len(row) < 2:
+            continue
+        name, skill = row[0].strip(), row[1].strip()
+        problems.append({
+            'problem_name': name,
+            'tutor_url': tutor_url.format(problem_name=name),
+            'skills': [skill or NONE_SKILL],
+            'pretest': 'Pre_a' in name,
+            'posttest': 'Post_a' in name
+        })
+    return {'skills': skills, 'problems': problems}
@@ -1,9 +1,17 @@
 from datetime import datetime
+import time
 
+import course_definition
 import interface
 from edx_adapt import logger
+from problem_index import ProblemIndexCache
+from state_notifier import UserStateNotifier
+from version_cache import VersionCache
+from edx_adapt.settings import CATALOG_VERSION_TTL
 
 COLL_SUFFIX = {'log': '_log', 'user_problem': '_problems'}
+# Generic collection's key of the course list version
+COURSE_LIST_VERSION_KEY = 'course_list_version'
 
 
 class CourseRepositoryMongo(interface.DataInterface):
@@ -12,20 +20,42 @@ class CourseRepositoryMongo(interface.DataInterface):
     """
     def __init__(self, storage_module):
         super(CourseRepositoryMongo, self).__init__(storage_module)
+        self.problem_indexes = ProblemIndexCache()
+        self.catalog_versions = VersionCache(CATALOG_VERSION_TTL)
+        self.state_notifier = UserStateNotifier()
+
+    def ensure_indexes(self):
+        """
+        Create the collections and indexes of the generic data and of every course, existing ones are left as they are
+
+        It is run once per deployment by the migration command, see edx_adapt/migrate.py, not on every start of the
+        application.
+
+        :return: list of the course ids whose collections are checked
+        """
         try:
             # @type self.store: StorageInterface
             self.store.create_table("Generic", [['key', 'ascending']], index_unique=True)
             self.store.create_table('Courses', index_fields=[['course_id', 'ascending']], index_unique=True)
         except interface.DataException:
             logger.exception("(Generic table already existing is okay) Make sure this isn't a problem:")
-            pass
+        course_ids = self.get_course_ids()
+        for course_id in course_ids:
+            self._create_course_tables(course_id)
+        return course_ids
 
-    def post_course(self, course_id):
+    def warm_up(self):
         """
-        Create courses related document in Courses collection
+        Build the problem index of every course, so the first requests of the process do not wait for it
 
-        :param course_id: ID of the Course
+        :return: number of the loaded courses
         """
+        course_ids = self.get_course_ids()
+        for course_id in course_ids:
+            self.get_problem_index(course_id)
+        return len(course_ids)
+
+    def _create_course_tables(self, course_id):
         coll_log = course_id + COLL_SUFFIX['log']
         coll_user_problem = course_id + COLL_SUFFIX['user_problem']
         self.store.create_table(
@@ -37,6 +67,14 @@ class CourseRepositoryMongo(interface.DataInterface):
             ],
             index_unique=True)
         self.store.create_table(coll_user_problem, index_fields=[['student_id', 'ascending']], index_unique=True)
+
+    def post_course(self, course_id):
+        """
+        Create courses related document in Courses collection
+
+        :param course_id: ID of the Course
+        """
+        self._create_course_tables(course_id)
         data_dict = {
             'course_id': course_id,
             'model_params': [],
@@ -44,9 +82,13 @@ class CourseRepositoryMongo(interface.DataInterface):
             'users_finished': [],
             'skills': [],
             'problems': [],
-            'experiments': []
+            'experiments': [],
+            'catalog_version': 0
         }
         self.store.record_data(table='Courses', data=data_dict)
+        self.store.update_doc('Generic', {'key': COURSE_LIST_VERSION_KEY}, {'$inc': {'val': 1}}, new=True)
+        self.catalog_versions.invalidate(None)
+        self.catalog_versions.invalidate(course_id)
 
     def post_skill(self, course_id, skill_name):
         """
@@ -55,6 +97,7 @@ class CourseRepositoryMongo(interface.DataInterface):
         :param skill_name: name of the added skill
         """
         self.store.course_append(course_id, 'skills', skill_name)
+        self._catalog_changed(course_id)
 
     def _add_problem(self, course_id, skill_names, problem_name, tutor_url, b_pretest, b_posttest):
         """
@@ -79,6 +122,74 @@ class CourseRepositoryMongo(interface.DataInterface):
                 'skills': skill_names
             }
         )
+        self._catalog_changed(course_id)
+
+    def import_course(self, course_id, definition):
+        """
+        Replace the course's skills, problems, experiments and default model parameters with the given definition
+
+        The definition is validated as a whole and written in one update, the course is created if it does not exist.
+        Sections missing in the definition are left as they are, e.g. a CSV import keeps experiments and parameters.
+
+        :param course_id: ID of the Course
+        :param definition: course definition dict, see course_definition module
+        :return: dict with the number of imported skills, problems, experiments and model_params, of present sections
+        """
+        course = self.store.course_get_fields(course_id, ['_id', 'skills'])
+        catalog = course_definition.validate(definition, known_skills=course.get('skills', []) if course else [])
+        if not course:
+            self.post_course(course_id)
+        update = {'$inc': {'catalog_version': 1}}
+        if catalog:
+            update['$set'] = catalog
+        self.store.update_doc('Courses', {'course_id': course_id}, update)
+        self.catalog_versions.invalidate(course_id)
+        self.discard_speculative_problems(course_id)
+        return {field: len(values) for field, values in catalog.iteritems()}
+
+    def _catalog_changed(self, course_id):
+        """
+        Bump version of the course's catalog, and drop next problems precomputed with the old one
+
+        :param course_id: ID of the Course
+        """
+        self._bump_catalog_version(course_id)
+        self.discard_speculative_problems(course_id)
+
+    def _bump_catalog_version(self, course_id):
+        """
+        Bump version of the course's catalog: skills, problems, experiments and model parameters
+
+        :param course_id: ID of the Course
+        """
+        self.store.update_doc('Courses', {'course_id': course_id}, {'$inc': {'catalog_version': 1}})
+        self.catalog_versions.invalidate(course_id)
+
+    def get_catalog_version(self, course_id=None):
+        """
+        Get version of the course's catalog, or of the course list
+
+        Versions are cached in the process for CATALOG_VERSION_TTL seconds, so a change made by another process may be
+        seen later.
+
+        :param course_id: (optional) course id, if not given the version of the course list is returned
+        :return: opaque version string, None if the course is not found
+        """
+        return self.catalog_versions.get(course_id, lambda: self._load_catalog_version(course_id))
+
+    def _load_catalog_version(self, course_id):
+        # Version is prefixed by the document id, so versions of a re-created course or course list never repeat
+        if course_id is None:
+            entry = self.store.get_entry('Generic', COURSE_LIST_VERSION_KEY)
+            return '{}-{}'.format(entry['_id'], entry['val']) if entry else '0'
+        course = self.store.course_get_fields(course_id, ['_id', 'catalog_version'])
+        if not course:
+            return None
+        return self._course_version(course)
+
+    @staticmethod
+    def _course_version(course):
+        return '{}-{}'.format(course['_id'], course.get('catalog_version', 0))
 
     def post_problem(self, course_id, skill_names, problem_name, tutor_url, pretest=False, posttest=False):
         self._add_problem(course_id, skill_names, problem_name, tutor_url, pretest, posttest)
@@ -88,6 +199,41 @@ class CourseRepositoryMongo(interface.DataInterface):
         self.store.course_append(course_id, 'users_in_progress', user_id)
         self.store.record_data(coll, {'student_id': user_id, 'current': None, 'next': None})
 
+    def enroll_users(self, course_id, next_problems):
+        """
+        Enroll several users with their first problems in bulk writes
+
+        Users who are enrolled already get the first problem as the next one, like on enroll_user followed by
+        set_next_problem.
+
+        :param course_id: course id
+        :param next_problems: dict with the first problem to give keyed by user id
+        :return: list of newly enrolled users ids
+        """
+        coll = course_id + COLL_SUFFIX['user_problem']
+        existing = self.store.get_docs(coll, next_problems.keys(), [])
+        docs = [
+            {'student_id': user_id, 'current': None, 'next': problem}
+            for user_id, problem in next_problems.iteritems() if user_id not in existing
+        ]
+        self.store.record_many(coll, docs)
+        enrolled = [doc['student_id'] for doc in docs]
+        if enrolled:
+            self.store.course_append_many(course_id, 'users_in_progress', enrolled)
+
+        # Enrolled users are updated with one query per distinct first problem
+        by_problem = {}
+        for user_id in existing:
+            problem = next_problems[user_id]
+            name = problem['problem_name'] if problem else None
+            by_problem.setdefault(name, (problem, []))[1].append(user_id)
+        for problem, user_ids in by_problem.itervalues():
+            self.store.update_docs(
+                coll, {'student_id': {'$in': user_ids}},
+                {'$set': {'next': problem}, '$unset': {'speculative': '', 'pending': ''}, '$inc': {'rev': 1}}
+            )
+        return enrolled
+
     def post_model_params(self, course_id, prob_list, new=False):
         """
         Add default probability (or set of model_params) student's skills are enrolled with.
@@ -106,6 +252,7 @@ class CourseRepositoryMongo(interface.DataInterface):
                 {('$set' if new else '$addToSet'): {'model_params': prob_list}},
                 new=new
             )
+            self._catalog_changed(course_id)
         else:
             logger.error("Model_params are not given in a list: {}".format(prob_list))
             raise interface.DataException("Incorrect type of the prob_list parameter")
@@ -122,6 +269,21 @@ class CourseRepositoryMongo(interface.DataInterface):
     def get_skills(self, course_id):
         return self.store.course_get(course_id, 'skills')
 
+    def get_course(self, course_id):
+        """
+        Get course catalog in one query
+
+        :param course_id: course id
+        :return: dict with 'skills' and 'problems' lists and opaque 'catalog_version' which is changed on every update
+            of the course catalog and never repeats for a re-created course
+        """
+        course = self.store.course_get_fields(course_id, ['_id', 'skills', 'problems', 'catalog_version'])
+        if not course:
+            raise interface.DataException("Course not found: {}".format(course_id))
+        course['catalog_version'] = self._course_version(course)
+        del course['_id']
+        return course
+
     def get_course_ids(self):
         return self.store.get_tables()
 
@@ -159,6 +321,17 @@ class CourseRepositoryMongo(interface.DataInterface):
     def get_finished_users(self, course_id):
         return self.store.course_get(course_id, 'users_finished')
 
+    def get_users_page(self, course_id, after=None, limit=100):
+        """
+        Get ids of users enrolled in the course, in progress and finished, ordered by id
+
+        :param course_id: course id
+        :param after: (optional) user id the page starts after
+        :param limit: maximum number of users in the page
+        :return: list of users ids
+        """
+        return self.store.get_student_ids(course_id + COLL_SUFFIX['user_problem'], after, limit)
+
     def _get_problem(self, course_id, problem_name):
         problems = self.store.course_search(
                 course_id, 'problems', {'problem_name': problem_name}, 'problems', {'problem_name': problem_name}
@@ -195,6 +368,8 @@ class CourseRepositoryMongo(interface.DataInterface):
 
         if not self.get_all_remaining_posttest_problems(course_id, user_id):
             self.store.course_user_done(course_id, user_id)
+        # Response changes whether the user is done with the problem or the course
+        self._bump_user_revision(course_id, user_id)
 
     def post_load(self, course_id, problem_name, user_id, unix_seconds):
         """
@@ -216,22 +391,169 @@ class CourseRepositoryMongo(interface.DataInterface):
         }
         self.store.record_data(coll, data)
 
-    def set_next_problem(self, course_id, user_id, problem_dict):
+    def set_next_problem(self, course_id, user_id, problem_dict, rev=None):
         """
         Set problem described in problem_dict as next in collection ..._problem
 
         :param course_id: course id
         :param user_id:  student id
         :param problem_dict: dict with problem description
+        :param rev: (optional) revision returned by claim_selection, the problem is set only if the user's state has
+                    not changed since
+        :return: True if the problem is set
+        """
+        update_dict = {
+            '$set': {'next': problem_dict}, '$unset': {'speculative': '', 'pending': ''}, '$inc': {'rev': 1}
+        }
+        return self._update_state(course_id, user_id, update_dict, rev)
+
+    def set_selection_pending(self, course_id, user_id, pending=True, rev=None):
+        """
+        Mark that the user's next problem is being selected
+
+        :param course_id: course id
+        :param user_id: student id
+        :param pending: boolean flag, False removes the mark
+        :param rev: (optional) revision returned by claim_selection, the mark is changed only if the user's state has
+                    not changed since
+        :return: True if the mark is changed
+        """
+        # Mark is the time the selection is submitted, so a selection lost with its process can be told apart
+        update_dict = {'$set': {'pending': time.time()}} if pending else {'$unset': {'pending': ''}}
+        update_dict['$inc'] = {'rev': 1}
+        return self._update_state(course_id, user_id, update_dict, rev)
+
+    def _update_state(self, course_id, user_id, update_dict, rev):
+        coll = course_id + COLL_SUFFIX['user_problem']
+        search_dict = {'student_id': user_id}
+        if rev is not None:
+            search_dict['rev'] = rev
+        updated = bool(self.store.update_doc(coll, search_dict, update_dict))
+        if updated:
+            self.state_notifier.notify((course_id, user_id))
+        return updated
+
+    def claim_selection(self, course_id, user_id, stale_before=None):
+        """
+        Mark that the user's next problem is being selected, taking the selection over from any earlier one
+
+        The mark and the revision of the user's state are changed in one atomic update. Writes given the returned
+        revision are made only if the state has not changed since, so of the selections running for the user in any
+        process only the one claimed last is stored.
+
+        :param course_id: course id
+        :param user_id: student id
+        :param stale_before: (optional) unix time, if given the claim is made only if a selection has been pending
+                             since before this time, e.g. to take over a selection lost with its process
+        :return: revision of the claimed state, None if the user is not found or the claim is not made
+        """
+        coll = course_id + COLL_SUFFIX['user_problem']
+        search_dict = {'student_id': user_id}
+        if stale_before is not None:
+            # Marks stored before they were timestamps are True
+            search_dict['$or'] = [{'pending': True}, {'pending': {'$lt': stale_before}}]
+        state = self.store.find_and_update(
+            coll, search_dict, {'$set': {'pending': time.time()}, '$inc': {'rev': 1}}, ['rev']
+        )
+        if state is None:
+            return None
+        self.state_notifier.notify((course_id, user_id))
+        return state['rev']
+
+    def set_speculative_problems(self, course_id, user_id, problem_name, branches):
+        """
+        Store next problems precomputed for the possible outcomes of the first attempt on the current problem
+
+        Problems are stored only while problem_name is still the user's current problem and no next problem is set,
+        so a late precomputation never overrides a real selection.
+
+        :param course_id: course id
+        :param user_id: student id
+        :param problem_name: name of the current problem the precomputation is made for
+        :param branches: dict with next problems keyed by outcome: {'correct': {...}, 'incorrect': {...}}
+        """
+        coll = course_id + COLL_SUFFIX['user_problem']
+        self.store.update_doc(
+            coll,
+            {'student_id': user_id, 'current.problem_name': problem_name, 'next': None},
+            {'$set': {'speculative': {'problem_name': problem_name, 'branches': branches}}}
+        )
+
+    def pop_speculative_problems(self, course_id, user_id):
+        """
+        Remove precomputed next problems of the user and return them
+
+        :param course_id: course id
+        :param user_id: student id
+        :return: dict {'problem_name': ..., 'branches': {...}} or None if nothing is precomputed
         """
         coll = course_id + COLL_SUFFIX['user_problem']
-        update_dict = {'$set': {'next': problem_dict}}
-        self.store.update_doc(coll, {'student_id': user_id}, update_dict)
+        return self.store.pop_one(coll, user_id, 'speculative')
+
+    def discard_speculative_problems(self, course_id, user_id=None, user_ids=None):
+        """
+        Drop precomputed next problems, e.g. after course catalog or model parameters change
+
+        :param course_id: course id
+        :param user_id: (optional) student id, by default precomputed problems of all course's students are dropped
+        :param user_ids: (optional) list of students ids, to drop precomputed problems of several students at once
+        """
+        coll = course_id + COLL_SUFFIX['user_problem']
+        search_dict = {'speculative': {'$exists': True}}
+        if user_id:
+            search_dict['student_id'] = user_id
+        elif user_ids is not None:
+            search_dict['student_id'] = {'$in': user_ids}
+        self.store.update_docs(coll, search_dict, {'$unset': {'speculative': ''}})
 
     def advance_problem(self, course_id, user_id):
         coll = course_id + COLL_SUFFIX['user_problem']
         current_problem = self.store.get_one(coll, user_id, 'next')
-        self.store.update_doc(coll, {'student_id': user_id}, {'$set': {'current': current_problem, 'next': None}})
+        self.store.update_doc(
+            coll,
+            {'student_id': user_id},
+            {'$set': {'current': current_problem, 'next': None}, '$unset': {'speculative': ''}, '$inc': {'rev': 1}}
+        )
+        self.state_notifier.notify((course_id, user_id))
+
+    def _bump_user_revision(self, course_id, user_id):
+        coll = course_id + COLL_SUFFIX['user_problem']
+        self.store.update_doc(coll, {'student_id': user_id}, {'$inc': {'rev': 1}})
+        self.state_notifier.notify((course_id, user_id))
+
+    def get_user_revision(self, course_id, user_id):
+        """
+        Get revision of the user's state, it is changed by every write changing the user's problems or responses
+
+        :param course_id: course id
+        :param user_id: student id
+        :return: int
+        """
+        coll = course_id + COLL_SUFFIX['user_problem']
+        return self.store.get_doc(coll, user_id, ['rev']).get('rev', 0)
+
+    def wait_user_revision(self, course_id, user_id, revision, timeout, recheck_interval):
+        """
+        Wait until the revision of the user's state differs from the given one
+
+        Writes of this process wake the waiting request at once, writes of other processes are found by reading the
+        revision every recheck_interval seconds.
+
+        :param course_id: course id
+        :param user_id: student id
+        :param revision: revision known to the client
+        :param timeout: maximum time in seconds to wait
+        :param recheck_interval: time in seconds between the reads of the revision without a notification
+        :return: current revision, the same as the given one on timeout
+        """
+        current = [revision]
+
+        def changed():
+            current[0] = self.get_user_revision(course_id, user_id)
+            return current[0] != revision
+
+        self.state_notifier.wait((course_id, user_id), changed, timeout, recheck_interval)
+        return current[0]
 
     def get_all_remaining_problems(self, course_id, user_id):
         return self._get_remaining_by_user(course_id, user_id, pretest=False, posttest=False)
@@ -253,20 +575,33 @@ class CourseRepositoryMongo(interface.DataInterface):
 
     def _get_remaining_by_user(self, course_id, user_id, skill_name=None, pretest=None, posttest=None):
         coll = course_id + COLL_SUFFIX['log']
+        index = self.get_problem_index(course_id)
         done = self.store.get_statistics(
-            coll, user_id, {'type': 'response'}, 'done', op='$addToSet', op_value='$problem')
-        if done.alive:
-            done = done.next()['done']
-            return [
-                problem for problem in self.get_problems(course_id, skill_name, pretest, posttest)
-                if problem not in done
-            ]
-        else:
-            return self.get_problems(course_id, pretest=pretest, posttest=posttest)
+            coll, user_id, {'type': 'response'}, 'done', op='$addToSet', op_value='$problem.problem_name')
+        done_mask = index.mask(done.next()['done']) if done.alive else 0
+        return index.problems_of(index.select(skill_name, pretest, posttest, exclude=done_mask))
+
+    def get_problem_index(self, course_id, course=None):
+        """
+        Get bitmask index of the course's problems, it is rebuilt only when the course's catalog changes
+
+        :param course_id: course id
+        :param course: (optional) catalog returned by get_course, if given no query is made
+        :return: ProblemIndex
+        """
+        if course is None:
+            course = self.store.course_get_fields(course_id, ['_id', 'catalog_version'])
+            if course is None:
+                raise interface.DataException("Course not found: {}".format(course_id))
+            return self.problem_indexes.get(
+                course_id, self._course_version(course), lambda: self.store.course_get(course_id, 'problems')
+            )
+        return self.problem_indexes.get(course_id, course['catalog_version'], lambda: course['problems'])
 
     def post_experiment(self, course_id, experiment_name, start, end):
         experiment = {'experiment_name': experiment_name, 'start_time': start, 'end_time': end}
         self.store.course_append(course_id, 'experiments', experiment)
+        self._bump_catalog_version(course_id)
 
     def get_experiments(self, course_id):
         return self.store.course_get(course_id, 'experiments')
@@ -284,18 +619,65 @@ class CourseRepositoryMongo(interface.DataInterface):
         self.store.update_doc(
             'Courses', {'course_id': course_id}, {'$pull': {'experiments': {'experiment_name': experiment_name}}}
         )
+        self._bump_catalog_version(course_id)
 
     def set(self, key, value):
-        logger.info("GENERIC DB_SET GOING DOWN!")
-        logger.info("KEY: {}".format(str(key)))
-        logger.info("VAL: {}".format(str(value)))
+        logger.debug("GENERIC DB_SET KEY: %s VAL: %s", key, value)
         self.store.set('Generic', key, value)
-        logger.info("GENERIC DB_SET DONE!")
 
     def get(self, key):
-        logger.info("GENERIC DB_GET GRABBING: {}".format(str(key)))
+        logger.debug("GENERIC DB_GET GRABBING: %s", key)
         return self.store.get('Generic', key)
 
+    def get_many(self, keys):
+        """
+        Get values of several keys in one query
+
+        :param keys: list of keys
+        :return: dict with values keyed by key, keys which are not found are omitted
+        """
+        logger.debug("GENERIC DB_GET GRABBING MANY: %s", keys)
+        return self.store.get_many('Generic', keys)
+
+    def set_many(self, values):
+        """
+        Set values of several keys in one bulk write
+
+        :param values: dict of values keyed by key
+        """
+        logger.debug("GENERIC DB_SET MANY: %d keys", len(values))
+        self.store.set_many('Generic', values)
+
+    def get_section_parameters(self, course_id, user_ids, skill_names):
+        """
+        Find parameters the users already have in any section of the course, read in two queries
+
+        Parameters keys are composed of the course id, user id and skill name, sections share the part of the course
+        id before ':'. Keys of the users' skills in every section are read at once, parameters of other sections are
+        preferred.
+
+        :param course_id: course id
+        :param user_ids: list of users ids
+        :param skill_names: list of the course's skills names
+        :return: dict with the parameters of one of the user's skills keyed by user id, users without parameters are
+            omitted
+        """
+        main_course = course_id.split(':')[0]
+        sections = [
+            section for section in self.get_course_ids() if section and section.split(':')[0] == main_course and
+            section != course_id
+        ] + [course_id]
+        keys = [
+            (user_id, section + user_id + skill_name)
+            for section in sections for user_id in user_ids for skill_name in skill_names
+        ]
+        values = self.store.get_many('Generic', [key for _, key in keys])
+        found = {}
+        for user_id, key in keys:
+            if user_id not in found and key in values:
+                found[user_id] = values[key]
+        return found
+
     def _get_user_log_key(self, user_id):
         return user_id + "_log"
 
@@ -328,6 +710,53 @@ class CourseRepositoryMongo(interface.DataInterface):
         coll = course_id + COLL_SUFFIX['user_problem']
         return self.store.get_one(coll, user_id, cur_or_next)
 
+    def get_users_state(self, course_id, user_ids):
+        """
+        Get current and next problems of several users in one query
+
+        :param course_id: course id
+        :param user_ids: list of users ids, None for all users of the course
+        :return: dict with 'current', 'next' and 'pending' keyed by user id, users who are not enrolled are omitted
+        """
+        coll = course_id + COLL_SUFFIX['user_problem']
+        states = self.store.get_docs(coll, user_ids, ['current', 'next', 'pending'])
+        for state in states.itervalues():
+            state.setdefault('current', None)
+            state.setdefault('next', None)
+            state['pending'] = bool(state.get('pending'))
+        return states
+
+    def get_users_progress(self, course_id, user_ids):
+        """
+        Get summary of several users' responses in one query
+
+        :param course_id: course id
+        :param user_ids: list of users ids
+        :return: dict keyed by user id with 'responses' number, 'correct_problems' list of problems names answered
+            correctly and 'pretest_correct' number of correct first attempts on pretest problems; users without
+            responses are omitted
+        """
+        coll = course_id + COLL_SUFFIX['log']
+        return self.store.get_responses_summary(coll, user_ids)
+
+    def get_user_state(self, course_id, user_id):
+        """
+        Get the user's current and next problems in one query
+
+        :param course_id: course id
+        :param user_id: student id
+        :return: dict with 'current', 'next', 'pending' keys and 'pending_since', unix time the pending selection was
+            submitted or None
+        """
+        coll = course_id + COLL_SUFFIX['user_problem']
+        state = self.store.get_doc(coll, user_id, ['current', 'next', 'pending'])
+        pending = state.get('pending') or None
+        return {
+            'current': state.get('current'), 'next': state.get('next'), 'pending': bool(pending),
+            # Marks stored before they were timestamps are True, they are as old as can be
+            'pending_since': 0 if pending is True else pending
+        }
+
     def get_next_problem(self, course_id, user_id):
         return self._get_user_problem(course_id, user_id, 'next')
 
@@ -343,6 +772,19 @@ class CourseRepositoryMongo(interface.DataInterface):
             project={'problem': 1, 'correct': 1, 'unix_s': 1}
         )
 
+    def get_responses(self, course_id, user_id):
+        """
+        Get all responses of the user, every attempt included, without the page loads
+
+        :param course_id: course id
+        :param user_id: student id
+        :return: list of dicts with 'problem', 'correct' and 'attempt' in the order they were posted
+        """
+        coll = course_id + COLL_SUFFIX['log']
+        return self.store.get_user_logs(
+            coll, user_id, add_filter={'type': 'response'}, project={'problem': 1, 'correct': 1, 'attempt': 1}
+        )
+
     def get_interactions(self, course_id, skill_name, user_id):
         coll = course_id + COLL_SUFFIX['log']
         return self.store.get_user_logs(
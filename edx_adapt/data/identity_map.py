@@ -0,0 +1,127 @@
+"""
+Identity map of the repository reads made by one request.
+
+A request reads the same data several times, e.g. the user's next problem before and after storing a response, or all
+interactions of the user for every field of the trajectory. RequestScopedRepository wraps the repository for the
+lifetime of one request: reads are run once and returned from the map afterwards, and the request's own writes update
+or drop the reads they change. Every read returns a copy of the memoized value, so callers may modify it.
+
+Methods named like writes which are not listed in WRITES drop all memoized reads. Other methods which are not listed
+as reads are passed through.
+"""
+import copy
+import functools
+
+# Reads of the user's problems document, changed by the state writes
+STATE_READS = frozenset(['get_next_problem', 'get_current_problem', 'get_user_state', 'get_user_revision'])
+# Reads of the user's log, changed by posted responses and page loads
+LOG_READS = frozenset([
+    'get_raw_user_data', 'get_raw_user_skill_data', 'get_responses', 'get_all_interactions', 'get_interactions',
+    'get_whole_trajectory', 'get_skill_trajectory', 'get_finished_users', 'get_all_remaining_problems',
+    'get_remaining_problems', 'get_all_remaining_posttest_problems', 'get_remaining_posttest_problems',
+    'get_all_remaining_pretest_problems', 'get_remaining_pretest_problems'
+])
+# Reads of the course document, changed by the course setup writes only
+CATALOG_READS = frozenset([
+    'get_course', 'get_skills', 'get_problems', 'get_num_pretest', 'get_num_posttest', 'get_model_params'
+])
+# Reads of the Generic collection, e.g. the users' model parameters
+PARAMETER_READS = frozenset(['get', 'get_many'])
+READS = STATE_READS | LOG_READS | CATALOG_READS | PARAMETER_READS
+# Reads made once per request, or which must see changes made by other requests, they are passed through
+UNCACHED_READS = frozenset([
+    'get_catalog_version', 'wait_user_revision', 'get_users_page', 'get_subjects', 'get_in_progress_users',
+    'get_users_state', 'get_users_progress', 'get_section_parameters', 'get_course_ids', 'get_experiments',
+    'get_experiment', 'get_problem_index'
+])
+# Writes changing only some of the reads, any other write drops all of them
+WRITES = {
+    'advance_problem': STATE_READS,
+    'set_next_problem': STATE_READS,
+    'set_selection_pending': STATE_READS,
+    'claim_selection': STATE_READS,
+    # Response changes the log and the revision of the user's state, not the user's problems
+    'post_interaction': LOG_READS | frozenset(['get_user_revision']),
+    'post_load': LOG_READS,
+    'set': PARAMETER_READS,
+    'set_many': PARAMETER_READS,
+}
+# Prefixes of the names of methods changing data
+WRITE_PREFIXES = ('post_', 'set', 'enroll_', 'import_', 'advance_', 'discard_', 'pop_', 'delete_', 'ensure_')
+
+
+class RequestScopedRepository(object):
+    """
+    Repository wrapper memoizing reads for one request, see the module's description
+    """
+
+    def __init__(self, repository, max_size=1000):
+        """
+        :param repository: DataInterface the calls are passed to
+        :param max_size: (optional) number of memoized reads, all are dropped when it is exceeded, so a request
+                         streaming data of every user of a course does not keep it all in memory
+        """
+        self._repository = repository
+        self._max_size = max_size
+        self._reads = {}  # (method name, args, kwargs): value
+
+    def __getattr__(self, name):
+        attribute = getattr(self._repository, name)
+        if not callable(attribute):
+            return attribute
+        if name in READS:
+            method = functools.partial(self._read, name, attribute)
+        elif name in UNCACHED_READS:
+            method = attribute
+        elif name in WRITES or name.startswith(WRITE_PREFIXES):
+            method = functools.partial(self._write, name, attribute)
+        else:
+            method = attribute
+        # Found in the instance afterwards, __getattr__ is not called again for the method
+        setattr(self, name, method)
+        return method
+
+    def _read(self, name, method, *args, **kwargs):
+        # Lists of arguments, e.g. keys of get_many, are keyed as tuples
+        key = (name, _freeze(args), _freeze(tuple(sorted(kwargs.iteritems()))))
+        try:
+            return copy.deepcopy(self._reads[key])
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable arguments
+            return method(*args, **kwargs)
+        value = method(*args, **kwargs)
+        if len(self._reads) >= self._max_size:
+            self._reads.clear()
+        self._reads[key] = value
+        return copy.deepcopy(value)
+
+    def _write(self, name, method, *args, **kwargs):
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            # Dropped even if the write fails, it may have been applied partially
+            self._forget(WRITES.get(name, READS))
+        # The request's next reads of the user's next problem get the value it has just written
+        if name == 'set_next_problem' and len(args) == 3 and kwargs.get('rev') is None:
+            self._reads[('get_next_problem', args[:2], ())] = copy.deepcopy(args[2])
+        elif name == 'advance_problem' and len(args) == 2:
+            self._reads[('get_next_problem', args, ())] = None
+        return result
+
+    def invalidate(self):
+        """
+        Drop all memoized reads, e.g. after the data is changed by a background worker through the shared repository
+        """
+        self._reads.clear()
+
+    def _forget(self, names):
+        for key in [key for key in self._reads if key[0] in names]:
+            del self._reads[key]
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
@@ -38,6 +38,12 @@ class DataInterface(object):
         """@type storage_module: StorageInterface"""
         self.store = storage_module
 
+    def ensure_indexes(self):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def warm_up(self):
+        raise NotImplementedError( "Data module must implement this" )
+
     """ Course setup methods """
     def post_course(self, course_id):
         raise NotImplementedError( "Data module must implement this" )
@@ -48,6 +54,9 @@ class DataInterface(object):
     def post_problem(self, course_id, skill_names, problem_name, tutor_url, pretest, posttest):
         raise NotImplementedError( "Data module must implement this" )
 
+    def import_course(self, course_id, definition):
+        raise NotImplementedError( "Data module must implement this" )
+
     def enroll_user(self, course_id, user_id):
         raise NotImplementedError( "Data module must implement this" )
 
@@ -64,6 +73,15 @@ class DataInterface(object):
     def get_skills(self, course_id):
         raise NotImplementedError( "Data module must implement this" )
 
+    def get_course(self, course_id):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def get_catalog_version(self, course_id):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def get_problem_index(self, course_id, course):
+        raise NotImplementedError( "Data module must implement this" )
+
     def get_problems(self, course_id, skill_name, pretest, posttest):
         raise NotImplementedError( "Data module must implement this" )
 
@@ -79,6 +97,9 @@ class DataInterface(object):
     def get_finished_users(self, course_id):
         raise NotImplementedError( "Data module must implement this" )
 
+    def get_users_page(self, course_id, after, limit):
+        raise NotImplementedError( "Data module must implement this" )
+
 
     """ Add user data """
     def post_interaction(self, course_id, problem_name, user_id, correct, attempt, unix_seconds):
@@ -87,7 +108,7 @@ class DataInterface(object):
     def post_load(self, course_id, problem_name, user_id, unix_seconds):
         raise NotImplementedError( "Data module must implement this" )
 
-    def set_next_problem(self, course_id, user_id, problem_dict):
+    def set_next_problem(self, course_id, user_id, problem_dict, rev=None):
         raise NotImplementedError( "Data module must implement this" )
 
     def advance_problem(self, course_id, user_id):
@@ -96,6 +117,33 @@ class DataInterface(object):
         """
         raise NotImplementedError( "Data module must implement this" )
 
+    def set_selection_pending(self, course_id, user_id, pending, rev=None):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def claim_selection(self, course_id, user_id, stale_before=None):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def set_speculative_problems(self, course_id, user_id, problem_name, branches):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def pop_speculative_problems(self, course_id, user_id):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def discard_speculative_problems(self, course_id, user_id, user_ids):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def enroll_users(self, course_id, next_problems):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def get_users_state(self, course_id, user_ids):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def get_users_progress(self, course_id, user_ids):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def get_section_parameters(self, course_id, user_ids, skill_names):
+        raise NotImplementedError( "Data module must implement this" )
+
     """ Retrieve user information """
     def get_all_remaining_problems(self, course_id, user_id):
         raise NotImplementedError( "Data module must implement this" )
@@ -127,9 +175,21 @@ class DataInterface(object):
     def get_interactions(self, course_id, skill_name, user_id):
         raise NotImplementedError( "Data module must implement this" )
 
+    def get_responses(self, course_id, user_id):
+        raise NotImplementedError( "Data module must implement this" )
+
     def get_current_problem(self, course_id, user_id):
         raise NotImplementedError( "Data module must implement this" )
 
+    def get_user_state(self, course_id, user_id):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def get_user_revision(self, course_id, user_id):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def wait_user_revision(self, course_id, user_id, revision, timeout, recheck_interval):
+        raise NotImplementedError( "Data module must implement this" )
+
     def get_next_problem(self, course_id, user_id):
         raise NotImplementedError( "Data module must implement this" )
 
@@ -167,6 +227,12 @@ class DataInterface(object):
     def get(self, key):
         raise NotImplementedError( "Data module must implement this" )
 
+    def get_many(self, keys):
+        raise NotImplementedError( "Data module must implement this" )
+
+    def set_many(self, values):
+        raise NotImplementedError( "Data module must implement this" )
+
 
 class DataException(Exception):
     pass
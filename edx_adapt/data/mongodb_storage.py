@@ -14,9 +14,15 @@ class MongoDbStorage(interface.StorageInterface):
     Storage Interface implementation for MongoDB backend
     """
 
-    def __init__(self, db_uri, db_name='edx-adapt'):
+    def __init__(self, db_uri, db_name='edx-adapt', event_listeners=None):
+        """
+        :param db_uri: MongoDB connection string
+        :param db_name: (optional) name of the database
+        :param event_listeners: (optional) list of pymongo.monitoring listeners, e.g. to collect command metrics
+        """
         super(MongoDbStorage, self).__init__()
-        self.client = pymongo.MongoClient(db_uri)
+        # Connection is opened by the first query, so a client created before uWSGI forks its workers is safe to use
+        self.client = pymongo.MongoClient(db_uri, connect=False, event_listeners=event_listeners)
         self.db_name = db_name
         self.db = self.client[db_name]
 
@@ -45,6 +51,33 @@ class MongoDbStorage(interface.StorageInterface):
         """
         return [course.get('course_id') for course in self.db.Courses.find()]
 
+    def get_student_ids(self, collection, after=None, limit=0):
+        """
+        Returns students ids of the collection's documents in ascending order, read with a range query on the index
+
+        :param collection: name of the collection with documents per student
+        :param after: (optional) student id the returned ids follow
+        :param limit: (optional) maximum number of returned ids, 0 for all
+        :return: list of students ids
+        """
+        search = {'student_id': {'$gt': after}} if after is not None else {}
+        cursor = self.db[collection].find(search, {'_id': 0, 'student_id': 1}).sort('student_id', pymongo.ASCENDING)
+        return [doc['student_id'] for doc in cursor.limit(limit)]
+
+    def get_docs(self, collection, user_ids, required_fields):
+        """
+        Return several fields of the users' documents in one query
+
+        :param collection: name of the collection with documents per student
+        :param user_ids: list of users ids, None for all users
+        :param required_fields: list of required fields
+        :return: dict with found fields keyed by user id, users without document are omitted
+        """
+        projection = {field: 1 for field in required_fields}
+        projection.update({'_id': 0, 'student_id': 1})
+        search = {'student_id': {'$in': user_ids}} if user_ids is not None else {}
+        return {doc.pop('student_id'): doc for doc in self.db[collection].find(search, projection)}
+
     def get(self, coll_name, key):
         """
         Returns value for the required key from db[coll_name]
@@ -58,6 +91,16 @@ class MongoDbStorage(interface.StorageInterface):
             raise interface.DataException("Key {} not found in collection".format(key))
         return collection.find_one({'key': key}).get('val')
 
+    def get_many(self, coll_name, keys):
+        """
+        Returns values for all found keys from db[coll_name] in one query
+
+        :param coll_name: name of collection
+        :param keys: list of keys which values are returned
+        :return: dict with values keyed by key, keys which are not found are omitted
+        """
+        return {doc['key']: doc.get('val') for doc in self.db[coll_name].find({'key': {'$in': list(keys)}})}
+
     def get_one(self, collection, user_id, required_field):
         """
         Return value for required field from collections with complex structure
@@ -74,6 +117,24 @@ class MongoDbStorage(interface.StorageInterface):
                 "Key {} is not found in collection {} or collection is not exists".format(required_field, collection)
             )
 
+    def get_doc(self, collection, user_id, required_fields):
+        """
+        Return several fields of the user's document from collections with complex structure
+
+        :param collection: name of the collection
+        :param user_id: user id to identifying document in collection
+        :param required_fields: list of required fields
+        :return: dict with found fields
+        """
+        projection = {field: 1 for field in required_fields}
+        projection['_id'] = 0
+        document = self.db[collection].find_one({'student_id': user_id}, projection)
+        if document is None:
+            raise interface.DataException(
+                "User {} is not found in collection {} or collection is not exists".format(user_id, collection)
+            )
+        return document
+
     def course_get(self, course_id, field_name):
         """
         Get Course related data
@@ -85,6 +146,18 @@ class MongoDbStorage(interface.StorageInterface):
         doc = self.db.Courses.find_one({'course_id': course_id, field_name: {'$exists': True}})
         return doc[field_name] if doc else None
 
+    def course_get_fields(self, course_id, field_names):
+        """
+        Get several fields of the Course related data in one query
+
+        :param course_id: ID of the course
+        :param field_names: list of required fields
+        :return: dict with required fields or None if the course is not found
+        """
+        projection = {field_name: 1 for field_name in field_names}
+        projection.setdefault('_id', 0)
+        return self.db.Courses.find_one({'course_id': course_id}, projection)
+
     def course_search(
         self, course_id, search_field, search_condition, projection_field=None, projection_condition=None
     ):
@@ -148,9 +221,62 @@ class MongoDbStorage(interface.StorageInterface):
         :param search_dict: dict for match stage in update query
         :param update_dict: dict for update stage in update query
         :param new: boolean flag mark to upsert document
+        :return: number of matched documents, 0 or 1
+        """
+        return self.db[collection].update_one(search_dict, update_dict, upsert=new).matched_count
+
+    def update_docs(self, collection, search_dict, update_dict):
+        """
+        Update all documents matched in collection
+
+        :param collection: name of the collection
+        :param search_dict: dict for match stage in update query
+        :param update_dict: dict for update stage in update query
         :return: None
         """
-        self.db[collection].update_one(search_dict, update_dict, upsert=new)
+        self.db[collection].update_many(search_dict, update_dict)
+
+    def find_and_update(self, collection, search_dict, update_dict, fields):
+        """
+        Update document in collection and return its fields in one atomic command
+
+        :param collection: name of the collection
+        :param search_dict: dict for match stage in update query
+        :param update_dict: dict for update stage in update query
+        :param fields: list of fields returned from the updated document
+        :return: dict with the fields after the update, None if no document is matched
+        """
+        projection = {field: 1 for field in fields}
+        projection['_id'] = 0
+        return self.db[collection].find_one_and_update(
+            search_dict, update_dict, projection=projection, return_document=pymongo.ReturnDocument.AFTER
+        )
+
+    def pop_one(self, collection, user_id, required_field):
+        """
+        Remove field from the user's document and return its value
+
+        :param collection: name of the collection
+        :param user_id: user id to identifying document in collection
+        :param required_field: field which is removed
+        :return: value of the removed field, None if the field is not set
+        """
+        document = self.db[collection].find_one_and_update(
+            {'student_id': user_id, required_field: {'$exists': True}},
+            {'$unset': {required_field: ''}},
+            projection={'_id': 0, required_field: 1}
+        )
+        return document[required_field] if document else None
+
+    def get_entry(self, coll_name, key):
+        """
+        Returns the whole document of the key from db[coll_name]
+
+        :param coll_name: name of collection
+        :param key: key of the document
+        :return: dict with '_id', 'key' and 'val' or None if the key is not found
+        """
+        return self.db[coll_name].find_one({'key': key})
 
     def set(self, coll_name, key, val):
         """
@@ -164,6 +290,22 @@ class MongoDbStorage(interface.StorageInterface):
             {'key': key},
             {'$set': {'val': val}}, upsert=True)
 
+    def set_many(self, coll_name, values):
+        """
+        Update values of several keys in one bulk write
+
+        :param coll_name: name of collection
+        :param values: dict of values keyed by key
+        """
+        if values:
+            self.db[coll_name].bulk_write(
+                [
+                    pymongo.UpdateOne({'key': key}, {'$set': {'val': val}}, upsert=True)
+                    for key, val in values.iteritems()
+                ],
+                ordered=False
+            )
+
     def append(self, coll_name, list_key, val):
         """
         Append new value to the list
@@ -203,6 +345,22 @@ class MongoDbStorage(interface.StorageInterface):
         except pymongo.errors.DuplicateKeyError:
             logger.info("Insert in collection {} failed".format(table))
 
+    def record_many(self, table, docs):
+        """
+        Record several documents into MongoDB in one bulk write, documents violating a unique index are skipped
+
+        :param table: name of collection to store data in
+        :param docs: list of dicts with data which is stored
+        :return: number of stored documents
+        """
+        if not docs:
+            return 0
+        try:
+            return len(self.db[table].insert_many(docs, ordered=False).inserted_ids)
+        except pymongo.errors.BulkWriteError as e:
+            logger.info("Insert of %d documents in collection %s failed", len(e.details['writeErrors']), table)
+            return e.details['nInserted']
+
     def course_append(self, course_id, field_key, value):
         """
         Append value in Course main document
@@ -219,6 +377,18 @@ class MongoDbStorage(interface.StorageInterface):
                 field_key, course_id, value
             ))
 
+    def course_append_many(self, course_id, field_key, values):
+        """
+        Append several values in Course main document in one update
+
+        :param course_id: ID of the Course
+        :param field_key: name of the list field that should be added with new items
+        :param values: list of new items
+        """
+        self.db.Courses.update_one(
+            {'course_id': course_id, field_key: {'$exists': True}}, {'$addToSet': {field_key: {'$each': values}}}
+        )
+
     def course_user_done(self, course_id, user_id):
         """
         Move student to field from 'users_in_progress' to 'users_finished'
@@ -245,6 +415,28 @@ class MongoDbStorage(interface.StorageInterface):
         return self.db[collection].aggregate([{'$match': search},
                                               {'$group': {'_id': group_id, group_key: {op: op_value}}}])
 
+    def get_responses_summary(self, collection, user_ids):
+        """
+        Returns summary of the users' responses from ..._log collection in one aggregation
+
+        :param collection: name of collection
+        :param user_ids: list of users ids
+        :return: dict keyed by user id with 'responses' number, 'correct_problems' list of problems names answered
+            correctly and 'pretest_correct' number of correct first attempts on pretest problems
+        """
+        summaries = self.db[collection].aggregate([
+            {'$match': {'student_id': {'$in': user_ids}, 'type': 'response'}},
+            {'$group': {
+                '_id': '$student_id',
+                'responses': {'$sum': 1},
+                'correct_problems': {'$addToSet': {'$cond': [{'$eq': ['$correct', 1]}, '$problem.problem_name', None]}},
+                'pretest_correct': {'$sum': {'$cond': [
+                    {'$and': [{'$eq': ['$problem.pretest', True]}, {'$eq': ['$attempt', 1]}]}, '$correct', 0
+                ]}},
+            }},
+        ])
+        return {summary.pop('_id'): summary for summary in summaries}
+
     def get_user_logs(self, collection, user_id, add_filter={}, project=None, get_from_doc=False, group_id=None,
                       group_field='logs'):
         """
@@ -0,0 +1,157 @@
+import random
+import threading
+from collections import defaultdict
+
+_CHUNK_BITS = 64
+_CHUNK = (1 << _CHUNK_BITS) - 1
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+class ProblemIndex(object):
+    """
+    Course's problems numbered densely in catalog order, with precomputed bitmasks.
+
+    Bit i of a mask stands for the i-th problem of the course. There is a mask per skill and per pretest, posttest
+    and regular partition, so a set of problems matching any filter, or remaining for a user whose answered problems
+    are held as a mask, is computed with a few bitwise operations. Structures derived from the catalog, e.g. a
+    selector's matrices, are kept with the index, see derived.
+    """
+
+    def __init__(self, problems):
+        """
+        :param problems: list of the course's problems
+        """
+        self.problems = list(problems)
+        self.positions = {problem['problem_name']: i for i, problem in enumerate(self.problems)}
+        self.all = (1 << len(self.problems)) - 1
+        self.skills = defaultdict(int)
+        self.pretest = 0
+        self.posttest = 0
+        for i, problem in enumerate(self.problems):
+            bit = 1 << i
+            for skill_name in problem['skills']:
+                self.skills[skill_name] |= bit
+            if problem['pretest']:
+                self.pretest |= bit
+            if problem['posttest']:
+                self.posttest |= bit
+        self.regular = self.all & ~self.pretest & ~self.posttest
+        self._derived = {}
+
+    def derived(self, name, build):
+        """
+        Get structure derived from the index, it is built on the first call and rebuilt with the index only
+
+        :param name: name of the structure
+        :param build: function building the structure from the index
+        """
+        try:
+            return self._derived[name]
+        except KeyError:
+            # Concurrent first calls may build it twice, all of them get the one stored first
+            return self._derived.setdefault(name, build(self))
+
+    def mask(self, problem_names):
+        """
+        Get mask of the problems with given names, unknown names are ignored
+
+        :param problem_names: iterable of problems names
+        :return: bitmask
+        """
+        mask = 0
+        for name in problem_names:
+            position = self.positions.get(name)
+            if position is not None:
+                mask |= 1 << position
+        return mask
+
+    def select(self, skill_name=None, pretest=None, posttest=None, exclude=0):
+        """
+        Get mask of the problems matching all given filters
+
+        :param skill_name: (optional) name of the skill problems are related to
+        :param pretest: (optional) flag to select pretest or not pretest problems
+        :param posttest: (optional) flag to select posttest or not posttest problems
+        :param exclude: (optional) mask of problems to leave out, e.g. problems answered by the user
+        :return: bitmask
+        """
+        mask = self.all & ~exclude
+        if skill_name is not None:
+            mask &= self.skills.get(skill_name, 0)
+        if pretest is not None:
+            mask &= self.pretest if pretest else ~self.pretest
+        if posttest is not None:
+            mask &= self.posttest if posttest else ~self.posttest
+        return mask
+
+    def problems_of(self, mask):
+        """
+        Get list of the problems in the mask, in catalog order
+        """
+        problems = []
+        offset = 0
+        while mask:
+            chunk = mask & _CHUNK
+            while chunk:
+                low_bit = chunk & -chunk
+                problems.append(self.problems[offset + low_bit.bit_length() - 1])
+                chunk ^= low_bit
+            mask >>= _CHUNK_BITS
+            offset += _CHUNK_BITS
+        return problems
+
+    def choice(self, mask, rng=random):
+        """
+        Choose a random problem from the mask with the same probability
+
+        :param mask: not empty bitmask
+        :param rng: (optional) source of randomness with randrange method
+        :return: chosen problem
+        """
+        if not mask:
+            raise IndexError("Cannot choose from an empty set of problems")
+        nth = rng.randrange(popcount(mask))
+        offset = 0
+        # Skip whole chunks until the one containing the chosen bit
+        while True:
+            chunk = mask & _CHUNK
+            count = popcount(chunk)
+            if nth < count:
+                break
+            nth -= count
+            mask >>= _CHUNK_BITS
+            offset += _CHUNK_BITS
+        for _ in xrange(nth):
+            chunk &= chunk - 1
+        return self.problems[offset + (chunk & -chunk).bit_length() - 1]
+
+
+class ProblemIndexCache(object):
+    """
+    ProblemIndex of every course, rebuilt when the course's catalog version changes
+
+    Versions given by the course repository are prefixed by the course document id, so the index of a deleted course
+    is not reused for a course re-created with the same id.
+    """
+
+    def __init__(self):
+        self._indexes = {}  # course_id: (catalog_version, ProblemIndex)
+        self._lock = threading.Lock()
+
+    def get(self, course_id, catalog_version, problems_loader):
+        """
+        :param course_id: course id
+        :param catalog_version: current opaque version of the course's catalog
+        :param problems_loader: function returning the course's problems, called only if the index is rebuilt
+        :return: ProblemIndex
+        """
+        cached = self._indexes.get(course_id)
+        if cached and cached[0] == catalog_version:
+            return cached[1]
+        index = ProblemIndex(problems_loader())
+        with self._lock:
+            self._indexes[course_id] = (catalog_version, index)
+        return index
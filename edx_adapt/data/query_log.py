@@ -0,0 +1,159 @@
+"""
+Recording of MongoDB commands issued by a request, to spot needless round trips.
+
+pymongo publishes command events in the thread which runs the command, so the commands of a request are those
+published in its thread while its recording is active. Commands of the background selection workers are not
+accounted to the request which submitted the selection. Commands the request runs in other greenlets, see
+edx_adapt.parallel, are accounted to it by attaching its recordings to them.
+"""
+import json
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+# Fields which are not part of the query shape: connection details and the values of the command's name key
+_IGNORED_FIELDS = {'$db', 'lsid', '$readPreference', '$clusterTime', 'txnNumber'}
+
+_local = threading.local()
+
+
+class QueryStats(object):
+    """
+    Number, total duration and shapes of the commands recorded in one thread
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0  # seconds
+        self.shapes = Counter()
+
+    def add(self, shape, duration):
+        self.count += 1
+        self.duration += duration
+        self.shapes[shape] += 1
+
+    @property
+    def duplicates(self):
+        """
+        Number of commands repeating the shape of an earlier command, e.g. the same lookup run in a loop
+        """
+        return sum(count - 1 for count in self.shapes.itervalues())
+
+    def most_repeated(self):
+        """
+        :return: tuple of the most repeated shape and its number of runs, None if there are no commands
+        """
+        if not self.shapes:
+            return None
+        return self.shapes.most_common(1)[0]
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {key: _normalize(val) for key, val in value.iteritems()}
+    if isinstance(value, (list, tuple)):
+        # Lists of documents, e.g. inserted documents or update statements, have the shape of their first item
+        return [_normalize(value[0])] if value else []
+    return '?'
+
+
+def query_shape(command_name, command):
+    """
+    Get shape of the command: its name, collection and structure with all values left out
+
+    :param command_name: name of the command, e.g. 'find'
+    :param command: command document
+    :return: string
+    """
+    collection = command.get(command_name)
+    if not isinstance(collection, basestring):
+        collection = command.get('collection', '')
+    body = {key: _normalize(val) for key, val in command.iteritems() if key != command_name and
+            key not in _IGNORED_FIELDS}
+    return '{} {} {}'.format(command_name, collection, json.dumps(body, sort_keys=True))
+
+
+class QueryCounterListener(monitoring.CommandListener):
+    """
+    Adds every MongoDB command to the recordings active in the thread running it
+    """
+
+    def __init__(self):
+        self._shapes = {}  # request_id: shape of the started command
+
+    def started(self, event):
+        if getattr(_local, 'recordings', None):
+            self._shapes[event.request_id] = query_shape(event.command_name, event.command)
+
+    def _finished(self, event):
+        shape = self._shapes.pop(event.request_id, None)
+        if shape is None:
+            return
+        for stats in getattr(_local, 'recordings', ()):
+            stats.add(shape, event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+
+def start():
+    """
+    Start recording commands of the current thread, recordings may be nested
+
+    :return: QueryStats filled until stop is called with it
+    """
+    stats = QueryStats()
+    if not hasattr(_local, 'recordings'):
+        _local.recordings = []
+    _local.recordings.append(stats)
+    return stats
+
+
+def stop(stats):
+    """
+    Stop the recording started by start
+    """
+    recordings = getattr(_local, 'recordings', [])
+    if stats in recordings:
+        recordings.remove(stats)
+
+
+@contextmanager
+def recording():
+    """
+    Record commands run in the block
+
+    :return: QueryStats of the block
+    """
+    stats = start()
+    try:
+        yield stats
+    finally:
+        stop(stats)
+
+
+def active():
+    """
+    :return: list of the recordings active in the current thread
+    """
+    return list(getattr(_local, 'recordings', []))
+
+
+@contextmanager
+def attached(recordings):
+    """
+    Record commands run in the block to the given recordings, e.g. those of the thread which started the block's one
+
+    :param recordings: list returned by active
+    """
+    previous = getattr(_local, 'recordings', None)
+    _local.recordings = list(recordings)
+    try:
+        yield
+    finally:
+        _local.recordings = previous if previous is not None else []
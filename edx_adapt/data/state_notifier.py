@@ -0,0 +1,62 @@
+"""
+Notification of the changes of users' states between the threads of a process.
+
+Requests waiting for a user's state to change are woken by the writes made in the same process. Writes made by other
+processes are not notified, waiters find them by rechecking the state's revision periodically.
+"""
+import threading
+import time
+
+
+class UserStateNotifier(object):
+    """
+    Events of the requests waiting for a change of the user's state, keyed by user
+    """
+
+    def __init__(self):
+        self._waiters = {}  # key: set of threading.Event
+        self._lock = threading.Lock()
+
+    def notify(self, key):
+        """
+        Wake all requests waiting for the user's state
+
+        :param key: key of the user, e.g. tuple of course id and user id
+        """
+        with self._lock:
+            events = self._waiters.get(key, ())
+            for event in events:
+                event.set()
+
+    def wait(self, key, changed, timeout, recheck_interval):
+        """
+        Block until the user's state is changed or the timeout expires
+
+        The waiter is registered before the first check, so a change made right after the check is not missed.
+
+        :param key: key of the user, e.g. tuple of course id and user id
+        :param changed: function returning True when the state is changed, called on every wake up
+        :param timeout: maximum time in seconds to wait
+        :param recheck_interval: time in seconds between the checks without a notification, catches changes made by
+                                 other processes
+        :return: True if the state is changed, False on timeout
+        """
+        deadline = time.time() + timeout
+        event = threading.Event()
+        with self._lock:
+            self._waiters.setdefault(key, set()).add(event)
+        try:
+            while True:
+                event.clear()
+                if changed():
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                event.wait(min(recheck_interval, remaining))
+        finally:
+            with self._lock:
+                events = self._waiters.get(key)
+                events.discard(event)
+                if not events:
+                    del self._waiters[key]
@@ -0,0 +1,38 @@
+import threading
+import time
+
+
+class VersionCache(object):
+    """
+    Versions of the stored data kept in the process for a short time, so they can be checked without a query.
+
+    A version written by another process is seen at most ttl seconds later, a version written by this process is seen
+    at once since the writer invalidates it.
+    """
+
+    def __init__(self, ttl):
+        """
+        :param ttl: time in seconds a version is kept
+        """
+        self.ttl = ttl
+        self._versions = {}  # key: (expiry time, version)
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """
+        :param key: key of the versioned data, e.g. course id
+        :param loader: function returning the stored version, called if the cached one is missing or expired
+        :return: version
+        """
+        cached = self._versions.get(key)
+        now = time.time()
+        if cached and cached[0] > now:
+            return cached[1]
+        version = loader()
+        with self._lock:
+            self._versions[key] = (now + self.ttl, version)
+        return version
+
+    def invalidate(self, key):
+        with self._lock:
+            self._versions.pop(key, None)
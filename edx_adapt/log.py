@@ -0,0 +1,178 @@
+"""
+Logging pipeline of the edx-adapt application.
+
+Loggers only put records in an in-memory queue, a listener thread formats them and writes them to the console and the
+log file, so neither string building nor disk I/O happens in the request. The file gets one JSON object per record.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import Queue
+import random
+import threading
+
+# Attributes every LogRecord has, the others are extra fields passed by the caller
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+_FORMATTER = logging.Formatter()
+
+
+class QueueHandler(logging.Handler):
+    """
+    Handler putting records in a queue which is drained by a QueueListener.
+
+    Message arguments and the traceback are formatted before the record is enqueued, like logging.handlers.QueueHandler
+    of Python 3 does: arguments may be request bound proxies such as flask.request, or objects changed by the caller
+    afterwards. The rest of the formatting is done by the listener. If the queue is full the record is dropped rather
+    than blocking the caller.
+    """
+
+    def __init__(self, listener):
+        """
+        :param listener: QueueListener writing the records
+        """
+        super(QueueHandler, self).__init__()
+        self.listener = listener
+        self.dropped = 0
+
+    def prepare(self, record):
+        """
+        Make the record independent of the caller's state
+
+        :param record: LogRecord, it is changed in place
+        :return: the record
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        self.listener.ensure_started()
+        try:
+            self.listener.queue.put_nowait(self.prepare(record))
+        except Queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+    """
+    Thread passing queued records to the handlers.
+
+    The thread is started on the first record of every process, so a process forked after the logging is configured,
+    e.g. a uWSGI worker, gets its own thread.
+    """
+
+    def __init__(self, handlers, maxsize=10000):
+        """
+        :param handlers: list of handlers writing the records, each filters records by its own level
+        :param maxsize: maximum number of records waiting in the queue
+        """
+        self.handlers = handlers
+        self.queue = Queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def ensure_started(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name='log-listener')
+                self._thread.daemon = True
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _work(self):
+        while True:
+            record = self.queue.get()
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+            self.queue.task_done()
+
+    def flush(self):
+        """
+        Block until all queued records are written
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.join()
+        for handler in self.handlers:
+            handler.flush()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats the record as one line JSON object with its extra fields
+    """
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'location': '{}:{}'.format(record.filename, record.lineno),
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).iteritems():
+            if key not in _RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+def sampled(rate):
+    """
+    Decide whether a sampled record is logged
+
+    :param rate: share of records which are logged, from 0 to 1
+    :return: boolean
+    """
+    return rate >= 1 or random.random() < rate
+
+
+def configure(logs_dir, max_bytes=50 * 1024 * 1024, backup_count=5):
+    """
+    Set up the logging pipeline
+
+    :param logs_dir: directory of the log file
+    :param max_bytes: (optional) size of the log file when it is rotated
+    :param backup_count: (optional) number of rotated log files kept
+    :return: QueueListener writing the records
+    """
+    if not os.path.exists(logs_dir):
+        os.makedirs(logs_dir)
+
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    console.setFormatter(logging.Formatter(
+        '%(asctime)s - %(levelname)s %(filename)s:%(lineno)d -- %(message)s', '%Y-%m-%d %H:%M:%S'
+    ))
+    # Appended, not truncated: every process restart used to wipe the log
+    log_file = logging.handlers.RotatingFileHandler(
+        os.path.join(logs_dir, 'edx-adapt.log'), mode='a', maxBytes=max_bytes, backupCount=backup_count,
+        encoding='utf8', delay=True
+    )
+    log_file.setLevel(logging.DEBUG)
+    log_file.setFormatter(JsonFormatter(datefmt='%Y-%m-%dT%H:%M:%S'))
+
+    listener = QueueListener([console, log_file])
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(listener))
+    # Third party libraries log warnings only
+    root.setLevel(logging.WARNING)
+    logging.getLogger('edx-adapt').setLevel(logging.INFO)
+    logging.getLogger('dev').setLevel(logging.DEBUG)
+    atexit.register(listener.flush)
+    return listener
@@ -0,0 +1,155 @@
+"""
+Prometheus metrics of the edx-adapt application.
+
+When the `prometheus_multiproc_dir` environment variable points to a writable directory, every process writes its
+samples there and the /metrics endpoint aggregates samples of all processes, e.g. of all uWSGI workers. The directory
+must be emptied before the application is (re)started.
+"""
+import errno
+import glob
+import os
+import time
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+)
+from prometheus_client import multiprocess
+from pymongo import monitoring
+
+MULTIPROCESS_DIR = os.environ.get('prometheus_multiproc_dir')
+
+REQUESTS = Counter(
+    'edx_adapt_requests_total', 'Number of handled HTTP requests', ['resource', 'method', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'edx_adapt_request_duration_seconds', 'Time spent handling HTTP requests', ['resource', 'method'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+)
+MONGO_COMMANDS = Counter(
+    'edx_adapt_mongodb_commands_total', 'Number of MongoDB commands', ['collection', 'command', 'outcome']
+)
+MONGO_LATENCY = Histogram(
+    'edx_adapt_mongodb_command_duration_seconds', 'Time spent in MongoDB commands', ['collection', 'command'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 5)
+)
+SELECTION_LATENCY = Histogram(
+    'edx_adapt_selection_duration_seconds', 'Time spent choosing a next problem', ['selector', 'kind'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+SELECTION_QUERIES = Histogram(
+    'edx_adapt_selection_queries', 'Number of data module reads made to choose a next problem', ['selector'],
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+)
+ERRORS = Counter('edx_adapt_errors_total', 'Number of errors by exception type', ['exception'])
+ADMISSION_IN_FLIGHT = Gauge(
+    'edx_adapt_admission_in_flight', 'Number of admitted requests being handled', ['endpoint_class'],
+    multiprocess_mode='livesum'
+)
+ADMISSION_QUEUED = Gauge(
+    'edx_adapt_admission_queued', 'Number of requests waiting for admission', ['endpoint_class'],
+    multiprocess_mode='livesum'
+)
+ADMISSION_REJECTED = Counter(
+    'edx_adapt_admission_rejected_total', 'Number of requests rejected by admission control', ['endpoint_class']
+)
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Counts MongoDB commands and their duration per collection
+    """
+
+    def __init__(self):
+        self._collections = {}  # request_id: collection name of the started command
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, basestring):
+            # e.g. getMore commands keep the collection name in a separate field
+            collection = event.command.get('collection', '')
+        self._collections[event.request_id] = collection
+
+    def _finished(self, event, outcome):
+        collection = self._collections.pop(event.request_id, '')
+        MONGO_COMMANDS.labels(collection, event.command_name, outcome).inc()
+        MONGO_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._finished(event, 'success')
+
+    def failed(self, event):
+        self._finished(event, 'failure')
+
+
+class Timer(object):
+    """
+    Context manager observing the time spent in its block in a histogram
+    """
+
+    def __init__(self, histogram, *labels):
+        self.histogram = histogram.labels(*labels) if labels else histogram
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.observe(time.time() - self.start)
+
+
+def count_error(exception):
+    ERRORS.labels(type(exception).__name__).inc()
+
+
+def export():
+    """
+    Render metrics of all processes in the Prometheus text format
+
+    :return: tuple of the body and its content type
+    """
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid, path=None):
+    """
+    Remove samples of the live gauges of a finished process
+
+    :param pid: id of the process
+    :param path: (optional) directory of the samples, MULTIPROCESS_DIR by default
+    """
+    path = path or MULTIPROCESS_DIR
+    if path:
+        multiprocess.mark_process_dead(pid, path)
+
+
+def remove_dead_processes(path=None):
+    """
+    Remove samples of the live gauges of all processes which are not running, e.g. of crashed or killed uWSGI workers
+
+    :param path: (optional) directory of the samples, MULTIPROCESS_DIR by default
+    :return: list of the ids of the removed processes
+    """
+    path = path or MULTIPROCESS_DIR
+    if not path:
+        return []
+    pids = set()
+    for sample_file in glob.glob(os.path.join(path, 'gauge_live*_*.db')):
+        pid = os.path.basename(sample_file)[:-len('.db')].rsplit('_', 1)[1]
+        if pid.isdigit() and not _is_running(int(pid)):
+            pids.add(int(pid))
+    for pid in pids:
+        mark_process_dead(pid, path)
+    return sorted(pids)
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+    return True
@@ -0,0 +1,37 @@
+"""
+Create the collections and indexes of edx-adapt, run it once per deployment and after upgrades:
+
+    python -m edx_adapt.migrate [--uri mongodb://localhost:27017/] [--database edx-adapt]
+
+The API does not create indexes when it starts, collections of courses created through the API get their indexes at
+once.
+"""
+import argparse
+
+import edx_adapt.data.course_repository as repo
+import edx_adapt.data.mongodb_storage as mongodbstore
+from edx_adapt import log
+from edx_adapt.settings import LOG_MAX_BYTES, LOGS_DIR, MONGODB_DATABASE, MONGODB_URI
+
+
+def get_parameters():
+    parser = argparse.ArgumentParser(description='Create edx-adapt collections and indexes')
+    parser.add_argument('--uri', type=str, default=MONGODB_URI, help='MongoDB connection string.')
+    parser.add_argument('--database', type=str, default=MONGODB_DATABASE, help='Name of the database.')
+    return vars(parser.parse_args())
+
+
+def migrate(uri, database):
+    """
+    :param uri: MongoDB connection string
+    :param database: name of the database
+    :return: list of the course ids whose collections are checked
+    """
+    return repo.CourseRepositoryMongo(mongodbstore.MongoDbStorage(uri, db_name=database)).ensure_indexes()
+
+
+if __name__ == '__main__':
+    log.configure(LOGS_DIR, max_bytes=LOG_MAX_BYTES)
+    params = get_parameters()
+    course_ids = migrate(params['uri'], params['database'])
+    print("Indexes of the generic collections and of {} courses are in place".format(len(course_ids)))
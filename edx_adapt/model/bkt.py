@@ -19,6 +19,25 @@ class BKT(ModelInterface):
             self.update_probability(parameters, trajectory[i])
         return self.alpha[1] / (self.alpha[0] + self.alpha[1])
 
+    def get_probabilities_mastered(self, interactions, parameters):
+        """
+        Get the probability of mastery for every skill in a single pass over the user's responses
+
+        Each response is routed to the forward probability vectors of all skills its problem is tagged with, so
+        problems with several skills are visited only once.
+
+        :param interactions: ordered list of the user's first attempt responses, as returned by the data module's
+                             get_all_interactions (dicts with 'problem' and 'correct' keys)
+        :param parameters: dictionary of parameters defining the student model, keyed by skill name
+        :return: dictionary of the probability of mastery keyed by skill name
+        """
+        alphas = {skill_name: [1 - params['pi'], params['pi']] for skill_name, params in parameters.iteritems()}
+        for interaction in interactions:
+            for skill_name in interaction['problem']['skills']:
+                if skill_name in alphas:
+                    self._forward_step(alphas[skill_name], parameters[skill_name], interaction['correct'])
+        return {skill_name: alpha[1] / (alpha[0] + alpha[1]) for skill_name, alpha in alphas.iteritems()}
+
     def get_probability_correct(self, num_pretest, trajectory, parameters):
         """
         Get the probability of getting the next problem correct according to the student model
@@ -63,11 +82,20 @@ class BKT(ModelInterface):
         :param params: dictionary of parameters containing pi, pt, pg, ps
         :param is_correct: whether the student got the last problem correct or not (1-correct, 0-incorrect)
         """
-        self.alpha[0] *= params['pg'] * is_correct + (1 - params['pg']) * (1 - is_correct)
-        self.alpha[1] *= (1 - params['ps']) * is_correct + params['ps'] * (1 - is_correct)
-        self.new_alpha = [self.alpha[0] * (1 - params['pt']), self.alpha[0] * params['pt'] + self.alpha[1]]
-        self.alpha[0] = self.new_alpha[0]
-        self.alpha[1] = self.new_alpha[1]
+        self._forward_step(self.alpha, params, is_correct)
+
+    @staticmethod
+    def _forward_step(alpha, params, is_correct):
+        """
+        Updates the given forward probability vector in place with one observed response
+
+        :param alpha: forward probability vector compiled until this time point
+        :param params: dictionary of parameters containing pi, pt, pg, ps
+        :param is_correct: whether the student got the problem correct or not (1-correct, 0-incorrect)
+        """
+        alpha[0] *= params['pg'] * is_correct + (1 - params['pg']) * (1 - is_correct)
+        alpha[1] *= (1 - params['ps']) * is_correct + params['ps'] * (1 - is_correct)
+        alpha[0], alpha[1] = alpha[0] * (1 - params['pt']), alpha[0] * params['pt'] + alpha[1]
 
     def get_current_probability_correct(self, params):
         """
@@ -19,6 +19,17 @@ class ModelInterface(object):
         """
         raise NotImplementedError('Data module must implement this')
 
+    def get_probabilities_mastered(self, interactions, parameters):
+        """
+        Get the probability of mastery for every skill from the user's whole response history
+
+        :param interactions: ordered list of the user's first attempt responses, each a dict with the answered
+                             'problem' (including its 'skills') and 'correct'
+        :param parameters: dictionary of parameters defining the student model, keyed by skill name
+        :return: dictionary of the probability of mastery keyed by skill name
+        """
+        raise NotImplementedError('Data module must implement this')
+
 
 class ModelException(Exception):
     pass
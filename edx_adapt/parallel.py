@@ -0,0 +1,50 @@
+"""
+Concurrent execution of independent database queries of a request.
+
+When the application is served on gevent (see adapt_gevent.py) every query runs in its own greenlet and their round
+trips overlap. Otherwise they run one after another in the caller's thread: a thread per query would cost more than
+the round trips it saves.
+"""
+import sys
+
+from edx_adapt.data import query_log
+
+
+def gevent_enabled():
+    """
+    :return: True if the process is monkey patched by gevent, so pymongo sockets yield to other greenlets
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    return bool(monkey and monkey.is_module_patched('socket'))
+
+
+def _run_attached(recordings, call):
+    # Exception is returned with its traceback rather than raised, so gevent does not report it as a crash
+    with query_log.attached(recordings):
+        try:
+            return call(), None
+        except Exception:
+            return None, sys.exc_info()
+
+
+def run(*calls):
+    """
+    Run independent calls and wait for all of them
+
+    The first exception raised by a call is re-raised: on gevent after all calls are finished, otherwise at once,
+    without running the calls following the failed one.
+
+    :param calls: functions without arguments
+    :return: list of the calls' results in the order of the calls
+    """
+    if len(calls) < 2 or not gevent_enabled():
+        return [call() for call in calls]
+    import gevent
+    recordings = query_log.active()
+    greenlets = [gevent.spawn(_run_attached, recordings, call) for call in calls]
+    gevent.joinall(greenlets)
+    results = [greenlet.value for greenlet in greenlets]
+    for _, exc_info in results:
+        if exc_info:
+            raise exc_info[0], exc_info[1], exc_info[2]
+    return [value for value, _ in results]
@@ -0,0 +1,156 @@
+import binascii
+import time
+
+import numpy as np
+
+from skill_separate_random_selector import SkillSeparateRandomSelector
+from edx_adapt import logger
+
+
+def _entropy(p):
+    """
+    Binary entropy in bits of every probability in the array
+    """
+    p = np.clip(p, 1e-12, 1 - 1e-12)
+    return -(p * np.log2(p) + (1 - p) * np.log2(1 - p))
+
+
+def _bits(mask, size):
+    """
+    Boolean array of the first size bits of the mask, bit i of the mask is item i of the array
+    """
+    if not size:
+        return np.zeros(0, dtype=bool)
+    hexed = '%0*x' % ((size + 7) // 8 * 2, mask)
+    bits = np.unpackbits(np.frombuffer(binascii.unhexlify(hexed), dtype=np.uint8))
+    return bits[::-1][:size].astype(bool)
+
+
+class _CourseMatrix(object):
+    """
+    Problem-skill incidence matrix of the course's ProblemIndex, rows are the problems in the index's order.
+    It is kept with the index, so it is built once per version of the course catalog.
+    """
+
+    def __init__(self, index, skills):
+        self.index = index
+        self.skills = [skill_name for skill_name in skills if skill_name != 'None']
+        self.incidence = np.zeros((len(index.problems), len(self.skills)))
+        for j, skill_name in enumerate(self.skills):
+            self.incidence[:, j] = _bits(index.skills.get(skill_name, 0), len(index.problems))
+
+    def positions(self, mask):
+        """
+        Positions of the problems in the mask, in the index's order
+        """
+        return np.flatnonzero(_bits(mask, len(self.index.problems)))
+
+
+class ExpectedGainSelector(SkillSeparateRandomSelector):
+    """ This is an implementation of the adaptive problem selector.
+    Pre-test and post-test problems are given the same way as in the
+    SkillSeparateRandomSelector. Among the remaining problems of skills
+    which are under the threshold, it chooses the problem with the
+    highest expected information about the student's mastery: for every
+    skill the mutual information between the mastery state and the
+    response is computed under the current BKT state, and the problem's
+    score is the sum over its skills. Scoring is vectorized over the
+    whole candidate set.
+    """
+
+    def __init__(self, data_interface, model_interface, parameter_access_mode="", max_candidates=5000,
+                 latency_budget=0.05, min_candidates=100):
+        """
+        :param data_interface: data module storing state information about the user and the course
+        :param model_interface: model interface that computes the probability of mastery
+        :param parameter_access_mode: Mode that defines the granularity of the parameters, see
+                                      SkillSeparateRandomSelector
+        :param max_candidates: maximum number of problems scored in one selection, a random sample of this size is
+                               scored if there are more candidates, so the scoring cost is bounded
+        :param latency_budget: time in seconds a selection is expected to fit in, the scored sample is shrunk to the
+                               number of candidates which can be scored in what is left of it
+        :param min_candidates: number of candidates scored even if the budget is spent already
+        """
+        super(ExpectedGainSelector, self).__init__(data_interface, model_interface, parameter_access_mode)
+        self.max_candidates = max_candidates
+        self.latency_budget = latency_budget
+        self.min_candidates = min_candidates
+        self._seconds_per_candidate = 0.0  # Scoring cost measured by the previous selections
+
+    @staticmethod
+    def _get_matrix(snapshot):
+        return snapshot.index.derived('expected_gain_matrix', lambda index: _CourseMatrix(index, snapshot.skills))
+
+    def _skill_scores(self, matrix, mastery, skill_parameters):
+        """
+        Expected information about every skill's mastery, 0 for skills over the threshold
+
+        :return: array with one score per skill of the matrix and boolean array marking skills under the threshold
+        """
+        params = [skill_parameters[skill_name] for skill_name in matrix.skills]
+        mastered = np.array([mastery[skill_name] for skill_name in matrix.skills])
+        pg = np.array([p['pg'] for p in params])
+        ps = np.array([p['ps'] for p in params])
+        threshold = np.array([p['threshold'] for p in params])
+
+        prob_correct = mastered * (1 - ps) + (1 - mastered) * pg
+        information = _entropy(prob_correct) - (mastered * _entropy(ps) + (1 - mastered) * _entropy(pg))
+        return np.where(mastered < threshold, information, 0.0), mastered < threshold
+
+    def _candidate_limit(self, start):
+        """
+        Number of candidates which can be scored in what is left of the latency budget
+
+        :param start: time the selection has started at
+        """
+        if not self._seconds_per_candidate:
+            return self.max_candidates
+        remaining = self.latency_budget - (time.time() - start)
+        return int(max(self.min_candidates, min(self.max_candidates, remaining / self._seconds_per_candidate)))
+
+    def _measure_scoring(self, elapsed, count):
+        cost = elapsed / count
+        if self._seconds_per_candidate:
+            # Moving average, so one slow scoring, e.g. of a thread waiting for the GIL, does not shrink the samples
+            cost = 0.8 * self._seconds_per_candidate + 0.2 * cost
+        self._seconds_per_candidate = cost
+
+    def _choose_candidate(self, snapshot):
+        """
+        Choose the remaining problem of not mastered skills with the highest expected information
+
+        :param snapshot: SelectionSnapshot of the user's state
+        :return: chosen problem or None if there are no candidates
+        """
+        start = time.time()
+        matrix = self._get_matrix(snapshot)
+        skill_parameters = snapshot.get_parameters(
+            lambda skill_name: self._get_key(snapshot.course_id, snapshot.user_id, skill_name), matrix.skills
+        )
+        mastery = self.model_interface.get_probabilities_mastered(snapshot.interactions, skill_parameters)
+
+        skill_scores, under_threshold = self._skill_scores(matrix, mastery, skill_parameters)
+        candidates = 0
+        for skill_name, under in zip(matrix.skills, under_threshold):
+            if under:
+                candidates |= snapshot.index.skills.get(skill_name, 0)
+        candidates = matrix.positions(candidates & snapshot.index.regular & ~snapshot.answered_mask)
+        if not candidates.size:
+            return None
+        limit = self._candidate_limit(start)
+        if candidates.size > limit:
+            candidates = np.random.choice(candidates, limit, replace=False)
+
+        scoring_start = time.time()
+        scores = matrix.incidence[candidates].dot(skill_scores)
+        best = candidates[scores >= scores.max() - 1e-12]
+        chosen = matrix.index.problems[np.random.choice(best)]
+        self._measure_scoring(time.time() - scoring_start, candidates.size)
+
+        elapsed = time.time() - start
+        if elapsed > self.latency_budget:
+            logger.warning("Selection with %d candidates took %.3fs, over the budget of %ss", candidates.size, elapsed,
+                           self.latency_budget)
+        logger.debug("Problem %s is chosen with score %s from %d candidates", chosen['problem_name'], scores.max(),
+                     candidates.size)
+        return chosen
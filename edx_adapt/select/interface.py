@@ -18,12 +18,13 @@ class SelectInterface(object):
         self.data_interface = data_interface
         self.model_interface = model_interface
 
-    def choose_next_problem(self, course_id, user_id):
+    def choose_next_problem(self, course_id, user_id, pending=None):
         """
         Choose the next problem to give to the user
 
         :param course_id
         :param user_id
+        :param pending: (optional) response which is not stored yet, dict with 'problem' and 'correct' keys
         :return: the next problem to give to the user
         """
         raise NotImplementedError( "Data module must implement this" )
@@ -51,6 +52,16 @@ class SelectInterface(object):
         """
         raise NotImplementedError( "Data module must implement this" )
 
+    def set_users_parameters(self, parameters, course_id, skill_names):
+        """
+        Set the parameters of several users for every skill of the course
+
+        :param parameters: dict with the set of parameters keyed by user id
+        :param course_id
+        :param skill_names: list of skills names
+        """
+        raise NotImplementedError( "Data module must implement this" )
+
 
 class SelectException(Exception):
     pass
\ No newline at end of file
@@ -1,8 +1,9 @@
-import random
+import logging
 
 from interface import SelectInterface, SelectException
+from snapshot import SelectionSnapshot
 from edx_adapt.data.interface import DataException
-from edx_adapt import logger
+from edx_adapt import logger, metrics
 
 
 class SkillSeparateRandomSelector(SelectInterface):
@@ -37,63 +38,80 @@ class SkillSeparateRandomSelector(SelectInterface):
         """
         super(SkillSeparateRandomSelector, self).__init__(data_interface, model_interface)
 
-        logger.info(self.data_interface)
-        logger.info(self.model_interface)
-        logger.info(self.model_interface.get_probability_correct)
+        logger.debug("Selector uses data module %s and model %s", self.data_interface, self.model_interface)
 
-        self.parameter_access_mode_list.extend(parameter_access_mode.split())
+        # Copied so that modes of several selectors are not accumulated in the class attribute
+        self.parameter_access_mode_list = self.parameter_access_mode_list + parameter_access_mode.split()
         for mode in self.parameter_access_mode_list:
             if mode not in self.valid_mode_list:
                 raise SelectException("Parameter access mode is invalid")
 
-    def _prepare_problems_list(self, course_id, user_id):
-        candidate_problem_list = []  # List of problems to choose from
-        for skill_name in self.data_interface.get_skills(course_id):  # For each skill
-            if skill_name == 'None':
-                continue
-            # Gets the parameters corresponding to the course, user, skill - parameter set must include "threshold"
-            skill_parameter = self.data_interface.get(self._get_key(course_id, user_id, skill_name))
-            prob_correct = self.model_interface.get_probability_mastered(
-                # trajectory of correctness
-                self.data_interface.get_skill_trajectory(course_id, skill_name, user_id),
-                skill_parameter  # parameters for the skill
-            )
-            # If the probability is less than threshold, add the problems to candidate list
-            if prob_correct < skill_parameter['threshold']:
-                problems_to_add = self.data_interface.get_remaining_problems(course_id, skill_name, user_id)
-                logger.debug("Skill name: {} UNDER THRESHOLD!".format(skill_name))
-                logger.debug("Adding candidates: {}".format(str(problems_to_add)))
-                candidate_problem_list.extend(problems_to_add)
-        return candidate_problem_list
-
-    def choose_next_problem(self, course_id, user_id):
+    def _prepare_candidates(self, snapshot):
+        skill_names = [skill_name for skill_name in snapshot.skills if skill_name != 'None']
+        # Gets the parameters corresponding to the course, user, skill - parameter set must include "threshold"
+        skill_parameters = snapshot.get_parameters(
+            lambda skill_name: self._get_key(snapshot.course_id, snapshot.user_id, skill_name), skill_names
+        )
+        # Mastery of every skill is computed in one pass over the user's first attempt responses
+        prob_mastered = self.model_interface.get_probabilities_mastered(snapshot.interactions, skill_parameters)
+
+        candidates = 0  # Bitmask of problems to choose from
+        for skill_name in skill_names:  # For each skill
+            # If the probability is less than threshold, add the problems to candidates
+            if prob_mastered[skill_name] < skill_parameters[skill_name]['threshold']:
+                problems_to_add = snapshot.remaining_mask(skill_name, pretest=False, posttest=False)
+                logger.debug("Skill name: %s UNDER THRESHOLD!", skill_name)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Adding candidates: %s", [
+                        problem['problem_name'] for problem in snapshot.index.problems_of(problems_to_add)
+                    ])
+                candidates |= problems_to_add
+        return candidates
+
+    def _choose_from_snapshot(self, snapshot):
+        # if pretest problems are left, give the next one
+        pretest_problems = snapshot.remaining_mask(pretest=True)
+        if pretest_problems:
+            return snapshot.index.choice(pretest_problems)
+
+        # if the user has started the post-test, finish it
+        if [x for x in snapshot.interactions if x['problem']['posttest']]:
+            post = snapshot.remaining_mask(posttest=True)
+            return snapshot.index.choice(post) if post else {'congratulations': True, 'done': True}
+
+        problem = self._choose_candidate(snapshot)
+        return problem if problem else snapshot.index.choice(snapshot.remaining_mask(posttest=True))
+
+    def _choose_candidate(self, snapshot):
+        """
+        Choose among the remaining problems of skills which are not mastered yet
+
+        :param snapshot: SelectionSnapshot of the user's state
+        :return: chosen problem or None if there are no candidates
+        """
+        candidates = self._prepare_candidates(snapshot)
+        return snapshot.index.choice(candidates) if candidates else None
+
+    def choose_next_problem(self, course_id, user_id, pending=None):
         """
         Choose the next problem to give to the user
 
         :param course_id
         :param user_id
+        :param pending: (optional) first attempt response which is not stored yet, dict with 'problem' and 'correct'
+                        keys, the next problem is chosen as if the response was already in the user's log
         :return: the next problem to give to the user
         """
         try:
-            # if pretest problems are left, give the next one
-            pretest_problems = self.data_interface.get_all_remaining_pretest_problems(course_id, user_id)
-            if pretest_problems:
-                return random.choice(pretest_problems)
-
-            # if the user has started the post-test, finish it
-            if [x for x in self.data_interface.get_all_interactions(course_id, user_id) if x['problem']['posttest']]:
-                post = self.data_interface.get_all_remaining_posttest_problems(course_id, user_id)
-                return random.choice(post) if post else {'congratulations': True, 'done': True}
-
-            # List of problems to choose from
-            candidate_problem_list = self._prepare_problems_list(course_id, user_id)
-
-            return random.choice(
-                candidate_problem_list if candidate_problem_list
-                else self.data_interface.get_all_remaining_posttest_problems(course_id, user_id)
-            )
+            snapshot = SelectionSnapshot.load(self.data_interface, course_id, user_id)
+            if pending:
+                snapshot.add_pending(pending)
+            problem = self._choose_from_snapshot(snapshot)
         except DataException as e:
             raise SelectException("DataException: " + e.message)
+        logger.debug("Next problem for user %s is chosen with %d queries", user_id, snapshot.query_count)
+        metrics.SELECTION_QUERIES.labels(type(self).__name__).observe(snapshot.query_count)
+        return problem
 
     def choose_first_problem(self, course_id, user_id):
         """
@@ -103,8 +121,8 @@ class SkillSeparateRandomSelector(SelectInterface):
         :param user_id
         :return: the first problem to give to the user
         """
-        pretest = self.data_interface.get_all_remaining_pretest_problems(course_id, user_id)
-        for prob in pretest:
+        snapshot = SelectionSnapshot.load(self.data_interface, course_id, user_id)
+        for prob in snapshot.remaining(pretest=True):
             if prob['problem_name'] == 'Pre_assessment_0':
                 return prob
 
@@ -151,3 +169,21 @@ class SkillSeparateRandomSelector(SelectInterface):
         :param skill_name
         """
         self.data_interface.set(self._compose_key(course_id, user_id, skill_name), parameter)
+        if course_id:
+            # Problems precomputed under the previous parameters are not valid anymore
+            self.data_interface.discard_speculative_problems(course_id, user_id)
+
+    def set_users_parameters(self, parameters, course_id, skill_names):
+        """
+        Set the parameters of several users for every skill of the course in one bulk write
+
+        :param parameters: dict with the set of parameters keyed by user id
+        :param course_id
+        :param skill_names: list of skills names
+        """
+        values = {
+            self._compose_key(course_id, user_id, skill_name): parameter
+            for user_id, parameter in parameters.iteritems() for skill_name in skill_names
+        }
+        self.data_interface.set_many(values)
+        self.data_interface.discard_speculative_problems(course_id, user_ids=parameters.keys())
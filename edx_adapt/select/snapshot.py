@@ -0,0 +1,105 @@
+from edx_adapt.data.interface import DataException
+
+
+class SelectionSnapshot(object):
+    """
+    In-memory state of one user in one course, loaded once per problem selection.
+
+    The course catalog and the user's log are fetched when the snapshot is loaded, the user's skill parameters are
+    fetched at most once when they are first needed. Every selection step then runs against the snapshot, so the
+    number of queries per selection does not depend on the number of skills or problems in the course.
+    Problems are handled as bitmasks of the course's ProblemIndex, answered problems included.
+    """
+
+    def __init__(self, data_interface, course_id, user_id):
+        """
+        :param data_interface: data module storing state information about the user and the course
+        :param course_id
+        :param user_id
+        """
+        self.data_interface = data_interface
+        self.course_id = course_id
+        self.user_id = user_id
+        self.query_count = 0  # Number of data module reads made for this snapshot
+        self.skills = []
+        self.problems = []
+        self.catalog_version = 0
+        self.index = None  # ProblemIndex of the course
+        self.interactions = []  # First attempt responses in the order they were given
+        self.answered = set()  # Names of all problems the user has responded to
+        self.answered_mask = 0
+        self._parameters = None
+
+    @classmethod
+    def load(cls, data_interface, course_id, user_id):
+        """
+        Fetch the course catalog and the user's responses, page loads are left out
+
+        :param data_interface: data module storing state information about the user and the course
+        :param course_id
+        :param user_id
+        :return: loaded snapshot
+        """
+        snapshot = cls(data_interface, course_id, user_id)
+        course = snapshot._read(data_interface.get_course, course_id)
+        snapshot.skills = course['skills']
+        snapshot.problems = course['problems']
+        snapshot.catalog_version = course['catalog_version']
+        snapshot.index = data_interface.get_problem_index(course_id, course)
+        for response in snapshot._read(data_interface.get_responses, course_id, user_id):
+            snapshot._add_response(response)
+        return snapshot
+
+    def _read(self, data_method, *args):
+        self.query_count += 1
+        return data_method(*args)
+
+    def _add_response(self, response):
+        self.answered.add(response['problem']['problem_name'])
+        self.answered_mask |= self.index.mask([response['problem']['problem_name']])
+        if response.get('attempt', 1) == 1:
+            self.interactions.append(response)
+
+    def add_pending(self, pending):
+        """
+        Account for a first attempt response which is not stored yet
+
+        :param pending: dict with 'problem' and 'correct' keys
+        """
+        self._add_response(pending)
+
+    def get_parameters(self, key_func, skill_names):
+        """
+        Get model parameters of the user's skills, they are fetched on the first call only
+
+        :param key_func: function returning the data module key of the skill's parameters by skill name
+        :param skill_names: list of skills names
+        :return: dict of parameters keyed by skill name
+        """
+        if self._parameters is None:
+            keys = {skill_name: key_func(skill_name) for skill_name in skill_names}
+            values = self._read(self.data_interface.get_many, keys.values())
+            missing = [key for key in keys.values() if key not in values]
+            if missing:
+                raise DataException("Key(s) {} not found in collection".format(missing))
+            self._parameters = {skill_name: values[key] for skill_name, key in keys.iteritems()}
+        return self._parameters
+
+    def remaining_mask(self, skill_name=None, pretest=None, posttest=None):
+        """
+        Get bitmask of problems the user has not responded to yet
+
+        :param skill_name: (optional) name of the skill problems are related to
+        :param pretest: (optional) flag to return pretest or not pretest problems
+        :param posttest: (optional) flag to return posttest or not posttest problems
+        :return: bitmask of the course's ProblemIndex
+        """
+        return self.index.select(skill_name, pretest, posttest, exclude=self.answered_mask)
+
+    def remaining(self, skill_name=None, pretest=None, posttest=None):
+        """
+        Get problems the user has not responded to yet, filters are the same as in remaining_mask
+
+        :return: list of problems
+        """
+        return self.index.problems_of(self.remaining_mask(skill_name, pretest, posttest))
@@ -0,0 +1,111 @@
+import Queue
+import threading
+
+from interface import SelectException
+from edx_adapt.data.interface import DataException
+from edx_adapt import logger, metrics
+
+# Outcomes of the first attempt on the served problem, keyed as they are stored with the precomputed problems
+OUTCOMES = {'correct': 1, 'incorrect': 0}
+
+
+class SpeculativeSelection(object):
+    """
+    Precomputes the user's next problem for both outcomes of the first attempt on the problem being served.
+
+    Precomputation runs in a background worker thread and its results are stored alongside the user's
+    current and next problems, so any API process can commit them. When the answer arrives only the branch matching
+    the answer's correctness is committed and the selection is not run in the request.
+
+    Jobs are coalesced per user: a job submitted while the same user's job is still queued replaces its problem, so
+    a burst of served problems queues one precomputation, for the problem served last.
+    """
+
+    def __init__(self, data_interface, selector):
+        """
+        :param data_interface: data module storing state information about the user and the course
+        :param selector: select module which chooses the problems
+        """
+        self.data_interface = data_interface
+        self.selector = selector
+        self._jobs = Queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._queued = {}  # (course_id, user_id): problem of the user's queued job
+
+    def submit(self, course_id, user_id, problem):
+        """
+        Queue precomputation of the next problem for the problem which has just been served to the user
+
+        :param course_id
+        :param user_id
+        :param problem: dict with the served problem description
+        """
+        key = (course_id, user_id)
+        with self._worker_lock:
+            queued = key in self._queued
+            self._queued[key] = problem
+        if queued:
+            logger.debug("Precomputation for user %s is already queued, it is made for %s", user_id,
+                         problem['problem_name'])
+            return
+        self._ensure_worker()
+        self._jobs.put(key)
+
+    def wait(self):
+        """
+        Block until all submitted precomputations are finished
+        """
+        self._jobs.join()
+
+    def commit(self, course_id, user_id, answer):
+        """
+        Take the precomputed next problem matching the user's answer
+
+        Precomputed problems are removed on every call, so they are never reused for another answer.
+
+        :param course_id
+        :param user_id
+        :param answer: dict with 'problem' name, 'correct' and 'attempt' of the stored response
+        :return: the next problem, None if there is no precomputed problem for this answer
+        """
+        speculation = self.data_interface.pop_speculative_problems(course_id, user_id)
+        if not speculation or speculation['problem_name'] != answer['problem'] or answer['attempt'] != 1:
+            return None
+        outcome = 'correct' if answer['correct'] else 'incorrect'
+        return speculation['branches'].get(outcome)
+
+    def _ensure_worker(self):
+        # Worker is started lazily, so it is created in each forked uWSGI process rather than in the master
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name='speculative-selection')
+                self._worker.daemon = True
+                self._worker.start()
+
+    def _work(self):
+        while True:
+            course_id, user_id = key = self._jobs.get()
+            with self._worker_lock:
+                problem = self._queued.pop(key)
+            try:
+                self._speculate(course_id, user_id, problem)
+            except (DataException, SelectException) as e:
+                metrics.count_error(e)
+                logger.exception("Precomputation of the next problem for user {} failed:".format(user_id))
+            except Exception as e:
+                metrics.count_error(e)
+                logger.exception("Unexpected error in the speculative selection worker:")
+            finally:
+                self._jobs.task_done()
+
+    def _speculate(self, course_id, user_id, problem):
+        with metrics.Timer(metrics.SELECTION_LATENCY, type(self.selector).__name__, 'speculative'):
+            branches = {
+                outcome: self.selector.choose_next_problem(
+                    course_id, user_id, pending={'problem': problem, 'correct': correct}
+                )
+                for outcome, correct in OUTCOMES.iteritems()
+            }
+        logger.debug("Precomputed next problems for user %s on %s: %s", user_id, problem['problem_name'], branches)
+        self.data_interface.set_speculative_problems(course_id, user_id, problem['problem_name'], branches)
@@ -0,0 +1,171 @@
+import Queue
+import threading
+import time
+
+from interface import SelectException
+from edx_adapt.data.interface import DataException
+from edx_adapt import logger, metrics
+
+
+class SelectionWorkerPool(object):
+    """
+    Runs problem selections in a pool of background worker threads, so requests return right after the user's
+    response is stored.
+
+    Jobs are coalesced per user: a job submitted while the same user's job is still queued is dropped, and a job
+    submitted while it is running makes it run once more afterwards. Every run reads the user's state when it
+    starts, so only the latest state is selected for. While a job is in flight the user's state is marked as
+    pending selection with the time it was submitted.
+
+    Jobs live in the memory of the process which submitted them, so a job is lost if the process is restarted before
+    it is finished. A selection pending for longer than pending_timeout is considered lost and is submitted again
+    when the user's status is read, see resubmit_lost.
+
+    Coalescing is per process. Across processes every submission claims the user's state with the data module's
+    claim_selection, and a selection is stored only if the state has not changed since its claim, so of the jobs
+    running for the same user in several processes only the one claimed last stores its problem.
+    """
+
+    def __init__(self, data_interface, selector, workers=4, pending_timeout=60):
+        """
+        :param data_interface: data module storing state information about the user and the course
+        :param selector: select module which chooses the problems
+        :param workers: number of worker threads, if 0 selection runs synchronously in the caller's thread
+        :param pending_timeout: (optional) seconds after which a pending selection is considered lost
+        """
+        self.data_interface = data_interface
+        self.selector = selector
+        self.workers = workers
+        self.pending_timeout = pending_timeout
+        self._jobs = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._queued = set()
+        self._running = set()
+        self._rerun = set()
+        self._claims = {}  # (course_id, user_id): revision claimed by the latest submission
+
+    def submit(self, course_id, user_id):
+        """
+        Request selection of the user's next problem
+
+        :param course_id
+        :param user_id
+        """
+        self._enqueue(course_id, user_id, self.data_interface.claim_selection(course_id, user_id))
+
+    def _enqueue(self, course_id, user_id, rev):
+        if not self.workers:
+            self.select(course_id, user_id, rev)
+            return
+        key = (course_id, user_id)
+        with self._lock:
+            # Job runs with the latest claim, earlier claims are outdated by it
+            self._claims[key] = rev
+            if key in self._queued:
+                logger.debug("Selection for user %s is already queued", user_id)
+                return
+            if key in self._running:
+                self._rerun.add(key)
+                return
+            self._queued.add(key)
+            self._ensure_workers()
+        self._jobs.put(key)
+
+    def resubmit_lost(self, course_id, user_id, pending_since):
+        """
+        Submit the user's selection again if it has been pending for longer than pending_timeout
+
+        :param course_id
+        :param user_id
+        :param pending_since: unix time the pending selection was submitted, None if no selection is pending
+        :return: True if the selection is submitted again
+        """
+        stale_before = time.time() - self.pending_timeout
+        if pending_since is None or pending_since >= stale_before:
+            return False
+        # Only one of the processes reading the stale mark takes the selection over
+        rev = self.data_interface.claim_selection(course_id, user_id, stale_before=stale_before)
+        if rev is None:
+            return False
+        logger.warning("Selection for user %s has been pending since %s, submitting it again", user_id, pending_since)
+        self._enqueue(course_id, user_id, rev)
+        return True
+
+    def wait(self):
+        """
+        Block until all submitted selections are finished
+        """
+        self._jobs.join()
+
+    def select(self, course_id, user_id, rev=None):
+        """
+        Choose and store the user's next problem if it is not selected yet, or there was an error previously
+
+        :param course_id
+        :param user_id
+        :param rev: (optional) revision returned by the data module's claim_selection, the result is dropped if the
+                    user's state has changed since
+        """
+        nex = self.data_interface.get_next_problem(course_id, user_id)
+        if nex is None or 'error' in nex:
+            logger.debug("SELECTOR CHOOSING NEXT PROBLEM")
+            with metrics.Timer(metrics.SELECTION_LATENCY, type(self.selector).__name__, 'next'):
+                prob = self.selector.choose_next_problem(course_id, user_id)
+            logger.info("FINISHED CHOOSING NEXT PROBLEM: %s", prob)
+            stored = self.data_interface.set_next_problem(course_id, user_id, prob, rev=rev)
+        else:
+            logger.info("SELECTION NOT REQUIRED!")
+            stored = self.data_interface.set_selection_pending(course_id, user_id, pending=False, rev=rev)
+        if not stored:
+            logger.info("State of user %s changed during the selection, it is left to the latest one", user_id)
+
+    def _ensure_workers(self):
+        # Threads are started lazily, so they are created in each forked uWSGI process rather than in the master
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        for i in xrange(len(self._threads), self.workers):
+            thread = threading.Thread(target=self._work, name='selection-worker-{}'.format(i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            key = self._jobs.get()
+            with self._lock:
+                self._queued.discard(key)
+                self._running.add(key)
+                rev = self._claims.pop(key, None)
+            try:
+                self._run(key[0], key[1], rev)
+            finally:
+                with self._lock:
+                    self._running.discard(key)
+                    if key in self._rerun:
+                        self._rerun.discard(key)
+                        self._queued.add(key)
+                        self._jobs.put(key)
+                self._jobs.task_done()
+
+    def _run(self, course_id, user_id, rev):
+        try:
+            self.select(course_id, user_id, rev)
+        except SelectException as e:
+            metrics.count_error(e)
+            logger.exception("Selection of the next problem for user {} failed:".format(user_id))
+            self._store_error(course_id, user_id, rev, "An error occurred in a problem selection: " + e.message)
+        except DataException as e:
+            metrics.count_error(e)
+            logger.exception("DATA EXCEPTION:")
+            self._store_error(course_id, user_id, rev, e.message)
+        except Exception as e:
+            metrics.count_error(e)
+            logger.exception("Unexpected error in the selection worker:")
+            self._store_error(course_id, user_id, rev, "Unexpected error in a problem selection")
+
+    def _store_error(self, course_id, user_id, rev, message):
+        # An error as the next problem makes the next response start a new selection
+        try:
+            self.data_interface.set_next_problem(course_id, user_id, {'error': message}, rev=rev)
+        except DataException:
+            logger.exception("Selection error for user {} cannot be stored:".format(user_id))
@@ -1,3 +1,60 @@
 # FIXME(idegtiarov) Log dir is set to the project dir to avoid changing dirs permissions in travis tests runs. Should be
 # changed to the appropriate log dir on production.
 LOGS_DIR = 'log/edx-adapt/'
+# MongoDB connection string and database of the application
+MONGODB_URI = 'mongodb://localhost:27017/'
+MONGODB_DATABASE = 'edx-adapt'
+# Build the problem index of every course when an API process starts, instead of on the course's first request
+WARM_UP_CACHES = True
+# Number of background threads choosing next problems in each API process, 0 makes selection synchronous
+SELECTION_WORKERS = 4
+# Seconds after which a pending selection is considered lost with its process and is submitted again on status read
+SELECTION_PENDING_TIMEOUT = 60
+# Problem selector used by the API: 'skill_separate_random' or 'expected_gain'
+SELECTOR = 'skill_separate_random'
+# Requests repeating the same database query shape this many times are logged as a possible N+1 query pattern
+QUERY_DUPLICATES_WARNING = 5
+# Size of the log file when it is rotated
+LOG_MAX_BYTES = 50 * 1024 * 1024
+# Share of successful requests which are logged, failed requests are always logged
+REQUEST_LOG_SAMPLE_RATE = 0.1
+# Time in seconds a course catalog version is cached in each API process, catalog changes made through another process
+# may be answered with 304 Not Modified for this long
+CATALOG_VERSION_TTL = 2
+# Cache-Control of the course catalog responses, they are cached by clients and proxies and revalidated with ETags
+CATALOG_CACHE_CONTROL = 'public, no-cache'
+# Number of users in a page of the course-wide logs and trajectories, by default and at most
+DATA_PAGE_SIZE = 100
+DATA_PAGE_SIZE_MAX = 1000
+# Maximum number of users enrolled in one bulk enrollment request
+BULK_ENROLLMENT_MAX = 10000
+# Maximum number of connections served concurrently by one gevent process, see adapt_gevent.py
+GEVENT_MAX_CONNECTIONS = 2000
+# JSON encoder of the API responses: 'json', 'ujson' or 'simplejson', the last two must be installed
+JSON_ENCODER = 'json'
+# Requests handled at once per endpoint class in each API process, requests waiting for admission, and time in seconds
+# rejected clients are asked to wait. Requests over both limits are rejected with 503, so bulk work is shed before the
+# tutor requests of students slow down. Endpoints of the other resources are not limited. Running and queued requests
+# of enrollment, data_serve and tutor_wait hold a uWSGI thread for long, together they may take at most half of the
+# threads of a process, the rest is left to tutor_read and tutor_write; create_wsgi_app warns if they may take more.
+ADMISSION_LIMITS = {
+    'tutor_read': {'concurrency': 100, 'queue': 400, 'retry_after': 1},
+    'tutor_write': {'concurrency': 100, 'queue': 400, 'retry_after': 1},
+    'tutor_wait': {'concurrency': 4, 'queue': 0, 'retry_after': 2},
+    'enrollment': {'concurrency': 2, 'queue': 0, 'retry_after': 5},
+    'admin': {'concurrency': 8, 'queue': 8, 'retry_after': 1},
+    'data_serve': {'concurrency': 1, 'queue': 1, 'retry_after': 30},
+}
+# Limits replacing ADMISSION_LIMITS ones when only the tutor application is served (etc/edx_adapt/edx_adapt_tutor.ini),
+# no bulk work takes its threads, so half of them may wait in long-polls
+TUTOR_ADMISSION_LIMITS = {
+    'tutor_wait': {'concurrency': 8, 'queue': 0, 'retry_after': 2},
+}
+# Time in seconds a request waits for admission before it is rejected
+ADMISSION_QUEUE_TIMEOUT = 2
+# Time in seconds a user's status is served from the cache of the API process, while the user's state is not changed
+STATUS_CACHE_TTL = 5
+# Maximum time in seconds a long-poll request waits for a change of the user's status
+LONG_POLL_TIMEOUT = 25
+# Time in seconds between the database checks of a waiting long-poll request, finds changes made by other processes
+LONG_POLL_RECHECK_INTERVAL = 2
@@ -1,18 +1,46 @@
+import ConfigParser
 import csv
 import json
+import logging
 import os
 import random
+import shutil
 import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+import zlib
+from contextlib import contextmanager
 
+import flask
+import msgpack
 import pymongo
+from flask_restful import Api
+from prometheus_client import REGISTRY
 
-from edx_adapt.api import adapt_api
+from edx_adapt import access_logger, log, metrics, parallel
+from edx_adapt.api import adapt_api, admission, serialization
+from edx_adapt.api.resources import data_serve_resources
+from edx_adapt.data import query_log
+from edx_adapt.data.course_repository import CourseRepositoryMongo
+from edx_adapt.data.identity_map import RequestScopedRepository
+from edx_adapt.data.problem_index import ProblemIndex, ProblemIndexCache
+from edx_adapt.model.bkt import BKT
+from edx_adapt.select.expected_gain_selector import ExpectedGainSelector
+from edx_adapt.select.skill_separate_random_selector import SkillSeparateRandomSelector
+from edx_adapt.select.speculative import SpeculativeSelection
+from edx_adapt.select.worker import SelectionWorkerPool
 
 COURSE_ID = 'CMUSTAT'
 
 base_api_path = '/api/v1/course'
 
+application = adapt_api.create_app()
+services = application.extensions[adapt_api.EXTENSION]
+
 
 def _setup_course_in_edxadapt(client, **kwargs):
     client.post(base_api_path, data=json.dumps({'course_id': kwargs['course_id']}), headers=kwargs['headers'])
@@ -49,7 +77,8 @@ class BaseTestCase(unittest.TestCase):
         cls.skills = ['center', 'shape', 'spread', 'x axis', 'y axis', 'h to d', 'd to h', 'histogram', 'None']
         cls.course_id = COURSE_ID + id_generator(3)
         cls.headers = {'Content-type': 'application/json'}
-        cls.app = adapt_api.app.test_client()
+        services.database.ensure_indexes()
+        cls.app = application.test_client()
         cls.params = {
             'headers': cls.headers,
             'skills': cls.skills,
@@ -89,6 +118,7 @@ class BaseTestCase(unittest.TestCase):
                 data=json.dumps(data),
                 headers=self.headers
             )
+            services.selection_pool.wait()
 
     def _answer_problem(self, correct=True, attempt=1, repeat=1, next_problem=True):
         """
@@ -101,15 +131,16 @@ class BaseTestCase(unittest.TestCase):
         """
         for i in range(repeat):
             if next_problem:
-                problem = adapt_api.database.get_next_problem(self.course_id, self.student_name)
+                problem = services.database.get_next_problem(self.course_id, self.student_name)
             else:
-                problem = adapt_api.database.get_current_problem(self.course_id, self.student_name)
+                problem = services.database.get_current_problem(self.course_id, self.student_name)
             data = {'problem': problem['problem_name'], 'correct': correct, 'attempt': attempt}
             self.app.post(
                 base_api_path + '/{}/user/{}/interaction'.format(self.course_id, self.student_name),
                 data=json.dumps(data),
                 headers=self.headers
             )
+            services.selection_pool.wait()
             attempt += 0 if next_problem else 1
 
     def _add_probabilities_to_user_skill(self, probabilities):
@@ -119,9 +150,22 @@ class BaseTestCase(unittest.TestCase):
             })
             self.app.post('/api/v1/parameters', data=payload, headers=self.headers)
 
+    @contextmanager
+    def _assert_max_queries(self, max_count):
+        """
+        Assert the block runs not more than max_count database queries in the test's thread
+
+        Selection runs in the background workers and its queries are not counted.
+        """
+        with query_log.recording() as stats:
+            yield stats
+        self.assertLessEqual(stats.count, max_count, msg="{} queries run, most repeated: {}".format(
+            stats.count, stats.most_repeated()
+        ))
+
     def _get_problems_num(self, pretest=None, posttest=None):
         """Returns number of the problems registered in the course"""
-        return len(adapt_api.database.get_problems(self.course_id, pretest=pretest, posttest=posttest))
+        return len(services.database.get_problems(self.course_id, pretest=pretest, posttest=posttest))
 
 
 class CourseTestCase(BaseTestCase):
@@ -153,6 +197,143 @@ class CourseTestCase(BaseTestCase):
         }]
         self.assertEqual(expected, experiments['experiments'])
 
+    def test_course_catalog_not_modified(self):
+        path = base_api_path + '/{}/skill'.format(self.course_id)
+        response = self.app.get(path)
+        etag = response.headers['ETag']
+        self.assertTrue(etag)
+        with self._assert_max_queries(0):
+            response = self.app.get(path, headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(etag, response.headers['ETag'])
+
+    def _import_csv(self, course_id):
+        data_dir = os.path.join(os.path.dirname(__file__), '../../data/BKT')
+        skills, problems = open(os.path.join(data_dir, 'skills.csv')), open(os.path.join(data_dir, 'problems.csv'))
+        with skills, problems:
+            return self.app.post(base_api_path + '/{}/import'.format(course_id), data={
+                'skills': (skills, 'skills.csv'),
+                'problems': (problems, 'problems.csv'),
+                'tutor_url': 'http://edx-lms.raccoongang.com/courses/' + course_id + '/{problem_name}'
+            })
+
+    def test_course_imported_from_csv(self):
+        course_id = COURSE_ID + id_generator(3)
+        response = self._import_csv(course_id)
+        self.assertEqual(201, response.status_code)
+        problems = json.loads(self.app.get(base_api_path + '/{}'.format(course_id)).data)['problems']
+        expected = json.loads(self.app.get(base_api_path + '/{}'.format(self.course_id)).data)['problems']
+        self.assertEqual(len(expected), len(problems))
+        self.assertEqual(
+            sorted((p['problem_name'], p['pretest'], p['posttest'], p['skills']) for p in expected),
+            sorted((p['problem_name'], p['pretest'], p['posttest'], p['skills']) for p in problems)
+        )
+
+    def test_course_csv_import_keeps_experiments_and_model_params(self):
+        course_id = COURSE_ID + id_generator(3)
+        experiments = [{'experiment_name': 'test_experiment2', 'start_time': 1462736963, 'end_time': 1999999999}]
+        model_params = [{'threshold': 0.9, 'ps': 0.01, 'pi': 0.1, 'pg': 0.01, 'pt': 0.6}]
+        definition = {'skills': ['center'], 'problems': [], 'experiments': experiments, 'model_params': model_params}
+        self.app.post(base_api_path + '/{}/import'.format(course_id), data=json.dumps(definition), headers=self.headers)
+
+        response = self._import_csv(course_id)
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(['problems', 'skills'], sorted(json.loads(response.data)['imported']))
+        path = base_api_path + '/' + course_id + '/{}'
+        self.assertEqual(experiments, json.loads(self.app.get(path.format('experiment')).data)['experiments'])
+        self.assertEqual(model_params, json.loads(self.app.get(path.format('probabilities')).data)['model_params'])
+        self.assertTrue(json.loads(self.app.get(path.format('skill')).data)['skills'])
+
+    def test_course_skills_served_as_msgpack(self):
+        path = base_api_path + '/{}/skill'.format(self.course_id)
+        response = self.app.get(path, headers={'Accept': serialization.MSGPACK_MIMETYPE})
+        self.assertEqual(serialization.MSGPACK_MIMETYPE, response.headers['Content-Type'])
+        self.assertEqual(json.loads(self.app.get(path).data), msgpack.unpackb(response.data, raw=False))
+
+    def test_course_import_validated(self):
+        definition = {
+            'skills': ['center'],
+            'problems': [{'problem_name': 'b3', 'tutor_url': 'http://tutor/b3', 'skills': ['shape']}]
+        }
+        response = self.app.post(
+            base_api_path + '/{}/import'.format(self.course_id), data=json.dumps(definition), headers=self.headers
+        )
+        self.assertEqual(400, response.status_code)
+        self.assertIn('shape', json.loads(response.data)['message'])
+
+
+class BulkEnrollmentTestCase(BaseTestCase):
+    def test_users_enrolled_in_bulk(self):
+        """
+        Test users are enrolled in one request, and enrolled users who have not started the course are updated.
+        """
+        user_ids = ['bulk_student_' + id_generator() for _ in range(3)]
+        payload = json.dumps({'user_ids': user_ids, 'params': {'pg': 0.25, 'ps': 0.25, 'pi': 0.1, 'pt': 0.5,
+                                                               'threshold': 0.99}})
+        path = base_api_path + '/{}/users/bulk'.format(self.course_id)
+        result = json.loads(self.app.post(path, data=payload, headers=self.headers).data)
+        self.assertEqual(user_ids, result['enrolled'])
+        for user_id in user_ids:
+            status = json.loads(self.app.get(base_api_path + '/{}/user/{}'.format(self.course_id, user_id)).data)
+            self.assertEqual('Pre_assessment_0', status['next']['problem_name'])
+
+        result = json.loads(self.app.post(path, data=payload, headers=self.headers).data)
+        self.assertEqual([], result['enrolled'])
+        self.assertEqual(user_ids, result['updated'])
+
+    def test_users_status_matches_user_status(self):
+        """
+        Test batch status of users is the same as the status of every user.
+        """
+        self._add_probabilities_to_user_skill({'pg': 0.25, 'ps': 0.25, 'pi': 0.1, 'pt': 0.5, 'threshold': 0.99})
+        self._answer_pre_assessment_problems(correct_answers=5)
+        path = base_api_path + '/{}/users/status'.format(self.course_id)
+        with self._assert_max_queries(4):
+            result = json.loads(self.app.post(
+                path, data=json.dumps({'user_ids': [self.student_name, 'unknown']}), headers=self.headers
+            ).data)
+        user_path = base_api_path + '/{}/user/{}'.format(self.course_id, self.student_name)
+        expected = json.loads(self.app.get(user_path).data)
+        self.assertEqual(expected, result['users'][self.student_name])
+        self.assertEqual(['unknown'], result['not_found'])
+
+        result = json.loads(self.app.get(path, query_string={'done_checks': 'false'}).data)
+        self.assertNotIn('done_with_current', result['users'][self.student_name])
+
+
+class _GenericStore(object):
+    """
+    Storage with the given courses and Generic values
+    """
+
+    def __init__(self, course_ids, values):
+        self.course_ids = course_ids
+        self.values = values
+        self.queried_keys = []
+
+    def get_tables(self):
+        return self.course_ids
+
+    def get_many(self, coll_name, keys):
+        self.queried_keys.extend(keys)
+        return {key: self.values[key] for key in keys if key in self.values}
+
+
+class SectionParametersTestCase(unittest.TestCase):
+    def test_exact_keys_of_users_read(self):
+        """
+        Test parameters are found by the exact keys of the users, so a user id ending another one gets none of its.
+        """
+        store = _GenericStore(['CMU:s1', 'CMU:s2', 'OTHER:s1'], {
+            'CMU:s1abcenter': {'pg': 0.1}, 'CMU:s2abcenter': {'pg': 0.2}, 'CMU:s2ccenter': {'pg': 0.3},
+            'OTHER:s1bcenter': {'pg': 0.4},
+        })
+        repo = CourseRepositoryMongo(store)
+        found = repo.get_section_parameters('CMU:s2', ['b', 'ab', 'c'], ['center', 'shape'])
+        self.assertEqual({'ab': {'pg': 0.1}, 'c': {'pg': 0.3}}, found)
+        self.assertEqual(12, len(store.queried_keys))
+        self.assertFalse([key for key in store.queried_keys if key.startswith('OTHER')])
+
 
 class PreAssessmentTestCase(BaseTestCase):
     def setUp(self):
@@ -198,6 +379,29 @@ class MainLogicTestCase(BaseTestCase):
         self.assertTrue(next_problem['posttest'])
         self.assertTrue(next_problem['problem_name'].startswith('Post_assessment'))
 
+    def test_interaction_without_correctness_rejected(self):
+        response = self.app.post(
+            base_api_path + '/{}/user/{}/interaction'.format(self.course_id, self.student_name),
+            data=json.dumps({'problem': 'Pre_assessment_0', 'attempt': 1}),
+            headers=self.headers
+        )
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(
+            {'correct': 'Must supply correctness, 0 for incorrect, 1 for correct'}, json.loads(response.data)['message']
+        )
+
+    def test_interaction_returns_status(self):
+        problem = services.database.get_next_problem(self.course_id, self.student_name)
+        response = json.loads(self.app.post(
+            base_api_path + '/{}/user/{}/interaction'.format(self.course_id, self.student_name),
+            data=json.dumps({'problem': problem['problem_name'], 'correct': 1, 'attempt': 1, 'return_status': True}),
+            headers=self.headers
+        ).data)
+        services.selection_pool.wait()
+        self.assertTrue(response['success'])
+        self.assertEqual(problem['problem_name'], response['status']['current']['problem_name'])
+        self.assertTrue(response['status']['done_with_current'])
+
     def test_alternative_parameters_set_two(self):
         """
         Test student with alternative parameter set two (need do all course, even if all answers were correct).
@@ -267,3 +471,838 @@ class MainLogicTestCase(BaseTestCase):
         # NOTE(idegtiarov) with default parameter's set student has to answer correctly not more than on 28 problems
         # from 56 before he will be shifted to Post_assessment part
         self.assertTrue(status['next']['posttest'])
+
+
+class SpeculativeSelectionTestCase(BaseTestCase):
+    def test_precomputed_problem_committed(self):
+        """
+        Test next problem precomputed when the problem is served is committed for the matching answer.
+        """
+        probabilities = {'pg': 0.25, 'ps': 0.25, 'pi': 0.1, 'pt': 0.5, 'threshold': 0.99}
+        self._add_probabilities_to_user_skill(probabilities)
+        self._answer_pre_assessment_problems(correct_answers=5)
+
+        problem = services.database.get_next_problem(self.course_id, self.student_name)
+        self.app.post(
+            base_api_path + '/{}/user/{}/pageload'.format(self.course_id, self.student_name),
+            data=json.dumps({'problem': problem['problem_name']}),
+            headers=self.headers
+        )
+        services.speculator.wait()
+        speculation = services.database.store.get_one(self.course_id + '_problems', self.student_name, 'speculative')
+        self.assertEqual(problem['problem_name'], speculation['problem_name'])
+
+        self._answer_problem(next_problem=False)
+        next_problem = services.database.get_next_problem(self.course_id, self.student_name)
+        self.assertEqual(speculation['branches']['correct'], next_problem)
+
+
+class DataServeTestCase(BaseTestCase):
+    def test_course_log_streamed_with_gzip(self):
+        """
+        Test course log is streamed gzip-compressed when the client accepts it.
+        """
+        path = '/api/v1/data/logs/course/{}'.format(self.course_id)
+        plain = self.app.get(path)
+        compressed = self.app.get(path, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual('gzip', compressed.headers['Content-Encoding'])
+        log = json.loads(zlib.decompress(compressed.data, 16 + zlib.MAX_WBITS))
+        self.assertEqual(json.loads(plain.data), log)
+        self.assertIn(self.student_name, log['log'])
+
+    def test_course_log_streamed_as_msgpack(self):
+        """
+        Test course log is streamed as one msgpack map when the client accepts it.
+        """
+        path = '/api/v1/data/logs/course/{}'.format(self.course_id)
+        response = self.app.get(path, headers={'Accept': serialization.MSGPACK_MIMETYPE})
+        self.assertEqual(serialization.MSGPACK_MIMETYPE, response.headers['Content-Type'])
+        log = msgpack.unpackb(response.data, raw=False)
+        self.assertEqual(json.loads(self.app.get(path).data), log)
+        self.assertIn(self.student_name, log['log'])
+
+    def test_course_log_paginated(self):
+        """
+        Test course log pages of one user cover all users without repeats.
+        """
+        path = '/api/v1/data/logs/course/{}'.format(self.course_id)
+        users = []
+        response = self.app.get(path, query_string={'limit': 1})
+        while True:
+            page = json.loads(response.data)['log']
+            self.assertLessEqual(len(page), 1)
+            users.extend(page)
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+            response = self.app.get(path, query_string={'limit': 1, 'cursor': cursor})
+        self.assertEqual(sorted(json.loads(self.app.get(path).data)['log']), users)
+
+    def test_data_serve_shed_over_limit(self):
+        """
+        Test data-serve requests over the admission limit are rejected while tutor requests are served.
+        """
+        limiters = services.admission_limiters
+        limiter = limiters[admission.DATA_SERVE]
+        limiters[admission.DATA_SERVE] = admission.AdmissionLimiter(admission.DATA_SERVE, 0, retry_after=30)
+        try:
+            response = self.app.get('/api/v1/data/logs/course/{}'.format(self.course_id))
+            self.assertEqual(503, response.status_code)
+            self.assertEqual('30', response.headers['Retry-After'])
+            response = self.app.get(base_api_path + '/{}/user/{}'.format(self.course_id, self.student_name))
+            self.assertEqual(200, response.status_code)
+        finally:
+            limiters[admission.DATA_SERVE] = limiter
+        self.assertEqual(0, limiters[admission.TUTOR_READ].in_flight)
+
+
+class QueryCountTestCase(BaseTestCase):
+    def setUp(self):
+        super(QueryCountTestCase, self).setUp()
+        probabilities = {'pg': 0.25, 'ps': 0.25, 'pi': 0.1, 'pt': 0.5, 'threshold': 0.99}
+        self._add_probabilities_to_user_skill(probabilities)
+        self._answer_pre_assessment_problems(correct_answers=5)
+
+    def test_user_status_query_count(self):
+        with self._assert_max_queries(8):
+            self.app.get(base_api_path + '/{}/user/{}'.format(self.course_id, self.student_name))
+
+    def test_user_status_cached_until_state_changes(self):
+        path = base_api_path + '/{}/user/{}'.format(self.course_id, self.student_name)
+        status = json.loads(self.app.get(path).data)
+        with self._assert_max_queries(1):
+            self.assertEqual(status, json.loads(self.app.get(path).data))
+        self._answer_problem()
+        self.assertNotEqual(status['current'], json.loads(self.app.get(path).data)['current'])
+
+    def test_user_status_wait_returns_on_change(self):
+        path = base_api_path + '/{}/user/{}/wait'.format(self.course_id, self.student_name)
+        status = json.loads(self.app.get(path).data)
+        self.assertEqual(status, json.loads(self.app.get(path + '?rev={}&timeout=0.1'.format(status['rev'])).data))
+        threading.Timer(
+            0.2, services.database.set_selection_pending, (self.course_id, self.student_name, False)
+        ).start()
+        start = time.time()
+        changed = json.loads(self.app.get(path + '?rev={}&timeout=10'.format(status['rev'])).data)
+        self.assertGreater(changed['rev'], status['rev'])
+        self.assertLess(time.time() - start, 1)
+
+    def test_user_interaction_query_count(self):
+        problem = services.database.get_next_problem(self.course_id, self.student_name)
+        with self._assert_max_queries(12):
+            self.app.post(
+                base_api_path + '/{}/user/{}/interaction'.format(self.course_id, self.student_name),
+                data=json.dumps({'problem': problem['problem_name'], 'correct': True, 'attempt': 1}),
+                headers=self.headers
+            )
+        services.selection_pool.wait()
+
+
+class AppFactoryTestCase(unittest.TestCase):
+    def test_app_created_without_connecting(self):
+        """
+        Test the application is built without reaching the database, it connects on the first query.
+        """
+        start = time.time()
+        app = adapt_api.create_app('mongodb://192.0.2.1:27017/', configure_logging=False)
+        self.assertLess(time.time() - start, 1)
+        self.assertIsNot(services, app.extensions[adapt_api.EXTENSION])
+        self.assertIn(base_api_path + '/<course_id>/user/<user_id>', [rule.rule for rule in app.url_map.iter_rules()])
+
+    def test_tutor_app_serves_tutor_endpoints_only(self):
+        app = adapt_api.create_app(
+            'mongodb://192.0.2.1:27017/', configure_logging=False, applications=[adapt_api.TUTOR]
+        )
+        rules = [rule.rule for rule in app.url_map.iter_rules()]
+        self.assertIn(base_api_path + '/<course_id>/user/<user_id>/interaction', rules)
+        self.assertNotIn(base_api_path + '/<course_id>/user', rules)
+        self.assertFalse([rule for rule in rules if rule.startswith('/api/v1/data/')])
+
+    def test_uwsgi_threads_left_to_tutor_requests(self):
+        """
+        Test bulk requests and long-polls may take at most half of the threads of every uWSGI pool.
+        """
+        pools = {
+            'edx_adapt.ini': adapt_api.APPLICATIONS,
+            'edx_adapt_tutor.ini': [adapt_api.TUTOR],
+            'edx_adapt_admin.ini': [adapt_api.ADMIN],
+            'edx_adapt_analytics.ini': [adapt_api.ANALYTICS],
+        }
+        for name, applications in pools.iteritems():
+            config = ConfigParser.RawConfigParser()
+            config.read(os.path.join(os.path.dirname(__file__), '../../etc/edx_adapt', name))
+            threads = config.getint('uwsgi', 'threads')
+            app = adapt_api.create_app(
+                'mongodb://192.0.2.1:27017/', configure_logging=False, applications=applications
+            )
+            self.assertLessEqual(adapt_api.check_admission_threads(app, threads) * 2, threads, msg=name)
+
+    def test_admin_reads_served_during_bulk_job(self):
+        """
+        Test users are listed while the enrollment slots are taken by bulk jobs, which reject more bulk requests.
+        """
+        app = adapt_api.create_app('mongodb://192.0.2.1:27017/', configure_logging=False)
+        database = app.extensions[adapt_api.EXTENSION].database
+        database.get_finished_users = lambda course_id: []
+        database.get_in_progress_users = lambda course_id: ['student']
+        enrollment = app.extensions[adapt_api.EXTENSION].admission_limiters[admission.ENROLLMENT]
+        while enrollment.acquire():
+            pass
+        client = app.test_client()
+        response = client.get(base_api_path + '/{}/user'.format(COURSE_ID))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['student'], json.loads(response.data)['users']['in_progress'])
+        response = client.post(
+            base_api_path + '/{}/users/bulk'.format(COURSE_ID), data=json.dumps({'user_ids': ['s'], 'params': {}}),
+            content_type='application/json'
+        )
+        self.assertEqual(503, response.status_code)
+
+
+class IdentityMapTestCase(unittest.TestCase):
+    def test_reads_memoized_until_written(self):
+        """
+        Test a read is run once per request, writes drop the reads they change and write through the next problem.
+        """
+        calls = []
+
+        class Repository(object):
+            def get_next_problem(self, course_id, user_id):
+                calls.append('get_next_problem')
+                return {'problem_name': 'Pre_assessment_1'}
+
+            def get_raw_user_data(self, course_id, user_id):
+                calls.append('get_raw_user_data')
+                return []
+
+            def post_interaction(self, *args):
+                calls.append('post_interaction')
+
+            def advance_problem(self, course_id, user_id):
+                calls.append('advance_problem')
+
+        repo = RequestScopedRepository(Repository())
+        for _ in range(2):
+            repo.get_next_problem('course', 'user')
+            repo.get_raw_user_data('course', 'user')
+        repo.post_interaction('course', 'Pre_assessment_1', 'user', 1, 1, 0)
+        repo.get_next_problem('course', 'user')
+        repo.get_raw_user_data('course', 'user')
+        repo.advance_problem('course', 'user')
+        self.assertIsNone(repo.get_next_problem('course', 'user'))
+        self.assertEqual(calls, [
+            'get_next_problem', 'get_raw_user_data', 'post_interaction', 'get_raw_user_data', 'advance_problem'
+        ])
+
+
+    def test_generic_reads_memoized_and_copied(self):
+        """
+        Test parameters reads are memoized until they are set, unknown reads are passed through and callers get copies.
+        """
+        calls = []
+
+        class Repository(object):
+            def get_many(self, keys):
+                calls.append('get_many')
+                return {key: {'threshold': 0.9} for key in keys}
+
+            def get_subject_count(self, course_id):
+                calls.append('get_subject_count')
+                return 0
+
+            def set(self, key, value):
+                calls.append('set')
+
+        repo = RequestScopedRepository(Repository())
+        parameters = repo.get_many(['course_user_center'])
+        parameters['course_user_center']['threshold'] = 0.5
+        self.assertEqual({'course_user_center': {'threshold': 0.9}}, repo.get_many(['course_user_center']))
+        repo.get_subject_count('course')
+        repo.get_many(['course_user_center'])
+        repo.set('course_user_center', {'threshold': 0.5})
+        repo.get_many(['course_user_center'])
+        self.assertEqual(['get_many', 'get_subject_count', 'set', 'get_many'], calls)
+
+
+class _UserStates(object):
+    """
+    Data interface of the selection worker pool keeping users' states in memory, every selection chooses a problem
+    """
+
+    def __init__(self):
+        self.next = {}
+        self.pending = {}
+        self.revs = {}
+        self.writes = []
+
+    def get_next_problem(self, course_id, user_id):
+        return None
+
+    def claim_selection(self, course_id, user_id, stale_before=None):
+        key = (course_id, user_id)
+        if stale_before is not None and not self.pending.get(key, stale_before) < stale_before:
+            return None
+        self.pending[key] = time.time()
+        self.revs[key] = self.revs.get(key, 0) + 1
+        return self.revs[key]
+
+    def set_next_problem(self, course_id, user_id, problem, rev=None):
+        key = (course_id, user_id)
+        if rev is not None and rev != self.revs.get(key, 0):
+            return False
+        self.writes.append(key)
+        self.next[key] = problem
+        self.pending.pop(key, None)
+        self.revs[key] = self.revs.get(key, 0) + 1
+        return True
+
+
+class _BlockingSelector(object):
+    """
+    Selector whose selections run until they are released
+    """
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.users = []
+
+    def choose_next_problem(self, course_id, user_id, pending=None):
+        self.users.append(user_id if pending is None else (user_id, pending['problem']['problem_name']))
+        self.started.set()
+        self.release.wait(5)
+        return {'problem_name': 'Pre_assessment_0'}
+
+
+class SelectionWorkerPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.states = _UserStates()
+        self.selector = _BlockingSelector()
+        self.pool = SelectionWorkerPool(self.states, self.selector, workers=1, pending_timeout=60)
+
+    def tearDown(self):
+        self.selector.release.set()
+        self.pool.wait()
+
+    def test_jobs_coalesced(self):
+        """
+        Test a job submitted while queued is dropped, and one submitted while running makes it run once more.
+        """
+        self.pool.submit('course', 'running')
+        self.assertTrue(self.selector.started.wait(5))
+        for _ in range(2):
+            self.pool.submit('course', 'queued')
+            self.pool.submit('course', 'running')
+        self.selector.release.set()
+        self.pool.wait()
+        self.assertEqual(['running', 'queued', 'running'], self.selector.users)
+
+    def test_user_pending_until_selected(self):
+        self.pool.submit('course', 'user')
+        self.assertTrue(self.selector.started.wait(5))
+        self.assertIn(('course', 'user'), self.states.pending)
+        self.selector.release.set()
+        self.pool.wait()
+        self.assertNotIn(('course', 'user'), self.states.pending)
+        self.assertEqual({'problem_name': 'Pre_assessment_0'}, self.states.next[('course', 'user')])
+
+    def test_lost_selection_resubmitted(self):
+        self.selector.release.set()
+        self.states.pending[('course', 'user')] = time.time() - 120
+        self.assertFalse(self.pool.resubmit_lost('course', 'user', None))
+        self.assertFalse(self.pool.resubmit_lost('course', 'user', time.time() - 10))
+        self.assertTrue(self.pool.resubmit_lost('course', 'user', time.time() - 120))
+        self.pool.wait()
+        self.assertEqual(['user'], self.selector.users)
+
+    def test_selection_taken_over_by_one_process(self):
+        """
+        Test a selection taken over by another process is stored once, by the process which took it over.
+        """
+        self.pool.submit('course', 'user')
+        self.assertTrue(self.selector.started.wait(5))
+        pending_since = self.states.pending[('course', 'user')]
+        time.sleep(0.01)
+        # Processes reading the mark after the timeout, the first one selects at once
+        other_selector = _BlockingSelector()
+        other_selector.release.set()
+        other_pools = [
+            SelectionWorkerPool(self.states, other_selector, workers=0, pending_timeout=0) for _ in range(2)
+        ]
+        self.assertTrue(other_pools[0].resubmit_lost('course', 'user', pending_since))
+        self.assertFalse(other_pools[1].resubmit_lost('course', 'user', pending_since))
+        self.selector.release.set()
+        self.pool.wait()
+        self.assertEqual(['user'], self.selector.users)
+        self.assertEqual(['user'], other_selector.users)
+        self.assertEqual([('course', 'user')], self.states.writes)
+
+
+class _Speculations(object):
+    """
+    Data interface of the speculative selection keeping the precomputed problems
+    """
+
+    def __init__(self):
+        self.stored = []
+
+    def set_speculative_problems(self, course_id, user_id, problem_name, branches):
+        self.stored.append((user_id, problem_name))
+
+
+class SpeculativeSelectionTestCase(unittest.TestCase):
+    def test_jobs_coalesced_per_user(self):
+        """
+        Test problems served while the user's job is queued replace its problem, other users' jobs are kept.
+        """
+        speculations = _Speculations()
+        selector = _BlockingSelector()
+        speculator = SpeculativeSelection(speculations, selector)
+        speculator.submit('course', 'running', {'problem_name': 'p1'})
+        self.assertTrue(selector.started.wait(5))
+        for name in ['p2', 'p3', 'p4']:
+            speculator.submit('course', 'user', {'problem_name': name})
+        speculator.submit('course', 'running', {'problem_name': 'p5'})
+        selector.release.set()
+        speculator.wait()
+        self.assertEqual([('running', 'p1'), ('user', 'p4'), ('running', 'p5')], speculations.stored)
+
+
+class MetricsTestCase(unittest.TestCase):
+    def test_metrics_exported_without_client_errors(self):
+        app = adapt_api.create_app('mongodb://192.0.2.1:27017/', configure_logging=False).test_client()
+        response = app.post(
+            base_api_path + '/course/user/student/interaction',
+            data=json.dumps({'problem': 'Pre_assessment_0', 'attempt': 1}), headers={'Content-type': 'application/json'}
+        )
+        self.assertEqual(400, response.status_code)
+        self.assertIsNone(REGISTRY.get_sample_value('edx_adapt_errors_total', {'exception': 'BadRequest'}))
+
+        response = app.get('/metrics')
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+        self.assertIn('edx_adapt_requests_total{method="POST",resource="UserInteraction",status="400"}', response.data)
+
+    def test_live_gauges_of_dead_processes_removed(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        process = subprocess.Popen(['true'])
+        process.wait()
+        sample_files = [
+            'gauge_livesum_{}.db'.format(process.pid), 'gauge_livesum_{}.db'.format(os.getpid()),
+            'counter_{}.db'.format(process.pid)
+        ]
+        for name in sample_files:
+            open(os.path.join(path, name), 'w').close()
+        self.assertEqual([process.pid], metrics.remove_dead_processes(path))
+        self.assertEqual(sorted(sample_files[1:]), sorted(os.listdir(path)))
+
+
+class _SelectionSnapshot(object):
+    """
+    Snapshot of a user of a course with the skills center and shape, see edx_adapt.select.snapshot
+    """
+    course_id = 'course'
+    user_id = 'user'
+    catalog_version = 1
+    skills = ['center', 'shape', 'None']
+    problems = [
+        {'problem_name': name, 'skills': problem_skills, 'pretest': False, 'posttest': False}
+        for name, problem_skills in [
+            ('a', ['center']), ('b', ['shape']), ('ab', ['center', 'shape']), ('n', ['None'])
+        ]
+    ]
+    index = ProblemIndex(problems)
+    interactions = []
+
+    def __init__(self, answered=()):
+        self.answered = set(answered)
+        self.answered_mask = self.index.mask(answered)
+
+    def get_parameters(self, key_func, skill_names):
+        parameters = {'pg': 0.2, 'ps': 0.1, 'pi': 0.1, 'pt': 0.5, 'threshold': 0.95}
+        return {skill_name: parameters for skill_name in skill_names}
+
+
+class _Mastery(object):
+    """
+    Model with the given mastery of every skill
+    """
+
+    def __init__(self, mastery):
+        self.mastery = mastery
+
+    def get_probabilities_mastered(self, interactions, skill_parameters):
+        return self.mastery
+
+
+class _CourseData(object):
+    """
+    Data module with the course of _SelectionSnapshot and a user who has finished the pre-assessment
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.problems = _SelectionSnapshot.problems + [
+            {'problem_name': 'Pre_a', 'skills': ['center'], 'pretest': True, 'posttest': False}
+        ]
+
+    def get_course(self, course_id):
+        self.calls.append('get_course')
+        return {'skills': _SelectionSnapshot.skills, 'problems': self.problems, 'catalog_version': 'course-1'}
+
+    def get_problem_index(self, course_id, course):
+        return ProblemIndex(course['problems'])
+
+    def get_responses(self, course_id, user_id):
+        self.calls.append('get_responses')
+        return [{'problem': self.problems[-1], 'correct': 1, 'attempt': 1}]
+
+    def get_many(self, keys):
+        self.calls.append('get_many')
+        parameters = {'pg': 0.2, 'ps': 0.1, 'pi': 0.1, 'pt': 0.5, 'threshold': 0.95}
+        return {key: parameters for key in keys}
+
+
+class SelectionQueriesTestCase(unittest.TestCase):
+    def test_next_problem_chosen_with_three_reads(self):
+        """
+        Test a selection reads the catalog, the user's responses and the user's parameters once each.
+        """
+        data = _CourseData()
+        selector = SkillSeparateRandomSelector(data, _Mastery({'center': 0.5, 'shape': 0.05}), "user skill")
+        labels = {'selector': 'SkillSeparateRandomSelector'}
+        count = REGISTRY.get_sample_value('edx_adapt_selection_queries_count', labels) or 0
+        total = REGISTRY.get_sample_value('edx_adapt_selection_queries_sum', labels) or 0
+        self.assertIn(selector.choose_next_problem('course', 'user')['problem_name'], ['a', 'b', 'ab'])
+        self.assertEqual(['get_course', 'get_responses', 'get_many'], data.calls)
+        self.assertEqual(count + 1, REGISTRY.get_sample_value('edx_adapt_selection_queries_count', labels))
+        self.assertEqual(total + 3, REGISTRY.get_sample_value('edx_adapt_selection_queries_sum', labels))
+
+
+class ExpectedGainSelectorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.selector = ExpectedGainSelector(None, _Mastery({'center': 0.5, 'shape': 0.05}), "user skill")
+
+    def test_problem_of_most_informative_skills_chosen(self):
+        """
+        Test problems are ordered by the information about their skills, computed by hand for pg 0.2 and ps 0.1.
+        """
+        matrix = self.selector._get_matrix(_SelectionSnapshot())
+        scores, under_threshold = self.selector._skill_scores(
+            matrix, self.selector.model_interface.mastery, _SelectionSnapshot().get_parameters(None, matrix.skills)
+        )
+        # H(0.55) - (0.5 H(0.1) + 0.5 H(0.2)) and H(0.235) - (0.05 H(0.1) + 0.95 H(0.2))
+        self.assertAlmostEqual(0.3973, scores[matrix.skills.index('center')], places=4)
+        self.assertAlmostEqual(0.0773, scores[matrix.skills.index('shape')], places=4)
+        self.assertTrue(under_threshold.all())
+
+        chosen = []
+        for _ in range(3):
+            chosen.append(self.selector._choose_candidate(_SelectionSnapshot(chosen))['problem_name'])
+        self.assertEqual(['ab', 'a', 'b'], chosen)
+        self.assertIsNone(self.selector._choose_candidate(_SelectionSnapshot(chosen)))
+
+    def test_matrix_kept_with_problem_index(self):
+        matrix = self.selector._get_matrix(_SelectionSnapshot())
+        self.assertIs(matrix, ExpectedGainSelector(None, None)._get_matrix(_SelectionSnapshot()))
+        self.assertEqual([[1, 0], [0, 1], [1, 1], [0, 0]], matrix.incidence.tolist())
+        self.assertEqual([1, 2], matrix.positions(_SelectionSnapshot.index.mask(['b', 'ab'])).tolist())
+
+    def test_matrix_spans_several_chunks(self):
+        index = ProblemIndex([_catalog_problem('p{}'.format(i), ['odd' if i % 2 else 'even']) for i in range(150)])
+        catalog = _SelectionSnapshot()
+        catalog.index, catalog.skills = index, ['odd', 'even']
+        matrix = self.selector._get_matrix(catalog)
+        self.assertEqual([i % 2 for i in range(150)], matrix.incidence[:, 0].tolist())
+        self.assertEqual([3, 129], matrix.positions(index.mask(['p129', 'p3'])).tolist())
+
+    def test_mastered_skills_skipped(self):
+        self.selector.model_interface.mastery = {'center': 0.99, 'shape': 0.05}
+        self.assertEqual('b', self.selector._choose_candidate(_SelectionSnapshot(['ab']))['problem_name'])
+
+    def test_candidates_sampled_within_latency_budget(self):
+        self.selector.min_candidates = 1
+        self.selector._seconds_per_candidate = self.selector.latency_budget / 2.5
+        self.assertEqual(2, self.selector._candidate_limit(time.time()))
+        self.assertEqual(1, self.selector._candidate_limit(time.time() - self.selector.latency_budget))
+        self.assertIn(self.selector._choose_candidate(_SelectionSnapshot())['problem_name'], ['a', 'b', 'ab'])
+
+
+class _Records(logging.Handler):
+    """
+    Handler keeping the formatted records
+    """
+
+    def __init__(self, formatter):
+        super(_Records, self).__init__()
+        self.setFormatter(formatter)
+        self.lines = []
+
+    def emit(self, record):
+        try:
+            self.lines.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+class _RequestBound(object):
+    """
+    Argument which can be formatted only while the request it belongs to is handled
+    """
+    handled = True
+
+    def __str__(self):
+        if not self.handled:
+            raise RuntimeError("Working outside of request context")
+        return 'GET /api/v1/course'
+
+
+class LogTestCase(unittest.TestCase):
+    def _record(self, msg, args, exc_info=None, **extra):
+        record = logging.LogRecord('edx-adapt', logging.ERROR, __file__, 1, msg, args, exc_info)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter(self):
+        try:
+            raise ValueError('no course')
+        except ValueError:
+            record = self._record('Request %s failed', ('GET',), exc_info=sys.exc_info(), status=500)
+        data = json.loads(log.JsonFormatter().format(record))
+        self.assertEqual('Request GET failed', data['message'])
+        self.assertEqual('ERROR', data['level'])
+        self.assertEqual('edx-adapt', data['logger'])
+        self.assertEqual(500, data['status'])
+        self.assertIn('ValueError: no course', data['exception'])
+
+    def test_queued_record_formatted_in_callers_thread(self):
+        records = _Records(log.JsonFormatter())
+        listener = log.QueueListener([records])
+        handler = log.QueueHandler(listener)
+        request, details = _RequestBound(), {'user': 'student'}
+        try:
+            raise ValueError('no course')
+        except ValueError:
+            handler.handle(self._record('%s %s', (request, details), exc_info=sys.exc_info()))
+        request.handled = False
+        details['user'] = 'changed'
+        listener.flush()
+        self.assertEqual(1, len(records.lines))
+        data = json.loads(records.lines[0])
+        self.assertEqual("GET /api/v1/course {'user': 'student'}", data['message'])
+        self.assertIn('ValueError: no course', data['exception'])
+
+
+try:
+    import gevent
+except ImportError:
+    gevent = None
+
+# Run in a monkey patched interpreter: two greenlets of parallel.run record a command each, interleaved
+_GEVENT_RECORDING_SCRIPT = """
+from gevent import monkey
+monkey.patch_all()
+import collections
+import gevent
+from edx_adapt import parallel
+from edx_adapt.data import query_log
+
+Event = collections.namedtuple('Event', 'request_id command_name command duration_micros')
+listener = query_log.QueryCounterListener()
+
+def find(request_id):
+    event = Event(request_id, 'find', {'find': 'Courses', 'filter': {'course_id': request_id}}, 1000)
+    listener.started(event)
+    gevent.sleep(0.01)
+    listener.succeeded(event)
+    return request_id
+
+with query_log.recording() as stats:
+    results = parallel.run(lambda: find(1), lambda: find(2))
+print('{} {} {} {}'.format(parallel.gevent_enabled(), results, stats.count, stats.duplicates))
+"""
+
+
+class ParallelTestCase(unittest.TestCase):
+    def test_calls_run_in_order(self):
+        calls = []
+        results = parallel.run(lambda: calls.append(1) or 'a', lambda: calls.append(2) or 'b')
+        self.assertEqual(['a', 'b'], results)
+        self.assertEqual([1, 2], calls)
+        self.assertEqual([], parallel.run())
+
+    def test_first_exception_raised(self):
+        def fail(message):
+            raise ValueError(message)
+
+        with self.assertRaises(ValueError) as raised:
+            parallel.run(lambda: 1, lambda: fail('first'), lambda: fail('second'))
+        self.assertEqual('first', str(raised.exception))
+
+    @unittest.skipUnless(gevent, "gevent is not installed")
+    def test_query_recordings_attached_to_greenlets(self):
+        output = subprocess.check_output(
+            [sys.executable, '-c', _GEVENT_RECORDING_SCRIPT],
+            cwd=os.path.join(os.path.dirname(__file__), '../..')
+        )
+        self.assertEqual('True [1, 2] 2 1', output.strip())
+
+
+class SerializationTestCase(unittest.TestCase):
+    def test_mimetype_negotiated(self):
+        app = flask.Flask(__name__)
+        for accept, expected in [
+            (None, serialization.JSON_MIMETYPE),
+            ('*/*', serialization.JSON_MIMETYPE),
+            ('text/html', serialization.JSON_MIMETYPE),
+            (serialization.MSGPACK_MIMETYPE, serialization.MSGPACK_MIMETYPE),
+            ('application/json;q=0.5, application/x-msgpack', serialization.MSGPACK_MIMETYPE),
+        ]:
+            with app.test_request_context(headers={'Accept': accept} if accept else {}):
+                self.assertEqual(expected, serialization.negotiate(), msg=accept)
+
+    def test_representations_registered(self):
+        api = Api(flask.Flask(__name__))
+        serialization.register(api)
+        self.assertIs(serialization.output_json, api.representations[serialization.JSON_MIMETYPE])
+        self.assertIs(serialization.output_msgpack, api.representations[serialization.MSGPACK_MIMETYPE])
+
+    def test_users_streamed_as_msgpack_map(self):
+        data = {'student_1': [{'problem': 'Pre_assessment_0', 'correct': 1}], 'student_2': []}
+        chunks = data_serve_resources._stream_users_msgpack(sorted(data), data.get, envelope='log')
+        self.assertEqual({'log': data}, msgpack.unpackb(''.join(chunks), raw=False))
+
+
+def _catalog_problem(name, skills, pretest=False, posttest=False):
+    return {'problem_name': name, 'skills': skills, 'pretest': pretest, 'posttest': posttest}
+
+
+class _Rng(object):
+    """Source of randomness returning the given position"""
+    def __init__(self, nth):
+        self.nth = nth
+
+    def randrange(self, stop):
+        assert self.nth < stop
+        return self.nth
+
+
+class ProblemIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.index = ProblemIndex([
+            _catalog_problem('Pre_a', ['a'], pretest=True),
+            _catalog_problem('a_1', ['a']),
+            _catalog_problem('ab_1', ['a', 'b']),
+            _catalog_problem('b_1', ['b']),
+            _catalog_problem('Post_b', ['b'], posttest=True),
+        ])
+
+    def names(self, mask):
+        return [problem['problem_name'] for problem in self.index.problems_of(mask)]
+
+    def test_problems_selected_by_filters(self):
+        self.assertEqual(['Pre_a', 'a_1', 'ab_1', 'b_1', 'Post_b'], self.names(self.index.select()))
+        self.assertEqual(['a_1', 'ab_1'], self.names(self.index.select('a', pretest=False, posttest=False)))
+        self.assertEqual(['Pre_a'], self.names(self.index.select(pretest=True)))
+        self.assertEqual(['Post_b'], self.names(self.index.select('b', posttest=True)))
+        self.assertEqual([], self.names(self.index.select('unknown')))
+
+    def test_answered_problems_excluded(self):
+        answered = self.index.mask(['a_1', 'Pre_a', 'not_in_catalog'])
+        self.assertEqual(['ab_1'], self.names(self.index.select('a', exclude=answered)))
+        self.assertEqual(['ab_1', 'b_1'], self.names(self.index.select(exclude=answered | self.index.posttest)))
+
+    def test_problem_chosen_by_position_in_mask(self):
+        mask = self.index.select('b')
+        chosen = [self.index.choice(mask, _Rng(nth))['problem_name'] for nth in range(3)]
+        self.assertEqual(['ab_1', 'b_1', 'Post_b'], chosen)
+        self.assertRaises(IndexError, self.index.choice, 0)
+
+    def test_masks_span_several_chunks(self):
+        index = ProblemIndex([_catalog_problem('p{}'.format(i), ['odd' if i % 2 else 'even']) for i in range(150)])
+        mask = index.select('odd', exclude=index.mask(['p1', 'p129']))
+        names = [problem['problem_name'] for problem in index.problems_of(mask)]
+        self.assertEqual(['p{}'.format(i) for i in range(3, 150, 2) if i != 129], names)
+        self.assertEqual('p65', index.choice(mask, _Rng(31))['problem_name'])
+        self.assertEqual('p149', index.choice(mask, _Rng(len(names) - 1))['problem_name'])
+
+    def test_index_rebuilt_for_recreated_course(self):
+        cache = ProblemIndexCache()
+        first = cache.get(COURSE_ID, 'course1-0', lambda: [_catalog_problem('a_1', ['a'])])
+        self.assertIs(first, cache.get(COURSE_ID, 'course1-0', lambda: self.fail('index rebuilt')))
+        recreated = cache.get(COURSE_ID, 'course2-0', lambda: [_catalog_problem('b_1', ['b'])])
+        self.assertEqual([_catalog_problem('b_1', ['b'])], recreated.problems)
+
+
+class _CommandEvent(object):
+    """Command event of pymongo's monitoring"""
+    def __init__(self, request_id, command_name, command, duration_micros=1000):
+        self.request_id = request_id
+        self.command_name = command_name
+        self.command = command
+        self.duration_micros = duration_micros
+
+
+class StreamedQueriesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.records = []
+        self.handler = logging.Handler()
+        self.handler.emit = self.records.append
+        access_logger.addHandler(self.handler)
+        self.addCleanup(access_logger.removeHandler, self.handler)
+        self.addCleanup(access_logger.setLevel, access_logger.level)
+        access_logger.setLevel(logging.INFO)
+        self.listener = query_log.QueryCounterListener()
+
+    def _users(self, users):
+        # One find per user, as run by the user_data function of a streamed log
+        for i, user in enumerate(users):
+            event = _CommandEvent(i, 'find', {'find': 'CMUSTAT_log', 'filter': {'student_id': user}})
+            self.listener.started(event)
+            self.listener.succeeded(event)
+            yield user
+
+    def test_stream_queries_logged_when_stream_ends(self):
+        chunks = data_serve_resources._recorded(self._users(['u1', 'u2']), 'GET', '/log', sampled=True)
+        self.assertEqual('u1', next(chunks))
+        self.assertEqual([], self.records)
+        self.assertEqual('u2', ''.join(chunks))
+        self.assertEqual(1, len(self.records))
+        record = self.records[0]
+        self.assertTrue(record.streamed)
+        self.assertEqual((2, 1), (record.queries, record.duplicate_queries))
+        self.assertEqual([], query_log.active())
+
+    def test_stream_closed_early_logged(self):
+        chunks = data_serve_resources._recorded(self._users(['u1', 'u2']), 'GET', '/log', sampled=True)
+        next(chunks)
+        chunks.close()
+        self.assertEqual(1, self.records[0].queries)
+        self.assertEqual([], query_log.active())
+
+    def test_unsampled_stream_not_logged(self):
+        ''.join(data_serve_resources._recorded(self._users(['u1']), 'GET', '/log', sampled=False))
+        self.assertEqual([], self.records)
+
+
+class BKTModelTestCase(unittest.TestCase):
+    def test_joint_mastery_matches_per_skill_mastery(self):
+        """
+        Test mastery computed in one pass over all responses equals mastery computed from each skill's trajectory.
+        """
+        model = BKT()
+        parameters = {
+            'center': {'pg': 0.25, 'ps': 0.25, 'pi': 0.1, 'pt': 0.5},
+            'shape': {'pg': 0.01, 'ps': 0.01, 'pi': 0.99, 'pt': 0.99},
+        }
+        interactions = [
+            {'problem': {'skills': ['center']}, 'correct': 1},
+            {'problem': {'skills': ['center', 'shape']}, 'correct': 0},
+            {'problem': {'skills': ['None']}, 'correct': 1},
+            {'problem': {'skills': ['shape']}, 'correct': 1},
+        ]
+        mastery = model.get_probabilities_mastered(interactions, parameters)
+        for skill, params in parameters.items():
+            trajectory = [x['correct'] for x in interactions if skill in x['problem']['skills']]
+            self.assertAlmostEqual(model.get_probability_mastered(trajectory, params), mastery[skill])
@@ -125,8 +125,6 @@ def setup_course_in_edxadapt(**kwargs):
     """
     csv_path_files = get_problems_and_skills(kwargs['csv_files_dir'])
     headers = {'Content-type': 'application/json'}
-    payload = json.dumps({'course_id': kwargs['course_id']})
-    requests.post('https://{host}:{port}/api/v1/course'.format(**kwargs), data=payload, headers=headers)
     with open(csv_path_files['skills'], "r") as fin:
         max_skill_index = 0
         pretest2skill = {}
@@ -149,12 +147,10 @@ def setup_course_in_edxadapt(**kwargs):
         for key in pretest2skill:
             TEST2SKILL[key] = pretest2skill[key]
 
-    for k in SKILL2INDEX:
-        payload = json.dumps({'skill_name': k})
-        requests.post('https://{host}:{port}/api/v1/course/{course_id}/skill'.format(**kwargs), data=payload, headers=headers)
-
-    payload = json.dumps({'skill_name': "None"})
-    requests.post('https://{host}:{port}/api/v1/course/{course_id}/skill'.format(**kwargs), data=payload, headers=headers)
+    # The whole course is imported with one request, the course is created if it does not exist
+    definition = {'skills': sorted(SKILL2INDEX, key=SKILL2INDEX.get), 'problems': []}
+    if "None" not in SKILL2INDEX:
+        definition['skills'].append("None")
     table = [line.strip().split(',') for line in open(csv_path_files['problems']).readlines()]
     for row in table:
         msg = (
@@ -183,13 +179,22 @@ def setup_course_in_edxadapt(**kwargs):
 
         pre = "Pre_a" in pname
         post = "Post_a" in pname
-        payload = json.dumps({
+        definition['problems'].append({
             'problem_name': pname, 'tutor_url': url, 'skills': [skill], 'pretest': pre, 'posttest': post
         })
-        requests.post('https://{host}:{port}/api/v1/course/{course_id}'.format(**kwargs), data=payload, headers=headers)
 
-    payload = json.dumps({'experiment_name': 'test_experiment2', 'start_time': 1462736963, 'end_time': 1999999999})
-    requests.post('https://{host}:{port}/api/v1/course/{course_id}/experiment'.format(**kwargs), data=payload, headers=headers)
+    definition['experiments'] = [
+        {'experiment_name': 'test_experiment2', 'start_time': 1462736963, 'end_time': 1999999999}
+    ]
+    response = requests.post(
+        'https://{host}:{port}/api/v1/course/{course_id}/import'.format(**kwargs),
+        data=json.dumps(definition),
+        headers=headers
+    )
+    if response.status_code != 201:
+        print("Course is not imported: {}".format(response.json().get('message')))
+        sys.exit()
+    print("Course is imported: {}".format(response.json()['imported']))
 
     if DO_BASELINE_SETUP:
         params = {'pi': 0.1, 'pt': 0.1, 'pg': 0.1, 'ps': 0.1, 'threshold': 1.0}
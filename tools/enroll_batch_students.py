@@ -24,6 +24,8 @@ except ImportError:
     REQUIRED_PARAMS = True
 
 DEFAULT_PROBABILITIES = {'pg': 0.25, 'ps': 0.25, 'pi': 0.1, 'pt': 0.5, 'threshold': 0.99}
+# Number of students enrolled in one request
+BATCH_SIZE = 1000
 
 
 def get_parameters(required=REQUIRED_PARAMS):
@@ -76,7 +78,7 @@ def get_parameters(required=REQUIRED_PARAMS):
     return vars(params)
 
 
-def get_students_for_enrollment(headers, **kwargs):
+def get_students_for_enrollment(**kwargs):
     """
     Parse csv file with student anonymous data and prepare a list of students for enrollment in edx-adapt.
     """
@@ -84,56 +86,45 @@ def get_students_for_enrollment(headers, **kwargs):
     if not os.path.exists(path_to_file):
         print("File with path: {} does not exist, please try again".format(path_to_file))
         sys.exit()
-    enrolled_students = get_enrolled_students(headers, **kwargs)
     with open(path_to_file) as csvfile:
-        raw_students_ids = csv.DictReader(csvfile)
-        for line in raw_students_ids:
-            user_id = line['Anonymized User ID']
-            key = (
-                'started' * (user_id in enrolled_students['started']) +
-                'updated' * (user_id in enrolled_students['not_started'])
-            )
-            yield user_id, key if key else 'enrolled'
+        return [line['Anonymized User ID'] for line in csv.DictReader(csvfile)]
 
 
-def check_users_already_started(users_list, headers=None, **kwargs):
-    """
-    Check whether user have already started course if not users parameters could be updated
-    :param users_list: list with users_in_progress
-    :return: checked_users: dict with {'started': [...], 'not_started': [...]}  lists of users
+def enroll_students(student_ids, headers, **kwargs):
     """
-    checked_users = {'started': [], 'not_started': []}
-    for user in users_list:
-        status = requests.get(
-            'https://{host}:{port}/api/v1/course/{course_id}/user/{user_id}'.format(user_id=user, **kwargs),
-            headers=headers
-        ).json()
-        if status['current']:
-            checked_users['started'].append(user)
-        else:
-            checked_users['not_started'].append(user)
-    return checked_users
-
+    Enroll students with the bulk enrollment endpoint, BATCH_SIZE students per request.
 
-def get_enrolled_students(headers, **kwargs):
+    Students who have already started the course are ignored by edx-adapt, students who are enrolled but have not
+    started it are updated with new parameters.
+    :return: dict with 'enrolled', 'updated', 'started' lists of students and 'failed' dict with error messages
     """
-    Get student already enrolled in edx-adapt.
-    """
-    users = requests.get('https://{host}:{port}/api/v1/course/{course_id}/user'.format(**kwargs), headers=headers)
-    if users:
-        users = users.json()
-        enrolled_users = {'started': set(), 'not_started': set()}
-        enrolled_users['started'].update(set(users['users']['finished']))
-        checked_users = check_users_already_started(users['users']['in_progress'], headers, **kwargs)
-        enrolled_users['started'].update(set(checked_users['started']))
-        enrolled_users['not_started'].update(set(checked_users['not_started']))
-        return enrolled_users
-    else:
-        print("Course or edx-adapt server is not found")
-        sys.exit()
+    student_to_adapt = {'enrolled': [], 'updated': [], 'started': [], 'failed': {}}
+    for i in range(0, len(student_ids), BATCH_SIZE):
+        batch = student_ids[i:i + BATCH_SIZE]
+        req = requests.post(
+            'https://{host}:{port}/api/v1/course/{course_id}/users/bulk'.format(**kwargs),
+            json={'user_ids': batch, 'params': kwargs['probabilities']},
+            headers=headers
+        )
+        if req.status_code != 200:
+            print(
+                "Failed to enroll students {} - {} to the course {}: {}. Please repeat enrollment procedure for these "
+                "students ones more time.".format(batch[0], batch[-1], kwargs['course_id'], req.text)
+            )
+            continue
+        result = req.json()
+        student_to_adapt['enrolled'].extend(result['enrolled'])
+        student_to_adapt['updated'].extend(result['updated'])
+        student_to_adapt['started'].extend(result['skipped'])
+        student_to_adapt['failed'].update(result['failed'])
+        print("{} of {} students are processed".format(i + len(batch), len(student_ids)))
+    return student_to_adapt
 
 
 def output_result(student_to_adapt, verbose=False):
+    failed = student_to_adapt.pop('failed')
+    for student_id, message in failed.items():
+        print("Failed to enroll student {}: {}".format(student_id, message))
     if verbose:
         for key in student_to_adapt:
             student_to_adapt[key] = " ,\n".join(student_to_adapt[key])
@@ -143,46 +134,8 @@ def output_result(student_to_adapt, verbose=False):
 def main():
     parameters = get_parameters()
     headers = {'Content-type': 'application/json'}
-    student_id_list = get_students_for_enrollment(headers, **parameters)
-    student_to_adapt = {'enrolled': [], 'updated': [], 'started': []}
-    for student_id, key in student_id_list:
-        student_to_adapt[key].append(student_id)
-        if key == 'started':
-            continue
-        else:
-            payload = {
-                'course_id': parameters['course_id'],
-                'params': parameters['probabilities'],
-                'user_id': student_id,
-            }
-            req = requests.post(
-                'https://{host}:{port}/api/v1/parameters/bulk'.format(**parameters), json=payload, headers=headers
-            )
-            if req.status_code == 200:
-                print("student's skills are added")
-            else:
-                print(
-                    "Cannot create skills documemts for the student {}. Student cannot be enrolled without existed "
-                    "course skills. Please repeat enrollment procedure for this student ones more time.".format(
-                        student_id
-                    )
-                )
-                continue
-
-            payload = {'user_id': student_id}
-            req = requests.post(
-                'https://{host}:{port}/api/v1/course/{course_id}/user'.format(**parameters),
-                json=payload,
-                headers=headers
-            )
-            if req.status_code == 200:
-                print("Student {} is enrolled on the course {}".format(student_id, parameters['course_id']))
-            else:
-                print(
-                    "Failed to enroll student {} to the course {}. Please repeat enrollment procedure for this student "
-                    "ones more time.".format(student_id, parameters['course_id'])
-                )
-                continue
+    student_ids = get_students_for_enrollment(**parameters)
+    student_to_adapt = enroll_students(student_ids, headers, **parameters)
     output_result(student_to_adapt, verbose=parameters['verbose'])
 
 
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Benchmark of the response encoders on the course-wide log and trajectory payloads.
+
+Payloads are generated with the shape of the data-serve responses: every user's log or trajectory of the problems
+from edx-adapt/data/BKT/problems.csv. A payload saved from the API can be benchmarked instead with --file.
+
+Encoders are run with the options of edx_adapt.api.serialization. Those which are not installed are skipped: json is
+always measured, as well as json with flask_restful's default options, ujson, simplejson and msgpack if available.
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import timeit
+
+DEFAULT_PROBLEMS_CSV = os.path.join(os.path.dirname(__file__), '../data/BKT/problems.csv')
+
+
+def get_parameters():
+    parser = argparse.ArgumentParser(description='Benchmark edx-adapt response encoders')
+    parser.add_argument('--users', type=int, default=1000, help='Number of users in the generated payloads.')
+    parser.add_argument('--file', type=str, help='JSON payload saved from the API, benchmarked instead.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs, the best one is reported.')
+    return vars(parser.parse_args())
+
+
+def generate_payloads(users):
+    """
+    :return: dict of the log and trajectory payloads keyed by name
+    """
+    with open(DEFAULT_PROBLEMS_CSV) as fin:
+        problems = [
+            {
+                'problem_name': row[0],
+                'tutor_url': 'https://edx.example.com/courses/course-v1:CMU+STAT101+2017/jump_to_id/' + row[0],
+                'skills': [row[1]],
+                'pretest': 'Pre_a' in row[0],
+                'posttest': 'Post_a' in row[0],
+            }
+            for row in csv.reader(fin)
+        ]
+    log, trajectory = {}, {}
+    for i in range(users):
+        user_id = 'student_{:06d}'.format(i)
+        answered = random.sample(problems, min(len(problems), 40))
+        log[user_id] = [
+            {
+                'student_id': user_id, 'problem': problem, 'correct': random.randint(0, 1), 'attempt': 1,
+                'unix_s': 1462736963 + n * 60, 'timestamp': '2016-05-08 20:{:02d}:23'.format(n % 60), 'type': 'response'
+            }
+            for n, problem in enumerate(answered)
+        ]
+        trajectory[user_id] = [entry['correct'] for entry in log[user_id]]
+    return {'log': {'log': log}, 'trajectory': trajectory}
+
+
+def get_encoders():
+    encoders = [
+        ('json default', json.dumps),
+        ('json', lambda data: json.dumps(data, separators=(',', ':'))),
+    ]
+    try:
+        import ujson
+        encoders.append(('ujson', lambda data: ujson.dumps(data, escape_forward_slashes=False, double_precision=15)))
+    except ImportError:
+        pass
+    try:
+        import simplejson
+        encoders.append(('simplejson', lambda data: simplejson.dumps(data, separators=(',', ':'))))
+    except ImportError:
+        pass
+    try:
+        import msgpack
+        encoders.append(('msgpack', lambda data: msgpack.packb(data, use_bin_type=True)))
+    except ImportError:
+        pass
+    return encoders
+
+
+def run_benchmark(**kwargs):
+    if kwargs['file']:
+        with open(kwargs['file']) as fin:
+            payloads = {os.path.basename(kwargs['file']): json.load(fin)}
+    else:
+        payloads = generate_payloads(kwargs['users'])
+    print("{:<12} {:<14} {:>12} {:>12}".format('payload', 'encoder', 'best ms', 'size KB'))
+    for name, payload in sorted(payloads.items()):
+        for encoder_name, encode in get_encoders():
+            best = min(timeit.repeat(lambda: encode(payload), number=1, repeat=kwargs['repeat']))
+            print("{:<12} {:<14} {:>12.1f} {:>12.1f}".format(
+                name, encoder_name, best * 1000, len(encode(payload)) / 1024.0
+            ))
+
+
+if __name__ == '__main__':
+    run_benchmark(**get_parameters())
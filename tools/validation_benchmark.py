@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark of the request body parsing of the busiest endpoints: reqparse parsers against edx_adapt.api.validation ones.
+
+The reqparse parsers are the definitions the endpoints used before, the others are imported from the resources. Both
+parse the same body in one request context, the body is decoded once and cached by Flask, so only the parsing is
+timed. Run from the project directory:
+
+    python -m tools.validation_benchmark [--number 10000] [--repeat 5]
+"""
+import argparse
+import json
+import timeit
+
+import flask
+from flask_restful import reqparse
+
+from edx_adapt.api.resources import model_resources, tutor_resources
+
+
+def get_parameters():
+    parser = argparse.ArgumentParser(description='Benchmark edx-adapt request body parsing')
+    parser.add_argument('--number', type=int, default=10000, help='Number of parsed bodies in a timed run.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs, the best one is reported.')
+    return vars(parser.parse_args())
+
+
+def reqparse_parsers():
+    """
+    :return: dict of the reqparse parsers keyed by endpoint
+    """
+    result_parser = reqparse.RequestParser()
+    result_parser.add_argument('problem', type=str, required=True, location='json',
+                               help="Must supply the name of the problem which the user answered")
+    result_parser.add_argument('correct', type=int, required=True, location='json',
+                               help="Must supply correctness, 0 for incorrect, 1 for correct")
+    result_parser.add_argument('attempt', type=int, required=True, location='json',
+                               help="Must supply the attempt number, starting from 1 for the first attempt")
+    result_parser.add_argument('unix_seconds', type=int, location='json',
+                               help="Optionally supply timestamp in seconds since unix epoch")
+
+    load_parser = reqparse.RequestParser()
+    load_parser.add_argument('problem', required=True, help="Must supply the name of the problem loaded",
+                             location='json')
+    load_parser.add_argument('unix_seconds', type=int, help="Optionally supply timestamp in seconds since unix epoch",
+                             location='json')
+
+    param_parser = reqparse.RequestParser()
+    param_parser.add_argument('course_id', type=str, location='json', help="Optionally supply a course id")
+    param_parser.add_argument('user_id', type=str, location='json', help="Optionally supply a user ID")
+    param_parser.add_argument('skill_name', type=str, location='json', help="Optionally supply the name of a skill")
+    param_parser.add_argument('params', type=dict, location='json', required=True,
+                              help="Please supply the desired model parameters as a dictionary")
+    return {'interaction': result_parser, 'pageload': load_parser, 'parameters': param_parser}
+
+
+ENDPOINTS = [
+    ('interaction', tutor_resources.result_parser,
+     {'problem': 'Pre_assessment_3', 'correct': 1, 'attempt': 1, 'unix_seconds': 1462736963}),
+    ('pageload', tutor_resources.load_parser, {'problem': 'Pre_assessment_3', 'unix_seconds': 1462736963}),
+    ('parameters', model_resources.param_parser,
+     {'course_id': 'CMUSTAT101', 'user_id': 'student_000001',
+      'params': {'pg': 0.25, 'ps': 0.25, 'pi': 0.1, 'pt': 0.5}}),
+]
+
+
+def run_benchmark(**kwargs):
+    app = flask.Flask(__name__)
+    old_parsers = reqparse_parsers()
+    print("{:<12} {:<10} {:>12} {:>8}".format('endpoint', 'parser', 'best us', 'speedup'))
+    for endpoint, parser, body in ENDPOINTS:
+        with app.test_request_context(method='POST', data=json.dumps(body), content_type='application/json'):
+            results = []
+            for name, parse in (('reqparse', old_parsers[endpoint].parse_args), ('compiled', parser.parse_args)):
+                best = min(timeit.repeat(parse, number=kwargs['number'], repeat=kwargs['repeat']))
+                results.append((name, best / kwargs['number'] * 1e6))
+        for name, cost in results:
+            print("{:<12} {:<10} {:>12.2f} {:>7.1f}x".format(endpoint, name, cost, results[0][1] / cost))
+
+
+if __name__ == '__main__':
+    run_benchmark(**get_parameters())